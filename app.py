@@ -1,15 +1,34 @@
 from fastapi import FastAPI
+from starlette.datastructures import Headers, MutableHeaders
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
 import argparse
+import os
+import time
 from typing import Optional
 from contextlib import asynccontextmanager
 
 from lib.retrieval.vectorstore import VectorStore
+from lib.retrieval.sharded import ShardedVectorStore
 from lib.retrieval.persistence import PersistenceManager
+from lib.retrieval.expiry import ExpirySweeper
+from lib.retrieval.collection_manager import CollectionManager
+from lib.retrieval.replica import SnapshotWatcher
+from lib.retrieval.embeddings import DEFAULT_QUERY_INSTRUCTION, HuggingFaceEmbeddings
+from lib.retrieval.scheduler import EmbeddingScheduler
+from lib.retrieval.concurrency import SEARCH_PARALLELISM_MODES, configure_threads
 from lib.api.document_routes import init_routes
+from lib.api.collection_routes import init_collection_routes
 from lib.api.apikey_routes import router as apikey_router
+from lib.api.metrics_routes import router as metrics_router
+from lib.monitoring.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS
+from lib.monitoring.tracing import (
+    TRACE_HEADER,
+    end_trace,
+    log_slow_request,
+    start_trace,
+)
 from lib.db.database import Base, engine
 
 logging.basicConfig(
@@ -18,37 +37,195 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 persistence_manager: Optional[PersistenceManager] = None
+expiry_sweeper: Optional[ExpirySweeper] = None
+collection_manager: Optional[CollectionManager] = None
+snapshot_watcher: Optional[SnapshotWatcher] = None
 save_interval: int = 300
+save_after_mutations: int = 0
+save_after_mb: float = 0
+expiry_sweep_interval: int = 60
+slow_query_threshold: float = 1.0
+collection_memory_mb: float = 1024
+replica_poll_interval: float = 5.0
+search_parallelism: str = "adaptive"
+faiss_threads: int = 0
+torch_threads: int = 0
+encode_concurrency: int = 4
+bulk_encode_concurrency: int = 1
+bulk_chunk_size: int = 64
+
+
+def data_dir() -> str:
+    return os.getenv("SEMANDOC_DATA_DIR", "./data")
+
+
+def read_only() -> bool:
+    return os.getenv("SEMANDOC_READ_ONLY", "").lower() in ("1", "true", "yes")
+
+
+def create_embedder() -> EmbeddingScheduler:
+    """
+    Loads the embedding model behind a scheduler that encodes search queries
+    ahead of documents being ingested.
+
+    SEMANDOC_EMBEDDER=hash swaps the model for the deterministic stub embedder
+    used by the benchmarks, so the app can be load-tested without a model.
+    """
+    if os.getenv("SEMANDOC_EMBEDDER") == "hash":
+        from benchmarks.stub_embedder import HashEmbeddings
+
+        logger.warning("Using the hash stub embedder, search results are not semantic")
+        embedder = HashEmbeddings(
+            dimension=int(os.getenv("SEMANDOC_EMBEDDING_DIM", "1024"))
+        )
+    else:
+        embedder = HuggingFaceEmbeddings(
+            query_instruction=DEFAULT_QUERY_INSTRUCTION,
+            model_name="./models/embedders/m3e-large",
+            device="cpu",
+        )
+    return EmbeddingScheduler(embedder)
+
+
+def create_vector_store(
+    folder_path: Optional[str] = None, embedding=None
+) -> VectorStore:
+    """
+    Builds a vector store, by default the one in the data folder. Collections
+    pass their own folder and share the default store's embedder, so the model
+    is loaded only once.
+
+    SEMANDOC_DATA_DIR overrides the data folder.
+
+    SEMANDOC_SHARD_BY=category or hash partitions the documents into shards,
+    SEMANDOC_NUM_SHARDS sets the shard count for hash sharding (default 8) and
+    SEMANDOC_SHARD_WORKERS the fan-out thread count (default 8).
+
+    SEMANDOC_READ_ONLY=1 opens the stores as read-only replicas of a primary
+    writing to the same data folder.
+    """
+    options = {
+        "folder_path": folder_path or data_dir(),
+        "device": "cpu",
+        "read_only": read_only(),
+        "embedding": embedding or create_embedder(),
+    }
+
+    shard_by = os.getenv("SEMANDOC_SHARD_BY")
+    if shard_by:
+        logger.info(f"Sharding the vector store by {shard_by}")
+        return ShardedVectorStore(
+            shard_by=shard_by,
+            num_shards=int(os.getenv("SEMANDOC_NUM_SHARDS", "8")),
+            max_workers=int(os.getenv("SEMANDOC_SHARD_WORKERS", "8")),
+            **options,
+        )
+    return VectorStore(**options)
+
+
+vector_store = create_vector_store()
 
-vector_store = VectorStore(
-    folder_path="./data", model_name="./models/embedders/m3e-large", device="cpu"
-)
+
+def get_vector_store() -> VectorStore:
+    # Resolved per request, since a replica swaps in reloaded stores.
+    return vector_store
+
+
+def install_vector_store(store: VectorStore):
+    global vector_store
+    vector_store = store
+
+
+def create_collection_services(store: VectorStore) -> list:
+    """Background workers of a collection, configured like the default store's."""
+    if store.read_only:
+        return []
+    return [
+        PersistenceManager(
+            vector_store=store,
+            save_interval=save_interval,
+            index_name="index",
+            save_after_mutations=save_after_mutations,
+            save_after_bytes=int(save_after_mb * 1024 * 1024),
+        ),
+        ExpirySweeper(vector_store=store, sweep_interval=expiry_sweep_interval),
+    ]
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global persistence_manager
+    global persistence_manager, expiry_sweeper, collection_manager, snapshot_watcher
     logger.info("Starting up SemanDoc API")
 
     # Init db
     logger.info("Initializing database tables")
     Base.metadata.create_all(bind=engine)
 
-    logger.info(
-        f"Starting vector store persistence manager with interval: {save_interval}s"
+    configure_threads(search_parallelism, faiss_threads, torch_threads)
+    vector_store.embedding.configure(
+        encode_concurrency, bulk_encode_concurrency, bulk_chunk_size
     )
-    persistence_manager = PersistenceManager(
-        vector_store=vector_store, save_interval=save_interval, index_name="index"
+
+    if vector_store.read_only:
+        # The primary saves and sweeps the shared folder; a replica only
+        # follows its snapshots.
+        logger.info(
+            f"Running as a read-only replica, checking for new snapshots every "
+            f"{replica_poll_interval}s"
+        )
+        snapshot_watcher = SnapshotWatcher(
+            get_store=get_vector_store,
+            open_store=lambda: create_vector_store(embedding=vector_store.embedding),
+            on_reload=install_vector_store,
+            poll_interval=replica_poll_interval,
+        )
+        snapshot_watcher.start()
+    else:
+        logger.info(
+            f"Starting vector store persistence manager with interval: {save_interval}s"
+        )
+        persistence_manager = PersistenceManager(
+            vector_store=vector_store,
+            save_interval=save_interval,
+            index_name="index",
+            save_after_mutations=save_after_mutations,
+            save_after_bytes=int(save_after_mb * 1024 * 1024),
+        )
+        persistence_manager.start()
+        logger.info("Vector store persistence manager started")
+
+        expiry_sweeper = ExpirySweeper(
+            vector_store=vector_store, sweep_interval=expiry_sweep_interval
+        )
+        expiry_sweeper.start()
+
+    collection_manager = CollectionManager(
+        data_dir=os.path.join(data_dir(), "collections"),
+        store_factory=lambda path: create_vector_store(
+            path, embedding=vector_store.embedding
+        ),
+        memory_budget=int(collection_memory_mb * 1024 * 1024),
+        services_factory=create_collection_services,
+        replica_poll_interval=replica_poll_interval,
     )
-    persistence_manager.start()
-    logger.info("Vector store persistence manager started")
+    logger.info(f"Collection memory budget: {collection_memory_mb} MB")
 
     yield
 
     # Shutdown
     logger.info("Shutting down SemanDoc API")
 
+    if snapshot_watcher:
+        snapshot_watcher.stop()
+
+    if expiry_sweeper:
+        expiry_sweeper.stop()
+
+    if collection_manager:
+        logger.info("Saving and unloading collections")
+        collection_manager.close()
+
     if persistence_manager:
         try:
             logger.info("Saving vector store before shutdown")
@@ -57,7 +234,7 @@ async def lifespan(app: FastAPI):
             persistence_manager.stop()
         except Exception as e:
             logger.error(f"Error during shutdown: {e}")
-    else:
+    elif not vector_store.read_only:
         logger.warning("Persistence manager was not initialized")
 
 
@@ -74,11 +251,71 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[TRACE_HEADER],
 )
 
-document_router = init_routes(vector_store)
+
+class RequestMetricsMiddleware:
+    """
+    Records request metrics and a per-request stage trace. Clients that send
+    the X-SemanDoc-Trace header get the stage breakdown back in the same
+    header, and requests slower than --slow-query-threshold are logged.
+
+    The clock stops when the last body chunk is sent, so streamed responses
+    are timed in full. The header goes out before the body, so for those it
+    covers the time until the response started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = start_trace()
+        traced = Headers(scope=scope).get(TRACE_HEADER)
+        status = 500
+        elapsed = None
+
+        async def send_with_trace(message):
+            nonlocal status, elapsed
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if traced:
+                    MutableHeaders(scope=message)[TRACE_HEADER] = trace.header_value()
+            elif message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                elapsed = trace.elapsed
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            end_trace(token)
+            if elapsed is None:
+                elapsed = trace.elapsed
+            # Label by route template rather than raw path to keep cardinality bounded.
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=method, route=route_path)
+            HTTP_REQUESTS.inc(method=method, route=route_path, status=str(status))
+            log_slow_request(
+                trace, method, route_path, status, slow_query_threshold, elapsed
+            )
+
+
+app.add_middleware(RequestMetricsMiddleware)
+
+
+document_router = init_routes(store_dependency=get_vector_store)
 app.include_router(document_router)
+app.include_router(init_collection_routes(lambda: collection_manager))
 app.include_router(apikey_router)
+app.include_router(metrics_router)
 
 
 @app.get("/")
@@ -87,7 +324,10 @@ async def root():
 
 
 def parse_args():
-    global save_interval
+    global save_interval, save_after_mutations, save_after_mb
+    global expiry_sweep_interval, slow_query_threshold, collection_memory_mb
+    global replica_poll_interval, search_parallelism, faiss_threads, torch_threads
+    global encode_concurrency, bulk_encode_concurrency, bulk_chunk_size
 
     parser = argparse.ArgumentParser(description="SemanDoc API")
     parser.add_argument(
@@ -96,6 +336,90 @@ def parse_args():
         default=300,
         help="Vector store auto-save interval in seconds, default 300s",
     )
+    parser.add_argument(
+        "--save-after-mutations",
+        type=int,
+        default=0,
+        help="Also save once this many documents were added or removed since the "
+        "last save, 0 to disable, default 0",
+    )
+    parser.add_argument(
+        "--save-after-mb",
+        type=float,
+        default=0,
+        help="Also save once roughly this many MB of vectors and content changed "
+        "since the last save, 0 to disable, default 0",
+    )
+    parser.add_argument(
+        "--expiry-sweep-interval",
+        type=int,
+        default=60,
+        help="Interval in seconds between evictions of expired documents, default 60s",
+    )
+    parser.add_argument(
+        "--slow-query-threshold",
+        type=float,
+        default=1.0,
+        help="Log requests slower than this many seconds to the semandoc.slow_query "
+        "logger, negative to disable, default 1.0s",
+    )
+    parser.add_argument(
+        "--collection-memory-mb",
+        type=float,
+        default=1024,
+        help="Approximate MB of vectors and contents loaded collections may hold "
+        "before the least recently used ones are unloaded, 0 for no limit, "
+        "default 1024",
+    )
+    parser.add_argument(
+        "--replica-poll-interval",
+        type=float,
+        default=5.0,
+        help="With SEMANDOC_READ_ONLY=1, seconds between checks for snapshots "
+        "saved by the primary, default 5s",
+    )
+    parser.add_argument(
+        "--search-parallelism",
+        choices=SEARCH_PARALLELISM_MODES,
+        default="adaptive",
+        help="How faiss threads are spent: intra gives each search all threads, "
+        "inter one thread per search, adaptive splits them between the searches "
+        "running at once, default adaptive",
+    )
+    parser.add_argument(
+        "--faiss-threads",
+        type=int,
+        default=0,
+        help="OpenMP threads a single faiss search may use, 0 for the CPU count, "
+        "default 0",
+    )
+    parser.add_argument(
+        "--torch-threads",
+        type=int,
+        default=0,
+        help="Intra-op threads torch uses to encode queries and documents, 0 to "
+        "keep torch's default, default 0",
+    )
+    parser.add_argument(
+        "--encode-concurrency",
+        type=int,
+        default=4,
+        help="Encodes the embedding model may run at once, default 4",
+    )
+    parser.add_argument(
+        "--bulk-encode-concurrency",
+        type=int,
+        default=1,
+        help="Of those, how many may encode documents being added, so the rest "
+        "stay free for search queries, default 1",
+    )
+    parser.add_argument(
+        "--bulk-chunk-size",
+        type=int,
+        default=64,
+        help="Documents encoded per chunk when adding in bulk; waiting search "
+        "queries run between chunks, default 64",
+    )
     parser.add_argument(
         "--host",
         type=str,
@@ -108,6 +432,18 @@ def parse_args():
 
     args = parser.parse_args()
     save_interval = args.save_interval
+    save_after_mutations = args.save_after_mutations
+    save_after_mb = args.save_after_mb
+    expiry_sweep_interval = args.expiry_sweep_interval
+    slow_query_threshold = args.slow_query_threshold
+    collection_memory_mb = args.collection_memory_mb
+    replica_poll_interval = args.replica_poll_interval
+    search_parallelism = args.search_parallelism
+    faiss_threads = args.faiss_threads
+    torch_threads = args.torch_threads
+    encode_concurrency = args.encode_concurrency
+    bulk_encode_concurrency = args.bulk_encode_concurrency
+    bulk_chunk_size = args.bulk_chunk_size
     return args
 
 
@@ -0,0 +1,67 @@
+import random
+import time
+from typing import List
+
+from lib.retrieval.schemas import Document, Metadata
+
+_CJK_WORDS = [
+    "产品", "说明", "维修", "指南", "价格", "库存", "订单", "物流", "售后", "退款",
+    "合同", "发票", "客户", "会员", "积分", "活动", "优惠", "规格", "型号", "配件",
+]  # fmt: skip
+_LATIN_WORDS = [
+    "manual", "warranty", "battery", "firmware", "install", "error", "update",
+    "shipping", "return", "invoice", "account", "password", "network", "device",
+]  # fmt: skip
+_TAGS = [f"tag-{i}" for i in range(50)]
+_CATEGORIES = [f"category-{i}" for i in range(10)]
+
+
+def _product_code(rng: random.Random) -> str:
+    return f"{rng.choice('ABCDEFGHXYZ')}{rng.choice('ABCDEFGHXYZ')}-{rng.randint(100, 9999)}"
+
+
+def _text(rng: random.Random, n_words: int) -> str:
+    words = []
+    for _ in range(n_words):
+        roll = rng.random()
+        if roll < 0.6:
+            words.append(rng.choice(_CJK_WORDS))
+        elif roll < 0.95:
+            words.append(rng.choice(_LATIN_WORDS))
+        else:
+            words.append(_product_code(rng))
+    return " ".join(words)
+
+
+def generate_documents(
+    n: int, seed: int = 0, expiring_fraction: float = 0.1
+) -> List[Document]:
+    """
+    Generates a synthetic corpus with a skewed length distribution: most
+    documents are short, a long tail is several times longer.
+    """
+    rng = random.Random(seed)
+    now = time.time()
+    docs = []
+    for i in range(n):
+        n_words = min(int(rng.lognormvariate(3.0, 0.8)) + 1, 512)
+        valid_time = -1
+        if rng.random() < expiring_fraction:
+            valid_time = rng.randint(3600, 30 * 86400)
+        docs.append(
+            Document(
+                content=f"{_text(rng, n_words)} #{i}",
+                metadata=Metadata(
+                    start_time=now - rng.uniform(0, 365 * 86400),
+                    valid_time=valid_time,
+                    tags=rng.sample(_TAGS, rng.randint(0, 3)),
+                    categories=[rng.choice(_CATEGORIES)],
+                ),
+            )
+        )
+    return docs
+
+
+def generate_queries(n: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [_text(rng, rng.randint(1, 8)) for _ in range(n)]
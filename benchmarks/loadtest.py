@@ -0,0 +1,420 @@
+"""
+HTTP load test for the SemanDoc API.
+
+Boots `app.app` with the hash stub embedder, either in-process on a uvicorn
+thread or as a separate uvicorn process, seeds it with a synthetic corpus and
+drives a weighted mix of requests against the real routes at a fixed
+concurrency. A server that is already running can be targeted with --url.
+
+Usage:
+    python -m benchmarks.loadtest --server process --concurrency 16 --duration 60
+
+Results are written as JSON with throughput, latency percentiles and error
+rates per operation and overall. In-process mode shares the GIL between the
+server and the load generator, so use it for comparisons rather than sizing.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import pandas as pd
+
+from benchmarks.corpus import generate_documents, generate_queries
+from benchmarks.vectorstore_bench import summarize
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+OPERATIONS = ("search", "webhook", "batch", "list", "stats", "xlsx")
+
+DEFAULT_MIX = "search=60,webhook=15,batch=5,list=10,stats=5,xlsx=5"
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        name, weight = item.split("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation in mix: {name}")
+        weights[name] = int(weight)
+    return weights
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(host: str, port: int, timeout: float = 120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server on {host}:{port} did not come up in {timeout}s")
+
+
+def _server_env(data_dir: str, dimension: int) -> Dict[str, str]:
+    return {
+        "SEMANDOC_EMBEDDER": "hash",
+        "SEMANDOC_EMBEDDING_DIM": str(dimension),
+        "SEMANDOC_DATA_DIR": data_dir,
+    }
+
+
+def start_inprocess_server(port: int, workdir: str, dimension: int):
+    """Imports app.py from a scratch working directory and serves it on a thread."""
+    import uvicorn
+
+    os.environ.update(_server_env(os.path.join(workdir, "data"), dimension))
+    # lib.db.database keeps its SQLite file relative to the working directory.
+    os.chdir(workdir)
+    sys.path.insert(0, str(REPO_ROOT))
+    from app import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server
+
+
+def start_process_server(port: int, workdir: str, dimension: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(_server_env(os.path.join(workdir, "data"), dimension))
+    env["PYTHONPATH"] = str(REPO_ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=workdir,
+        env=env,
+    )
+
+
+def _encode_multipart(field: str, filename: str, content: bytes) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = (
+        (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            "Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n"
+            "\r\n"
+        ).encode()
+        + content
+        + f"\r\n--{boundary}--\r\n".encode()
+    )
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def _xlsx_bytes(rows: List[str]) -> bytes:
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        pd.DataFrame([[row] for row in rows]).to_excel(
+            writer, index=False, header=False
+        )
+    return output.getvalue()
+
+
+class Workload:
+    """Builds the request for each operation, with unique content for writes."""
+
+    def __init__(self, seed: int, xlsx_rows: int):
+        self.rng = random.Random(seed)
+        self.queries = generate_queries(1000, seed=seed)
+        self.xlsx_rows = xlsx_rows
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _unique_docs(self, n: int):
+        with self._lock:
+            self._counter += 1
+            seed = 1_000_000 + self._counter
+        return generate_documents(n, seed=seed)
+
+    def request(self, operation: str) -> Tuple[str, str, Optional[bytes], Dict]:
+        if operation == "search":
+            body = {
+                "query": self.rng.choice(self.queries),
+                "k": 10,
+                "mode": self.rng.choice(["vector", "vector", "lexical", "hybrid"]),
+            }
+            return "POST", "/documents/search/", json.dumps(body).encode(), {}
+        if operation == "webhook":
+            doc = self._unique_docs(1)[0]
+            params = [("content", doc.content)]
+            params += [("tags", tag) for tag in doc.metadata.tags or ["tag-0"]]
+            params += [("categories", cat) for cat in doc.metadata.categories]
+            return "GET", "/documents/webhook?" + urlencode(params), None, {}
+        if operation == "batch":
+            body = {
+                "queries": [
+                    {"query": self.rng.choice(self.queries), "k": 10} for _ in range(20)
+                ]
+            }
+            return "POST", "/documents/search/batch", json.dumps(body).encode(), {}
+        if operation == "list":
+            skip = self.rng.randint(0, 500)
+            return "GET", f"/documents/?skip={skip}&limit=100", None, {}
+        if operation == "stats":
+            return "GET", "/documents/stats/overview", None, {}
+        if operation == "xlsx":
+            rows = [doc.content for doc in self._unique_docs(self.xlsx_rows)]
+            body, content_type = _encode_multipart(
+                "file", "documents.xlsx", _xlsx_bytes(rows)
+            )
+            return (
+                "POST",
+                "/documents/upload/xlsx",
+                body,
+                {"Content-Type": content_type},
+            )
+        raise ValueError(f"Unknown operation: {operation}")
+
+
+def seed_corpus(host: str, port: int, n_docs: int, seed: int):
+    conn = http.client.HTTPConnection(host, port, timeout=600)
+    docs = generate_documents(n_docs, seed=seed)
+    for start in range(0, n_docs, 200):
+        body = [
+            {
+                "content": doc.content,
+                "metadata": {
+                    "tags": doc.metadata.tags,
+                    "categories": doc.metadata.categories,
+                },
+            }
+            for doc in docs[start : start + 200]
+        ]
+        conn.request(
+            "POST",
+            "/documents/batch/",
+            body=json.dumps(body),
+            headers={"Content-Type": "application/json"},
+        )
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"Seeding failed with status {response.status}")
+    conn.close()
+
+
+def run_load(
+    host: str,
+    port: int,
+    weights: Dict[str, int],
+    concurrency: int,
+    duration: float,
+    workload: Workload,
+    api_key: Optional[str],
+) -> List[Dict]:
+    names = list(weights)
+    cumulative = [weights[name] for name in names]
+    samples: Dict[str, List[Tuple[float, bool]]] = {name: [] for name in names}
+    samples_lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def worker(worker_id: int):
+        rng = random.Random(worker_id)
+        conn = http.client.HTTPConnection(host, port, timeout=300)
+        while time.time() < deadline:
+            operation = rng.choices(names, weights=cumulative)[0]
+            method, path, body, headers = workload.request(operation)
+            if body is not None and "Content-Type" not in headers:
+                headers["Content-Type"] = "application/json"
+            if api_key:
+                headers["X-API-Key"] = api_key
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                payload = response.read()
+                ok = 200 <= response.status < 300
+                if ok and operation == "batch" and b'"error"' in payload:
+                    ok = False
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=300)
+            elapsed = time.perf_counter() - start
+            with samples_lock:
+                samples[operation].append((elapsed, ok))
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    def report(name: str, entries: List[Tuple[float, bool]]) -> Dict:
+        latencies = [elapsed for elapsed, _ in entries]
+        errors = sum(1 for _, ok in entries if not ok)
+        result = summarize(name, -1, latencies) if latencies else {"operation": name}
+        result.pop("corpus_size", None)
+        result.update(
+            {
+                "count": len(entries),
+                "errors": errors,
+                "error_rate": errors / len(entries) if entries else 0.0,
+                # Requests completed per second of wall time, across all workers.
+                "throughput_per_s": len(entries) / wall_time,
+            }
+        )
+        return result
+
+    results = [report(name, entries) for name, entries in samples.items()]
+    results.append(
+        report("all", [entry for entries in samples.values() for entry in entries])
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SemanDoc HTTP load test")
+    parser.add_argument(
+        "--server",
+        choices=["inprocess", "process"],
+        default="process",
+        help="Run the app on a thread of this process or as a uvicorn process, "
+        "default process",
+    )
+    parser.add_argument(
+        "--url", type=str, default=None, help="Target an already running server"
+    )
+    parser.add_argument("--api-key", type=str, default=None, help="X-API-Key header")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="Concurrent clients, default 8"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30, help="Seconds of load, default 30"
+    )
+    parser.add_argument(
+        "--mix",
+        type=str,
+        default=DEFAULT_MIX,
+        help=f"Weighted operation mix, default {DEFAULT_MIX}",
+    )
+    parser.add_argument(
+        "--seed-docs",
+        type=int,
+        default=2000,
+        help="Documents to load before the run, default 2000",
+    )
+    parser.add_argument(
+        "--xlsx-rows", type=int, default=20, help="Rows per uploaded xlsx, default 20"
+    )
+    parser.add_argument(
+        "--dimension", type=int, default=1024, help="Embedding dimension, default 1024"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, default 0")
+    parser.add_argument(
+        "--output", type=str, default=None, help="Write results to this JSON file"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    logger.setLevel(logging.INFO)
+    weights = parse_mix(args.mix)
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    process = None
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = "127.0.0.1", _free_port()
+        workdir = tempfile.mkdtemp(prefix="semandoc-loadtest-")
+        if args.server == "inprocess":
+            server = start_inprocess_server(port, workdir, args.dimension)
+        else:
+            process = start_process_server(port, workdir, args.dimension)
+
+    try:
+        _wait_until_up(host, port)
+        if args.seed_docs and not args.url:
+            logger.info(f"Seeding {args.seed_docs} documents")
+            seed_corpus(host, port, args.seed_docs, args.seed)
+
+        logger.info(
+            f"Running {args.duration}s of load at concurrency {args.concurrency}"
+        )
+        results = run_load(
+            host,
+            port,
+            weights,
+            args.concurrency,
+            args.duration,
+            Workload(args.seed, args.xlsx_rows),
+            args.api_key,
+        )
+    finally:
+        if server is not None:
+            server.should_exit = True
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "server": "external" if args.url else args.server,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": weights,
+            "seed_docs": 0 if args.url else args.seed_docs,
+            "dimension": args.dimension,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import hashlib
+
+import numpy as np
+
+from lib.retrieval.lexical import tokenize
+
+
+class HashEmbeddings:
+    """
+    Deterministic stand-in for HuggingFaceEmbeddings that needs no model.
+
+    Texts are embedded by feature hashing their lexical tokens into a fixed
+    number of signed buckets, so texts sharing terms land near each other and
+    the same text always gets the same vector, across processes and runs.
+    """
+
+    def __init__(
+        self,
+        dimension: int = 1024,
+        query_instruction: str = "",
+        normalize_embeddings: bool = True,
+    ):
+        self._dimension = dimension
+        self.query_instruction = query_instruction
+        self.normalize_embeddings = normalize_embeddings
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self._dimension, dtype=np.float32)
+        tokens = tokenize(text) or [text]
+        for token in tokens:
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self._dimension] += sign
+        if self.normalize_embeddings:
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+            else:
+                vector[0] = 1.0
+        return vector
+
+    def _embed_texts(self, texts):
+        if not texts:
+            return np.zeros((0, self._dimension), dtype=np.float32)
+        return np.stack([self._embed_one(text) for text in texts])
+
+    def _embed_documents(self, texts):
+        return self._embed_texts(texts)
@@ -0,0 +1,270 @@
+"""
+Micro-benchmarks for VectorStore operations, run against the deterministic
+HashEmbeddings stub so no model has to be loaded.
+
+Usage:
+    python -m benchmarks.vectorstore_bench --sizes 10000 100000 --output bench.json
+
+Results are written as JSON, one record per (operation, corpus size), with
+latency percentiles in milliseconds and throughput in operations per second.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.corpus import generate_documents, generate_queries
+from benchmarks.stub_embedder import HashEmbeddings
+from lib.retrieval.schemas import Document, MetadataFilter
+from lib.retrieval.vectorstore import VectorStore
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = (
+    "add_documents",
+    "add_documents_no_dedup",
+    "search",
+    "search_filtered",
+    "search_lexical",
+    "search_hybrid",
+    "delete_documents_by_id",
+    "rebuild_index",
+    "save",
+)
+
+
+def summarize(operation: str, corpus_size: int, latencies: List[float], **extra):
+    latencies_ms = np.array(latencies) * 1000
+    total = float(np.sum(latencies))
+    return {
+        "operation": operation,
+        "corpus_size": corpus_size,
+        "count": len(latencies),
+        "mean_ms": float(np.mean(latencies_ms)),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(np.max(latencies_ms)),
+        "throughput_per_s": len(latencies) / total if total > 0 else None,
+        **extra,
+    }
+
+
+def timed(fn: Callable[[], object], repeat: int) -> List[float]:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def populate_store(store: VectorStore, docs: List[Document], batch_size: int = 4096):
+    """
+    Loads a corpus the way _load_or_create_index does, bypassing the per-document
+    duplicate check of add_documents, which would make large corpora quadratic.
+    """
+    index_cpu, index_to_docstore_id = store._view.materialize()
+    for start in range(0, len(docs), batch_size):
+        batch = docs[start : start + batch_size]
+        embeddings = np.asarray(
+            store.embedding._embed_documents([doc.content for doc in batch]),
+            dtype=np.float32,
+        )
+        index_cpu.add(embeddings)
+        for doc in batch:
+            doc_id = doc.metadata.id
+            index_to_docstore_id[len(index_to_docstore_id)] = doc_id
+            store.docstore[doc_id] = doc
+    store._install_view(index_cpu, index_to_docstore_id)
+    store._rebuild_side_indexes()
+
+
+def run_size(
+    corpus_size: int,
+    operations: List[str],
+    dimension: int,
+    n_queries: int,
+    batch_size: int,
+    repeat: int,
+    seed: int,
+) -> List[Dict]:
+    results = []
+    folder = tempfile.mkdtemp(prefix="semandoc-bench-")
+    store = VectorStore(
+        folder_path=folder,
+        embedding=HashEmbeddings(dimension=dimension),
+        cache_size=0,
+    )
+
+    start = time.perf_counter()
+    populate_store(store, generate_documents(corpus_size, seed=seed))
+    logger.info(
+        f"Populated {corpus_size} documents in {time.perf_counter() - start:.1f}s"
+    )
+
+    queries = generate_queries(n_queries, seed=seed + 1)
+    query_iter = iter(queries * 2)
+    rng = random.Random(seed)
+
+    if "search" in operations:
+        latencies = timed(lambda: store.search(next(query_iter), k=10), n_queries)
+        results.append(summarize("search", corpus_size, latencies, k=10))
+
+    if "search_filtered" in operations:
+        query_iter = iter(queries * 2)
+        metadata_filter = MetadataFilter(
+            categories=["category-1"], created_after=time.time() - 30 * 86400
+        )
+        latencies = timed(
+            lambda: store.search(
+                next(query_iter), k=10, metadata_filter=metadata_filter
+            ),
+            n_queries,
+        )
+        results.append(summarize("search_filtered", corpus_size, latencies, k=10))
+
+    for mode in ("lexical", "hybrid"):
+        if f"search_{mode}" in operations:
+            query_iter = iter(queries * 2)
+            latencies = timed(
+                lambda: store.search(next(query_iter), k=10, mode=mode), n_queries
+            )
+            results.append(summarize(f"search_{mode}", corpus_size, latencies, k=10))
+
+    # add_documents_no_dedup passes a threshold above the maximum score, so
+    # the near-duplicate search is skipped.
+    for offset, (operation, add_kwargs) in enumerate(
+        (
+            ("add_documents", {}),
+            ("add_documents_no_dedup", {"similarity_threshold": 1.1}),
+        )
+    ):
+        if operation not in operations:
+            continue
+        new_docs = iter(
+            generate_documents(n_queries * batch_size, seed=seed + corpus_size + offset)
+        )
+        latencies = timed(
+            lambda: store.add_documents(
+                [next(new_docs) for _ in range(batch_size)], **add_kwargs
+            ),
+            n_queries,
+        )
+        results.append(
+            summarize(operation, corpus_size, latencies, batch_size=batch_size)
+        )
+
+    if "delete_documents_by_id" in operations:
+        metadata_ids = [doc.metadata.id for doc in store.docstore.values()]
+        targets = iter(rng.sample(metadata_ids, min(n_queries, len(metadata_ids))))
+        latencies = timed(
+            lambda: store.delete_documents_by_id([next(targets)]),
+            min(n_queries, len(metadata_ids)),
+        )
+        results.append(summarize("delete_documents_by_id", corpus_size, latencies))
+
+    if "rebuild_index" in operations:
+        latencies = timed(store.rebuild_index, repeat)
+        results.append(summarize("rebuild_index", corpus_size, latencies))
+
+    if "save" in operations:
+        latencies = timed(lambda: store._perform_save("index"), repeat)
+        results.append(summarize("save", corpus_size, latencies))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SemanDoc VectorStore benchmarks")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10000, 100000],
+        help="Corpus sizes to benchmark, default 10000 100000",
+    )
+    parser.add_argument(
+        "--operations",
+        nargs="+",
+        choices=OPERATIONS,
+        default=list(OPERATIONS),
+        help="Operations to benchmark, default all",
+    )
+    parser.add_argument(
+        "--dimension", type=int, default=1024, help="Embedding dimension, default 1024"
+    )
+    parser.add_argument(
+        "--queries",
+        type=int,
+        default=200,
+        help="Number of calls per operation, default 200",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=8,
+        help="Documents per add_documents call, default 8",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=10,
+        help="Number of calls for rebuild_index and save, default 10",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, default 0")
+    parser.add_argument(
+        "--output", type=str, default=None, help="Write results to this JSON file"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    logger.setLevel(logging.INFO)
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dimension": args.dimension,
+            "queries": args.queries,
+            "batch_size": args.batch_size,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+    for size in args.sizes:
+        logger.info(f"Benchmarking corpus of {size} documents")
+        report["results"].extend(
+            run_size(
+                size,
+                args.operations,
+                args.dimension,
+                args.queries,
+                args.batch_size,
+                args.repeat,
+                args.seed,
+            )
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
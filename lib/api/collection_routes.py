@@ -0,0 +1,70 @@
+from contextlib import ExitStack
+from fastapi import APIRouter, Depends, HTTPException, Path, Request
+from typing import Callable, List, Optional
+from pydantic import BaseModel
+import logging
+
+from lib.retrieval.collection_manager import CollectionManager, InvalidCollectionName
+from lib.auth.dependencies import get_api_key
+from lib.api.document_routes import init_routes
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionResponse(BaseModel):
+    name: str
+    loaded: bool
+    memory_bytes: int
+
+
+def init_collection_routes(
+    get_manager: Callable[[], Optional[CollectionManager]],
+) -> APIRouter:
+    """
+    Builds the /collections router. Every collection exposes the full document
+    API under /collections/{name}/documents, backed by its own store from the
+    manager returned by ``get_manager``.
+    """
+    router = APIRouter(prefix="/collections", tags=["collections"])
+
+    def manager_or_503() -> CollectionManager:
+        manager = get_manager()
+        if manager is None:
+            raise HTTPException(status_code=503, detail="Collections are not available")
+        return manager
+
+    def collection_store(
+        request: Request, name: str = Path(..., description="Collection name")
+    ):
+        manager = manager_or_503()
+        try:
+            manager.validate_name(name)
+        except InvalidCollectionName as e:
+            raise HTTPException(status_code=400, detail=e.message)
+        # The collection stays pinned in memory until the request is done.
+        with ExitStack() as stack:
+            yield stack.enter_context(manager.acquire(name))
+            if getattr(request.state, "streamed", False):
+                # The body is sent after this exits; the response unpins it.
+                request.state.release_store = stack.pop_all().close
+
+    @router.get(
+        "/",
+        response_model=List[CollectionResponse],
+        description="List collections on disk and whether they are loaded",
+    )
+    async def list_collections(user_id: Optional[str] = Depends(get_api_key)):
+        try:
+            return manager_or_503().list_collections()
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error listing collections: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"List collections failed: {str(e)}"
+            )
+
+    router.include_router(
+        init_routes(store_dependency=collection_store, prefix="/{name}/documents")
+    )
+    return router
@@ -1,20 +1,38 @@
-from fastapi import APIRouter, HTTPException, Header, Query, Depends, UploadFile, File
-from typing import List, Optional, Dict
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Header,
+    Query,
+    Depends,
+    Request,
+    UploadFile,
+    File,
+)
+from typing import Any, Callable, List, Literal, Optional, Dict
 from pydantic import BaseModel, Field
 import logging
 import time
 from io import BytesIO
+import numpy as np
+import orjson
 import pandas as pd
-from fastapi.responses import StreamingResponse
-
-from lib.retrieval.vectorstore import VectorStore
-from lib.retrieval.schemas import Document, Metadata, MetadataFilter
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from lib.retrieval.vectorstore import VectorStore, VectorStoreError
+from lib.retrieval.vector_io import (
+    encode_npy_records,
+    encode_raw_records,
+    npy_header,
+    vector_record_dtype,
+)
+from lib.retrieval.schemas import Document, Metadata, MetadataFilter, SearchRequest
 from lib.auth.dependencies import get_api_key
+from lib.monitoring.metrics import SERIALIZATION_SECONDS
+from lib.monitoring.tracing import stage
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/documents", tags=["documents"])
-
 
 class MetadataBase(BaseModel):
     id: Optional[str] = None
@@ -31,6 +49,19 @@ class DocumentCreate(DocumentBase):
     pass
 
 
+class VectorMetadata(MetadataBase):
+    start_time: Optional[float] = None
+    valid_time: int = -1
+
+
+class DocumentWithVector(BaseModel):
+    content: str
+    metadata: VectorMetadata
+    vector: List[float] = Field(
+        ..., description="Precomputed float32 embedding from the store's model"
+    )
+
+
 class DocumentResponse(DocumentBase):
     class Config:
         from_attributes = True
@@ -39,9 +70,28 @@ class DocumentResponse(DocumentBase):
 class SearchQuery(BaseModel):
     query: str
     k: int = 5
+    mode: Literal["vector", "lexical", "hybrid"] = Field(
+        "vector",
+        description="vector: semantic search; lexical: BM25 keyword search without "
+        "model inference; hybrid: reciprocal-rank fusion of both",
+    )
     tags: Optional[List[str]] = None
     categories: Optional[List[str]] = None
     score_threshold: Optional[float] = None
+    created_after: Optional[float] = Field(
+        None, description="Only match documents created at or after this Unix timestamp"
+    )
+    created_before: Optional[float] = Field(
+        None,
+        description="Only match documents created at or before this Unix timestamp",
+    )
+    valid_at: Optional[float] = Field(
+        None, description="Only match documents valid at this Unix timestamp"
+    )
+
+
+class BatchSearchQuery(BaseModel):
+    queries: List[SearchQuery]
 
 
 class StatsResponse(BaseModel):
@@ -57,36 +107,151 @@ class SaveResponse(BaseModel):
     message: str
 
 
-def document_to_response(doc: Document) -> DocumentResponse:
-    tags = []
-    for tag in doc.metadata.tags:
-        if isinstance(tag, list):
-            tags.extend([str(t) for t in tag])
-        else:
-            tags.append(str(tag))
-
-    categories = []
-    for cat in doc.metadata.categories:
-        if isinstance(cat, list):
-            categories.extend([str(c) for c in cat])
-        else:
-            categories.append(str(cat))
-
-    return DocumentResponse(
-        content=doc.content,
-        metadata=MetadataBase(id=doc.metadata.id, tags=tags, categories=categories),
-    )
-
-
-def init_routes(vector_store: VectorStore):
+LeanField = Literal["id", "content", "tags", "categories", "start_time", "valid_time"]
+
+
+def document_to_response(
+    doc: Document, fields: Optional[List[str]] = None, score: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Plain-dict form of a ``DocumentResponse``. Tags and categories are already
+    normalized at ingest, so they are passed through as they are.
+
+    With ``fields``, returns the lean form instead: the document id plus only
+    the named fields, flattened to the top level, and the search score if
+    there is one.
+    """
+    metadata = doc.metadata
+    if fields is None:
+        return {
+            "content": doc.content,
+            "metadata": {
+                "id": metadata.id,
+                "tags": metadata.tags,
+                "categories": metadata.categories,
+            },
+        }
+    item = {"id": metadata.id}
+    for name in fields:
+        if name == "content":
+            item[name] = doc.content
+        elif name != "id":
+            item[name] = getattr(metadata, name)
+    if score is not None:
+        item["score"] = float(score)
+    return item
+
+
+def documents_to_response(
+    docs: List[Document],
+    route: str,
+    fields: Optional[List[str]] = None,
+    scores: Optional[List[Optional[float]]] = None,
+) -> ORJSONResponse:
+    # Returning a response skips FastAPI's validation against response_model,
+    # which would rebuild every document as a pydantic model.
+    with stage("serialization", SERIALIZATION_SECONDS, route=route):
+        if scores is None:
+            scores = [None] * len(docs)
+        return ORJSONResponse(
+            [
+                document_to_response(doc, fields, score)
+                for doc, score in zip(docs, scores)
+            ]
+        )
+
+
+def search_query_to_filter(search_query: SearchQuery) -> Optional[MetadataFilter]:
+    if (
+        search_query.tags
+        or search_query.categories
+        or search_query.created_after is not None
+        or search_query.created_before is not None
+        or search_query.valid_at is not None
+    ):
+        return MetadataFilter(
+            tags=search_query.tags,
+            categories=search_query.categories,
+            created_after=search_query.created_after,
+            created_before=search_query.created_before,
+            valid_at=search_query.valid_at,
+        )
+    return None
+
+
+FIELDS_QUERY = Query(
+    None,
+    description="Lean mode: return only each document's id and these fields, "
+    "e.g. fields=content&fields=tags, or just ids with fields=id. Search results "
+    "also carry their score, except for hybrid search",
+)
+
+CONTENT_IDS_QUERY = Query(
+    False,
+    description="Use the content hash as the document id, so resubmitting the "
+    "same content is a no-op",
+)
+
+
+def release_after_response(request: Request) -> BackgroundTask:
+    """
+    Marks the request's response as streamed and returns the task to attach
+    to it. FastAPI runs the exit of ``yield`` dependencies before a streamed
+    body is sent, so a store dependency that holds the store for the request
+    (such as a pinned collection) leaves the release in
+    ``request.state.release_store`` instead, for this task to call.
+    """
+    request.state.streamed = True
+    return BackgroundTask(_release_store, request)
+
+
+def _release_store(request: Request):
+    release = getattr(request.state, "release_store", None)
+    if release is not None:
+        release()
+
+
+def init_routes(
+    vector_store: Optional[VectorStore] = None,
+    store_dependency: Optional[Callable] = None,
+    prefix: str = "/documents",
+) -> APIRouter:
+    """
+    Builds the document router. Endpoints either serve a single store, or
+    resolve their store per request through ``store_dependency``, a FastAPI
+    dependency that may use path parameters declared in ``prefix`` (as the
+    collection routes do with ``/collections/{name}/documents``).
+
+    Handlers that encode or search are plain functions, so FastAPI runs them
+    in its threadpool: a bulk upload then yields to searches between encode
+    chunks instead of holding the event loop until it finishes.
+    """
+    if store_dependency is None:
+        if vector_store is None:
+            raise ValueError("Either vector_store or store_dependency is required")
+
+        def store_dependency() -> VectorStore:
+            return vector_store
+
+    router = APIRouter(prefix=prefix, tags=["documents"])
+
+    def require_writable(vector_store: VectorStore = Depends(store_dependency)):
+        if vector_store.read_only:
+            raise HTTPException(
+                status_code=403, detail="This instance is a read-only replica"
+            )
 
     @router.post(
         "/",
         response_model=DocumentResponse,
         description="Create a new document in the vector store",
+        dependencies=[Depends(require_writable)],
     )
-    async def create_document(
-        document: DocumentCreate, user_id: Optional[str] = Depends(get_api_key)
+    def create_document(
+        document: DocumentCreate,
+        content_ids: bool = CONTENT_IDS_QUERY,
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
             doc = Document(
@@ -96,14 +261,14 @@ def init_routes(vector_store: VectorStore):
                 ),
             )
 
-            added_docs = vector_store.add_documents([doc])
+            added_docs = vector_store.add_documents([doc], content_ids=content_ids)
 
             if not added_docs:
                 raise HTTPException(
                     status_code=409, detail="Document is a duplicate and was not added"
                 )
 
-            return document_to_response(added_docs[0])
+            return ORJSONResponse(document_to_response(added_docs[0]))
         except Exception as e:
             logger.error(f"Error creating document: {e}")
             raise HTTPException(
@@ -114,14 +279,17 @@ def init_routes(vector_store: VectorStore):
         "/webhook",
         response_model=DocumentResponse,
         description="Webhook endpoint for quickly creating documents with minimal data",
+        dependencies=[Depends(require_writable)],
     )
-    async def webhook_create_document(
+    def webhook_create_document(
         content: str,
         tags: List[str] = Query(..., description="Required tags for the document"),
         categories: List[str] = Query(
             ..., description="Required categories for the document"
         ),
+        content_ids: bool = CONTENT_IDS_QUERY,
         user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
             doc = Document(
@@ -130,14 +298,14 @@ def init_routes(vector_store: VectorStore):
             )
 
             logger.info("Processing webhook document creation request")
-            added_docs = vector_store.add_documents([doc])
+            added_docs = vector_store.add_documents([doc], content_ids=content_ids)
 
             if not added_docs:
                 raise HTTPException(
                     status_code=409, detail="Document is a duplicate and was not added"
                 )
 
-            return document_to_response(added_docs[0])
+            return ORJSONResponse(document_to_response(added_docs[0]))
         except Exception as e:
             if isinstance(e, HTTPException):
                 raise e
@@ -150,9 +318,14 @@ def init_routes(vector_store: VectorStore):
         "/batch/",
         response_model=List[DocumentResponse],
         description="Create multiple documents in a single batch operation",
+        dependencies=[Depends(require_writable)],
     )
-    async def create_documents_batch(
-        documents: List[DocumentCreate], user_id: Optional[str] = Depends(get_api_key)
+    def create_documents_batch(
+        documents: List[DocumentCreate],
+        content_ids: bool = CONTENT_IDS_QUERY,
+        fields: Optional[List[LeanField]] = FIELDS_QUERY,
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
             docs = []
@@ -166,27 +339,131 @@ def init_routes(vector_store: VectorStore):
                 )
                 docs.append(doc)
 
-            added_docs = vector_store.add_documents(docs)
+            added_docs = vector_store.add_documents(docs, content_ids=content_ids)
 
-            return [document_to_response(doc) for doc in added_docs]
+            return documents_to_response(
+                added_docs, route="/documents/batch/", fields=fields
+            )
         except Exception as e:
             logger.error(f"Error creating documents batch: {e}")
             raise HTTPException(
                 status_code=500, detail=f"Create documents batch failed: {str(e)}"
             )
 
+    @router.post(
+        "/batch/vectors",
+        response_model=List[DocumentResponse],
+        description="Create documents from precomputed embeddings without running the model",
+        dependencies=[Depends(require_writable)],
+    )
+    def create_documents_with_vectors(
+        documents: List[DocumentWithVector],
+        normalize: bool = Query(
+            False, description="Normalize vectors instead of rejecting non-unit ones"
+        ),
+        content_ids: bool = CONTENT_IDS_QUERY,
+        fields: Optional[List[LeanField]] = FIELDS_QUERY,
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
+    ):
+        try:
+            docs = [
+                Document(
+                    content=doc_data.content,
+                    metadata=Metadata(
+                        id=doc_data.metadata.id,
+                        tags=doc_data.metadata.tags,
+                        categories=doc_data.metadata.categories,
+                        start_time=doc_data.metadata.start_time,
+                        valid_time=doc_data.metadata.valid_time,
+                    ),
+                )
+                for doc_data in documents
+            ]
+            embeddings = np.array(
+                [doc_data.vector for doc_data in documents], dtype=np.float32
+            )
+
+            added_docs = vector_store.add_documents_with_embeddings(
+                docs, embeddings, normalize=normalize, content_ids=content_ids
+            )
+
+            return documents_to_response(
+                added_docs, route="/documents/batch/vectors", fields=fields
+            )
+        except VectorStoreError as e:
+            raise HTTPException(status_code=400, detail=e.message)
+        except Exception as e:
+            logger.error(f"Error creating documents with vectors: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Create documents with vectors failed: {str(e)}",
+            )
+
+    @router.get(
+        "/export/vectors",
+        description="Stream (id, vector) pairs as a .npy structured array or raw binary records",
+    )
+    def export_vectors(
+        request: Request,
+        format: Literal["npy", "raw"] = "npy",
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
+    ):
+        try:
+            count, id_length, batches = vector_store.export_vectors()
+            dimension = vector_store.dimension
+
+            if format == "npy":
+                dtype = vector_record_dtype(dimension, id_length)
+
+                def stream():
+                    yield npy_header(dtype, count)
+                    for ids, vectors in batches:
+                        yield encode_npy_records(ids, vectors, dtype)
+
+                media_type = "application/octet-stream"
+                filename = "vectors.npy"
+            else:
+
+                def stream():
+                    for ids, vectors in batches:
+                        yield encode_raw_records(ids, vectors)
+
+                media_type = "application/octet-stream"
+                filename = "vectors.bin"
+
+            return StreamingResponse(
+                stream(),
+                media_type=media_type,
+                headers={
+                    "Content-Disposition": f"attachment; filename={filename}",
+                    "X-Vector-Count": str(count),
+                    "X-Vector-Dimension": str(dimension),
+                },
+                background=release_after_response(request),
+            )
+        except Exception as e:
+            logger.error(f"Error exporting vectors: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"Export vectors failed: {str(e)}"
+            )
+
     @router.get(
         "/{document_id}",
         response_model=DocumentResponse,
         description="Retrieve a specific document by its ID",
     )
-    async def get_document(
-        document_id: str, user_id: Optional[str] = Depends(get_api_key)
+    def get_document(
+        document_id: str,
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
-            for key, doc in vector_store.docstore.items():
-                if doc.metadata.id == document_id:
-                    return document_to_response(doc)
+            doc_id = vector_store.get_docstore_id(document_id)
+            doc = vector_store.docstore.get(doc_id) if doc_id is not None else None
+            if doc is not None:
+                return ORJSONResponse(document_to_response(doc))
 
             raise HTTPException(
                 status_code=404, detail=f"Document ID {document_id} does not exist"
@@ -199,27 +476,84 @@ def init_routes(vector_store: VectorStore):
                 status_code=500, detail=f"Get document failed: {str(e)}"
             )
 
+    @router.get(
+        "/{document_id}/similar",
+        response_model=List[DocumentResponse],
+        description="Find documents similar to an existing document, using its stored vector",
+    )
+    def get_similar_documents(
+        document_id: str,
+        k: int = 5,
+        tags: Optional[List[str]] = Query(None),
+        categories: Optional[List[str]] = Query(None),
+        created_after: Optional[float] = None,
+        created_before: Optional[float] = None,
+        valid_at: Optional[float] = None,
+        score_threshold: Optional[float] = None,
+        fields: Optional[List[LeanField]] = FIELDS_QUERY,
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
+    ):
+        try:
+            doc_id = vector_store.get_docstore_id(document_id)
+            if doc_id is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Document ID {document_id} does not exist"
+                )
+
+            metadata_filter = MetadataFilter(
+                tags=tags,
+                categories=categories,
+                created_after=created_after,
+                created_before=created_before,
+                valid_at=valid_at,
+            )
+            if not (tags or categories or metadata_filter.has_time_range):
+                metadata_filter = None
+
+            results = vector_store.similarity_search_with_score_by_document_id(
+                doc_id,
+                k=k,
+                metadata_filter=metadata_filter,
+                score_threshold=score_threshold,
+            )
+            return documents_to_response(
+                [doc for doc, _ in results],
+                route="/documents/{document_id}/similar",
+                fields=fields,
+                scores=[score for _, score in results],
+            )
+        except Exception as e:
+            if isinstance(e, HTTPException):
+                raise e
+            logger.error(f"Error finding similar documents: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"Find similar documents failed: {str(e)}"
+            )
+
     @router.delete(
         "/{document_id}",
         response_model=DocumentResponse,
         description="Delete a document by its ID",
+        dependencies=[Depends(require_writable)],
     )
-    async def delete_document(
-        document_id: str, user_id: Optional[str] = Depends(get_api_key)
+    def delete_document(
+        document_id: str,
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
-            doc_found = None
-            for key, doc in vector_store.docstore.items():
-                if doc.metadata.id == document_id:
-                    doc_found = doc
-                    break
+            doc_id = vector_store.get_docstore_id(document_id)
+            doc_found = (
+                vector_store.docstore.get(doc_id) if doc_id is not None else None
+            )
 
             if not doc_found:
                 raise HTTPException(
                     status_code=404, detail=f"Document ID {document_id} does not exist"
                 )
 
-            result_doc = document_to_response(doc_found)
+            result_doc = ORJSONResponse(document_to_response(doc_found))
 
             vector_store.delete_documents_by_id([document_id])
 
@@ -237,74 +571,131 @@ def init_routes(vector_store: VectorStore):
         response_model=List[DocumentResponse],
         description="Search documents using semantic similarity and optional metadata filters",
     )
-    async def search_documents(
-        search_query: SearchQuery, user_id: Optional[str] = Depends(get_api_key)
+    def search_documents(
+        search_query: SearchQuery,
+        fields: Optional[List[LeanField]] = FIELDS_QUERY,
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
-            metadata_filter = None
-            if search_query.tags or search_query.categories:
-                metadata_filter = MetadataFilter(
-                    tags=search_query.tags, categories=search_query.categories
-                )
-
-            results = vector_store.search(
+            results = vector_store.search_with_score(
                 query=search_query.query,
                 k=search_query.k,
-                metadata_filter=metadata_filter,
+                metadata_filter=search_query_to_filter(search_query),
+                mode=search_query.mode,
                 score_threshold=search_query.score_threshold,
             )
 
-            if not results:
-                return []
-
-            return [document_to_response(doc) for doc in results]
+            return documents_to_response(
+                [doc for doc, _ in results],
+                route="/documents/search/",
+                fields=fields,
+                scores=[score for _, score in results],
+            )
         except Exception as e:
             logger.error(f"Error searching documents: {e}")
             raise HTTPException(
                 status_code=500, detail=f"Search documents failed: {str(e)}"
             )
 
+    @router.post(
+        "/search/batch",
+        description="Run many searches in one request. Results are streamed back as "
+        "newline-delimited JSON, one line per query in request order",
+    )
+    def search_documents_batch(
+        request: Request,
+        batch: BatchSearchQuery,
+        fields: Optional[List[LeanField]] = FIELDS_QUERY,
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
+    ):
+        requests = [
+            SearchRequest(
+                query=search_query.query,
+                k=search_query.k,
+                metadata_filter=search_query_to_filter(search_query),
+                mode=search_query.mode,
+                score_threshold=search_query.score_threshold,
+            )
+            for search_query in batch.queries
+        ]
+
+        def stream_results():
+            try:
+                batches = vector_store.search_batch_with_score(requests)
+                for i, results in enumerate(batches):
+                    with SERIALIZATION_SECONDS.time(route="/documents/search/batch"):
+                        line = {
+                            "index": i,
+                            "results": [
+                                document_to_response(doc, fields, score)
+                                for doc, score in results
+                            ],
+                        }
+                        payload = orjson.dumps(line, option=orjson.OPT_APPEND_NEWLINE)
+                    yield payload
+            except Exception as e:
+                # The status line is already sent, so report the failure in-band.
+                logger.error(f"Error in batch search: {e}")
+                yield orjson.dumps(
+                    {"error": f"Batch search failed: {str(e)}"},
+                    option=orjson.OPT_APPEND_NEWLINE,
+                )
+
+        return StreamingResponse(
+            stream_results(),
+            media_type="application/x-ndjson",
+            background=release_after_response(request),
+        )
+
     @router.get(
         "/",
         response_model=List[DocumentResponse],
         description="List all documents with optional filtering by tag and category",
     )
-    async def list_documents(
+    def list_documents(
         skip: int = 0,
         limit: int = 100,
         tag: Optional[str] = None,
         category: Optional[str] = None,
+        created_after: Optional[float] = Query(
+            None,
+            description="Only list documents created at or after this Unix timestamp",
+        ),
+        created_before: Optional[float] = Query(
+            None,
+            description="Only list documents created at or before this Unix timestamp",
+        ),
+        valid_at: Optional[float] = Query(
+            None, description="Only list documents valid at this Unix timestamp"
+        ),
+        fields: Optional[List[LeanField]] = FIELDS_QUERY,
         user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
-            docs = list(vector_store.docstore.values())
+            time_filter = MetadataFilter(
+                created_after=created_after,
+                created_before=created_before,
+                valid_at=valid_at,
+            )
+            if time_filter.has_time_range:
+                docs = vector_store.filter_documents(time_filter)
+            else:
+                docs = list(vector_store.docstore.values())
 
             if tag or category:
-                filtered_docs = []
-                for doc in docs:
-                    tags = []
-                    for t in doc.metadata.tags:
-                        if isinstance(t, list):
-                            tags.extend([str(item) for item in t])
-                        else:
-                            tags.append(str(t))
-
-                    categories = []
-                    for c in doc.metadata.categories:
-                        if isinstance(c, list):
-                            categories.extend([str(item) for item in c])
-                        else:
-                            categories.append(str(c))
-
-                    if (not tag or tag in tags) and (
-                        not category or category in categories
-                    ):
-                        filtered_docs.append(doc)
-                docs = filtered_docs
+                docs = [
+                    doc
+                    for doc in docs
+                    if (not tag or tag in doc.metadata.tags)
+                    and (not category or category in doc.metadata.categories)
+                ]
 
             docs = docs[skip : skip + limit]
 
-            return [document_to_response(doc) for doc in docs]
+            return documents_to_response(docs, route="/documents/", fields=fields)
         except Exception as e:
             logger.error(f"Error listing documents: {e}")
             raise HTTPException(
@@ -315,18 +706,19 @@ def init_routes(vector_store: VectorStore):
         "/{document_id}",
         response_model=DocumentResponse,
         description="Update an existing document by its ID",
+        dependencies=[Depends(require_writable)],
     )
-    async def update_document(
+    def update_document(
         document_id: str,
         document: DocumentCreate,
         user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
-            doc_found = None
-            for key, doc in vector_store.docstore.items():
-                if doc.metadata.id == document_id:
-                    doc_found = doc
-                    break
+            doc_id = vector_store.get_docstore_id(document_id)
+            doc_found = (
+                vector_store.docstore.get(doc_id) if doc_id is not None else None
+            )
 
             if not doc_found:
                 raise HTTPException(
@@ -348,7 +740,7 @@ def init_routes(vector_store: VectorStore):
             if not added_docs:
                 raise HTTPException(status_code=500, detail="Failed to update document")
 
-            return document_to_response(added_docs[0])
+            return ORJSONResponse(document_to_response(added_docs[0]))
         except Exception as e:
             if isinstance(e, HTTPException):
                 raise e
@@ -362,7 +754,10 @@ def init_routes(vector_store: VectorStore):
         response_model=StatsResponse,
         description="Get statistics about documents including counts by tags and categories",
     )
-    async def get_document_stats(user_id: Optional[str] = Depends(get_api_key)):
+    def get_document_stats(
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
+    ):
         try:
             docs = list(vector_store.docstore.values())
 
@@ -374,25 +769,11 @@ def init_routes(vector_store: VectorStore):
             category_count = {}
 
             for doc in docs:
-                doc_tags = []
                 for tag in doc.metadata.tags:
-                    if isinstance(tag, list):
-                        doc_tags.extend([str(t) for t in tag])
-                    else:
-                        doc_tags.append(str(tag))
-
-                for tag in doc_tags:
                     all_tags.add(tag)
                     tag_count[tag] = tag_count.get(tag, 0) + 1
 
-                doc_categories = []
-                for cat in doc.metadata.categories:
-                    if isinstance(cat, list):
-                        doc_categories.extend([str(c) for c in cat])
-                    else:
-                        doc_categories.append(str(cat))
-
-                for category in doc_categories:
+                for category in doc.metadata.categories:
                     all_categories.add(category)
                     category_count[category] = category_count.get(category, 0) + 1
 
@@ -414,8 +795,12 @@ def init_routes(vector_store: VectorStore):
         "/save",
         response_model=SaveResponse,
         description="Manually trigger saving of the vector store to persistent storage",
+        dependencies=[Depends(require_writable)],
     )
-    async def save_vector_store(user_id: Optional[str] = Depends(get_api_key)):
+    def save_vector_store(
+        user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
+    ):
         try:
             logger.info("Manual save triggered via API")
             vector_store.save_index()
@@ -430,12 +815,13 @@ def init_routes(vector_store: VectorStore):
         "/export/xlsx",
         description="Export documents as Excel file",
     )
-    async def export_documents_xlsx(
+    def export_documents_xlsx(
         skip: int = 0,
         limit: int = 1000,
         tag: Optional[str] = None,
         category: Optional[str] = None,
         user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
             filters = []
@@ -509,10 +895,12 @@ def init_routes(vector_store: VectorStore):
         "/upload/xlsx",
         response_model=List[DocumentResponse],
         description="Upload and parse Excel file to add documents",
+        dependencies=[Depends(require_writable)],
     )
-    async def upload_documents_xlsx(
+    def upload_documents_xlsx(
         file: UploadFile = File(...),
         user_id: Optional[str] = Depends(get_api_key),
+        vector_store: VectorStore = Depends(store_dependency),
     ):
         try:
             logger.info(f"Received file upload: {file.filename}")
@@ -526,7 +914,7 @@ def init_routes(vector_store: VectorStore):
 
             # Read Excel file
             try:
-                content = await file.read()
+                content = file.file.read()
                 excel_data = BytesIO(content)
             except Exception as e:
                 logger.error(f"Error reading uploaded file: {e}")
@@ -657,7 +1045,7 @@ def init_routes(vector_store: VectorStore):
             logger.info(f"Adding {len(documents)} documents from Excel file")
             added_docs = vector_store.add_documents(documents)
 
-            return [document_to_response(doc) for doc in added_docs]
+            return documents_to_response(added_docs, route="/documents/upload/xlsx")
         except Exception as e:
             if isinstance(e, HTTPException):
                 raise e
@@ -5,6 +5,7 @@ import logging
 
 from lib.db.database import get_db
 from lib.db.crud import get_api_key_by_key, update_api_key_last_used
+from lib.monitoring.tracing import stage
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,8 @@ async def get_api_key(
         logger.warning("No API key provided, using bypass mode")
         return None
 
-    api_key = get_api_key_by_key(db, x_api_key)
+    with stage("auth"):
+        api_key = get_api_key_by_key(db, x_api_key)
 
     if not api_key:
         logger.warning("Invalid API key provided, using bypass mode")
@@ -33,7 +35,8 @@ async def get_api_key(
         return None
 
     # Update last used time
-    update_api_key_last_used(db, api_key)
+    with stage("auth"):
+        update_api_key_last_used(db, api_key)
 
     logger.info(f"Authenticated request with API key: {api_key.name}")
     return api_key.user_id
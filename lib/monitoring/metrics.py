@@ -0,0 +1,385 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+            *self._samples(),
+        ]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. Either set explicitly, or computed at scrape
+    time from a callback registered with ``set_function``.
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def remove(self, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values.pop(key, None)
+            self._functions.pop(key, None)
+
+    def remove_function(self, function: Callable[[], float], **labels):
+        """Removes the callback of the labels, if it is still ``function``."""
+        key = self._label_values(labels)
+        with self._lock:
+            if self._functions.get(key) is function:
+                del self._functions[key]
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                items.append((key, float(function())))
+            except Exception:
+                continue
+        return [
+            f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(
+                    f"{self.name}_bucket{self._format_labels(key, le)} "
+                    f"{_format_value(cumulative)}"
+                )
+            le = 'le="+Inf"'
+            lines.append(
+                f"{self.name}_bucket{self._format_labels(key, le)} "
+                f"{_format_value(state[-1])}"
+            )
+            lines.append(
+                f"{self.name}_sum{self._format_labels(key)} {_format_value(state[-2])}"
+            )
+            lines.append(
+                f"{self.name}_count{self._format_labels(key)} {_format_value(state[-1])}"
+            )
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class TimedLock:
+    """
+    Wraps a lock and records how long callers wait to acquire it.
+    """
+
+    def __init__(self, inner, histogram: Histogram, **labels):
+        self._inner = inner
+        self._histogram = histogram
+        self._labels = labels
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        start = time.perf_counter()
+        acquired = self._inner.acquire(blocking, timeout)
+        self._histogram.observe(time.perf_counter() - start, **self._labels)
+        return acquired
+
+    def release(self):
+        self._inner.release()
+
+    def locked(self) -> bool:
+        return self._inner.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "semandoc_http_requests_total",
+    "HTTP requests by route and status code.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "semandoc_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ("method", "route"),
+)
+ENCODE_SECONDS = REGISTRY.histogram(
+    "semandoc_embedding_encode_seconds",
+    "Time spent in the embedding model per encode call.",
+    ("kind",),
+)
+ENCODE_QUEUE_DEPTH = REGISTRY.gauge(
+    "semandoc_embedding_queue_depth",
+    "Encodes waiting for a model slot, by priority class.",
+    ("priority",),
+)
+ENCODES_RUNNING = REGISTRY.gauge(
+    "semandoc_embedding_encodes_running",
+    "Encodes holding a model slot, by priority class.",
+    ("priority",),
+)
+ENCODE_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "semandoc_embedding_queue_wait_seconds",
+    "Time encodes waited for a model slot, by priority class.",
+    ("priority",),
+)
+ENCODE_BATCH_SIZE = REGISTRY.histogram(
+    "semandoc_embedding_batch_size",
+    "Number of texts per embedding model batch.",
+    ("kind",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+FAISS_SEARCH_SECONDS = REGISTRY.histogram(
+    "semandoc_faiss_search_seconds",
+    "Time spent in faiss index.search.",
+    ("store",),
+)
+FILTER_SECONDS = REGISTRY.histogram(
+    "semandoc_metadata_filter_seconds",
+    "Time spent applying validity and metadata filters to search candidates.",
+    ("store",),
+)
+SERIALIZATION_SECONDS = REGISTRY.histogram(
+    "semandoc_response_serialization_seconds",
+    "Time spent converting documents to API responses.",
+    ("route",),
+)
+DOCSTORE_DOCUMENTS = REGISTRY.gauge(
+    "semandoc_docstore_documents",
+    "Documents in the docstore.",
+    ("store",),
+)
+INDEX_VECTORS = REGISTRY.gauge(
+    "semandoc_index_vectors",
+    "Vectors in the faiss index (ntotal).",
+    ("store",),
+)
+SAVE_SECONDS = REGISTRY.histogram(
+    "semandoc_save_duration_seconds",
+    "Duration of vector store saves.",
+    ("store",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+SAVE_BYTES = REGISTRY.gauge(
+    "semandoc_save_size_bytes",
+    "Size of the last saved snapshot in bytes.",
+    ("store",),
+)
+SAVE_QUEUE_DEPTH = REGISTRY.gauge(
+    "semandoc_save_queue_depth",
+    "Save tasks waiting for the save worker.",
+    ("store",),
+)
+UNSAVED_MUTATIONS = REGISTRY.gauge(
+    "semandoc_unsaved_mutations",
+    "Mutations not yet covered by a successful save.",
+    ("store",),
+)
+SAVES = REGISTRY.counter(
+    "semandoc_saves_total",
+    "Completed save operations by outcome.",
+    ("outcome",),
+)
+DUPLICATES_REJECTED = REGISTRY.counter(
+    "semandoc_duplicates_rejected_total",
+    "Documents rejected as duplicates before encoding, by kind (exact or near).",
+    ("kind",),
+)
+SEARCHES_IN_FLIGHT = REGISTRY.gauge(
+    "semandoc_searches_in_flight",
+    "faiss searches currently running, across all stores.",
+)
+LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    "semandoc_lock_wait_seconds",
+    "Time spent waiting to acquire vector store locks.",
+    ("lock",),
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 0.5, 1, 5, 30),
+)
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from lib.monitoring.metrics import Histogram
+
+TRACE_HEADER = "X-SemanDoc-Trace"
+
+slow_query_logger = logging.getLogger("semandoc.slow_query")
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar(
+    "semandoc_request_trace", default=None
+)
+
+
+class RequestTrace:
+    """
+    Stage timings and annotations collected over the lifetime of one request.
+
+    Stages with the same name accumulate, so a request that encodes twice
+    reports the total encode time. Counters such as candidates scanned are
+    summed with ``count``; other fields keep the last value set.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.fields: Dict[str, Any] = {}
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add_stage(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1):
+        self.fields[name] = self.fields.get(name, 0) + amount
+
+    def header_value(self) -> str:
+        """Formats the stage timings like a Server-Timing header, in milliseconds."""
+        parts = [
+            f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()
+        ]
+        parts.append(f"total;dur={self.elapsed * 1000:.3f}")
+        return ", ".join(parts)
+
+
+def start_trace():
+    """Starts a trace for the current context and returns the reset token."""
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name: str, histogram: Optional[Histogram] = None, **labels):
+    """
+    Times a block as a named stage of the current request trace and, if given,
+    observes the duration on a metrics histogram as well.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if histogram is not None:
+            histogram.observe(elapsed, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(name, elapsed)
+
+
+def annotate(**fields):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+def count(name: str, amount: int = 1):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, amount)
+
+
+def query_hash(query: str) -> str:
+    """Short stable digest of a query, so slow-query logs do not carry its text."""
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()[:16]
+
+
+def log_slow_request(
+    trace: RequestTrace,
+    method: str,
+    route: str,
+    status: int,
+    threshold: float,
+    elapsed: Optional[float] = None,
+):
+    """
+    Logs the request to the slow-query logger if it took at least
+    ``threshold`` seconds. A negative threshold disables the log. The
+    duration defaults to the time since the trace started.
+    """
+    if elapsed is None:
+        elapsed = trace.elapsed
+    if threshold < 0 or elapsed < threshold:
+        return
+    stages = " ".join(
+        f"{name}={seconds * 1000:.1f}ms" for name, seconds in trace.stages.items()
+    )
+    fields = " ".join(f"{key}={value}" for key, value in trace.fields.items())
+    slow_query_logger.warning(
+        f"Slow request {method} {route} status={status} "
+        f"total={elapsed * 1000:.1f}ms {stages} {fields}".rstrip()
+    )
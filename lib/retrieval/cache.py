@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# How get_or_compute obtained a value.
+HIT = "hit"
+MISS = "miss"
+WAITED = "waited"
+
+
+class QueryResultCache:
+    """
+    LRU cache with a TTL for search results.
+
+    Entries are tagged with the index generation they were computed against and
+    are treated as misses once the generation moves on, so any add, remove or
+    rebuild invalidates the cache without having to walk it. Concurrent misses
+    for the same key are coalesced: the first caller computes the result and the
+    others wait for it.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[Hashable, int], Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_compute(
+        self, key: Hashable, generation: int, compute: Callable[[], Any]
+    ) -> Tuple[Any, str]:
+        """
+        Returns the value for the key and how it was obtained: HIT from the
+        cache, MISS computed by this caller, or WAITED for another caller
+        computing it.
+        """
+        if self.max_entries <= 0:
+            return compute(), MISS
+
+        flight_key = (key, generation)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, stored_at, value = entry
+                if (
+                    entry_generation == generation
+                    and time.monotonic() - stored_at <= self.ttl
+                ):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, HIT
+                del self._entries[key]
+
+            self.misses += 1
+            future = self._inflight.get(flight_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[flight_key] = future
+
+        if not owner:
+            return future.result(), WAITED
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[flight_key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[flight_key]
+            self._entries[key] = (generation, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        future.set_result(value)
+        return value, MISS
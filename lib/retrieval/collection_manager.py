@@ -0,0 +1,204 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from lib.retrieval.replica import SnapshotWatcher
+from lib.retrieval.vectorstore import VectorStore, VectorStoreError
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+class InvalidCollectionName(VectorStoreError):
+    pass
+
+
+class _Collection:
+    def __init__(self, name: str, store: VectorStore, services: List[Any]):
+        self.name = name
+        self.store = store
+        # Background workers bound to the store (auto-save, expiry sweeps),
+        # started on load and stopped before eviction.
+        self.services = services
+        self.pins = 0
+
+
+class CollectionManager:
+    """
+    Named vector stores kept in ``{data_dir}/{name}``, each with its own index,
+    docstore, write-ahead log and save cycle.
+
+    Collections are opened on first use and stay resident until the combined
+    ``memory_bytes`` of the loaded stores exceeds ``memory_budget``. The least
+    recently used collections are then saved and closed until the total fits
+    again; they are reopened from disk on their next use. Collections in use by
+    a request are pinned and never evicted, so the budget can be exceeded
+    temporarily while they are. A budget of 0 disables eviction.
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        store_factory: Callable[[str], VectorStore],
+        memory_budget: int = 0,
+        services_factory: Optional[Callable[[VectorStore], List[Any]]] = None,
+        replica_poll_interval: float = 0,
+    ):
+        """
+        Args:
+            data_dir: Folder holding one subfolder per collection.
+            store_factory: Opens the store of the given folder path.
+            memory_budget: Approximate bytes of vectors and contents the loaded
+                collections may hold, 0 for no limit.
+            services_factory: Builds the background workers of a newly opened
+                store; each needs ``start`` and ``stop`` methods.
+            replica_poll_interval: Seconds between snapshot checks of read-only
+                collections, which reload when their primary saves. 0 to never
+                reload them.
+        """
+        self.data_dir = Path(data_dir)
+        self.store_factory = store_factory
+        self.memory_budget = memory_budget
+        self.services_factory = services_factory
+        self.replica_poll_interval = replica_poll_interval
+        self._lock = threading.Lock()
+        # Loaded collections in least to most recently used order.
+        self._collections: "OrderedDict[str, _Collection]" = OrderedDict()
+        # Held while a collection is being opened or closed, so a collection is
+        # never loaded twice or reopened before its final save is written.
+        self._name_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def validate_name(name: str):
+        if not COLLECTION_NAME_PATTERN.match(name):
+            raise InvalidCollectionName(
+                f"Invalid collection name {name!r}: use up to 64 letters, digits, "
+                "'-' or '_', starting with a letter or digit"
+            )
+
+    def _pin(self, name: str) -> Optional[_Collection]:
+        """Must be called with the lock held."""
+        collection = self._collections.get(name)
+        if collection is not None:
+            collection.pins += 1
+            self._collections.move_to_end(name)
+        return collection
+
+    def _open(self, name: str) -> _Collection:
+        logger.info(f"Loading collection {name}")
+        path = str(self.data_dir / name)
+        store = self.store_factory(path)
+        services = self.services_factory(store) if self.services_factory else []
+        collection = _Collection(name, store, services)
+        if store.read_only and self.replica_poll_interval > 0:
+            # Requests pin the collection and take its store at that moment,
+            # so swapping the store only affects later requests.
+            services.append(
+                SnapshotWatcher(
+                    get_store=lambda: collection.store,
+                    open_store=lambda: self.store_factory(path),
+                    on_reload=lambda new_store: setattr(collection, "store", new_store),
+                    poll_interval=self.replica_poll_interval,
+                )
+            )
+        for service in services:
+            service.start()
+        return collection
+
+    def _close(self, collection: _Collection):
+        logger.info(f"Unloading collection {collection.name}")
+        for service in collection.services:
+            service.stop()
+        collection.store.close(save=True)
+
+    @contextmanager
+    def acquire(self, name: str) -> Iterator[VectorStore]:
+        """Yields the store of a collection, loading it if needed."""
+        self.validate_name(name)
+        with self._lock:
+            collection = self._pin(name)
+            name_lock = self._name_locks.setdefault(name, threading.Lock())
+
+        if collection is None:
+            with name_lock:
+                with self._lock:
+                    collection = self._pin(name)
+                if collection is None:
+                    collection = self._open(name)
+                    with self._lock:
+                        collection.pins = 1
+                        self._collections[name] = collection
+
+        try:
+            yield collection.store
+        finally:
+            with self._lock:
+                collection.pins -= 1
+            self._evict_over_budget()
+
+    def _evict_over_budget(self):
+        if self.memory_budget <= 0:
+            return
+        victims = []
+        with self._lock:
+            total = sum(c.store.memory_bytes for c in self._collections.values())
+            for name, collection in list(self._collections.items()):
+                if total <= self.memory_budget:
+                    break
+                if collection.pins:
+                    continue
+                # A collection whose name lock is taken is being opened by
+                # another request, so it is about to be used; skip it.
+                name_lock = self._name_locks[name]
+                if not name_lock.acquire(blocking=False):
+                    continue
+                del self._collections[name]
+                total -= collection.store.memory_bytes
+                victims.append((collection, name_lock))
+
+        for collection, name_lock in victims:
+            try:
+                self._close(collection)
+            except Exception as e:
+                logger.error(f"Error unloading collection {collection.name}: {e}")
+            finally:
+                name_lock.release()
+
+    def list_collections(self) -> List[Dict[str, Any]]:
+        """Collections on disk or loaded, with the memory held by loaded ones."""
+        with self._lock:
+            loaded = {
+                name: collection.store.memory_bytes
+                for name, collection in self._collections.items()
+            }
+        names = set(loaded)
+        if self.data_dir.exists():
+            names.update(
+                path.name
+                for path in self.data_dir.iterdir()
+                if path.is_dir() and COLLECTION_NAME_PATTERN.match(path.name)
+            )
+        return [
+            {
+                "name": name,
+                "loaded": name in loaded,
+                "memory_bytes": loaded.get(name, 0),
+            }
+            for name in sorted(names)
+        ]
+
+    def close(self):
+        """Saves and closes every loaded collection."""
+        with self._lock:
+            collections = list(self._collections.values())
+            self._collections.clear()
+        for collection in collections:
+            try:
+                self._close(collection)
+            except Exception as e:
+                logger.error(f"Error unloading collection {collection.name}: {e}")
@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+import faiss
+import torch
+
+from lib.monitoring.metrics import SEARCHES_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PARALLELISM_MODES = ("intra", "inter", "adaptive")
+
+
+class ReadWriteLock:
+    """
+    Lets any number of readers hold the lock together, or a single writer
+    alone. Waiting writers block new readers, so a steady stream of searches
+    cannot starve an update.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class SearchThreadPolicy:
+    """
+    Decides how many OpenMP threads each faiss search may use.
+
+    ``intra`` gives every query all ``max_threads``, which minimises latency
+    when queries arrive one at a time. ``inter`` runs each query on a single
+    thread, so concurrent requests scale across cores without oversubscribing
+    them. ``adaptive`` splits ``max_threads`` evenly between the searches
+    running at the moment a query starts, behaving like ``intra`` when idle
+    and like ``inter`` under load.
+
+    OpenMP thread counts are per calling thread, so the setting applies to
+    the request thread running the query and nothing else.
+    """
+
+    def __init__(self, mode: str = "adaptive", max_threads: int = 0):
+        """
+        Args:
+            mode: One of "intra", "inter" or "adaptive".
+            max_threads: Threads a single query may use, 0 for the CPU count.
+        """
+        if mode not in SEARCH_PARALLELISM_MODES:
+            raise ValueError(f"Unknown search parallelism mode: {mode}")
+        self.mode = mode
+        self.max_threads = max_threads or os.cpu_count() or 1
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def threads_for(self, in_flight: int) -> int:
+        if self.mode == "intra":
+            return self.max_threads
+        if self.mode == "inter":
+            return 1
+        return max(1, self.max_threads // max(1, in_flight))
+
+    @contextmanager
+    def search(self) -> Iterator[int]:
+        """Runs a faiss search with this policy's thread count, which it yields."""
+        with self._lock:
+            self._in_flight += 1
+            in_flight = self._in_flight
+        threads = self.threads_for(in_flight)
+        faiss.omp_set_num_threads(threads)
+        try:
+            yield threads
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+_search_policy = SearchThreadPolicy()
+SEARCHES_IN_FLIGHT.set_function(lambda: _search_policy.in_flight)
+
+
+def search_threads():
+    """Context manager applying the process-wide policy to one faiss search."""
+    return _search_policy.search()
+
+
+def configure_threads(
+    search_parallelism: str = "adaptive", faiss_threads: int = 0, torch_threads: int = 0
+) -> SearchThreadPolicy:
+    """
+    Sets the process-wide thread policies. Stores look the search policy up
+    on every query, so this may run after they are created.
+
+    Args:
+        search_parallelism: Mode of the faiss search policy.
+        faiss_threads: Threads a single faiss search may use, 0 for the CPU count.
+        torch_threads: Intra-op threads torch uses for encoding, shared by all
+            requests, 0 to keep torch's default.
+    """
+    global _search_policy
+    _search_policy = SearchThreadPolicy(search_parallelism, faiss_threads)
+    logger.info(
+        f"faiss searches use {search_parallelism} parallelism with up to "
+        f"{_search_policy.max_threads} threads"
+    )
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+        logger.info(f"torch uses {torch_threads} intra-op threads")
+    return _search_policy
@@ -0,0 +1,174 @@
+import hashlib
+import re
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from lib.retrieval.concurrency import ReadWriteLock
+from lib.retrieval.schemas import Document
+
+# Largest prime below 2**32, so hash arithmetic fits in uint64 without overflow.
+_PRIME = np.uint64(4294967291)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def content_hash(text: str) -> str:
+    """Stable digest of a document's exact content, usable as a document id."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def assign_content_ids(docs: List[Document]) -> List[str]:
+    """
+    Replaces each document's metadata id with its content hash and returns the
+    ids, so resubmitting the same content maps to the same document.
+    """
+    for doc in docs:
+        doc.metadata.id = content_hash(doc.content)
+    return [doc.metadata.id for doc in docs]
+
+
+class ContentHashIndex:
+    """Maps exact content digests to the ids of the documents holding that content."""
+
+    def __init__(self):
+        self._ids: Dict[str, Set[str]] = {}
+        self._lock = ReadWriteLock()
+
+    def add(self, doc_id: str, text: str) -> None:
+        digest = content_hash(text)
+        with self._lock.write():
+            self._ids.setdefault(digest, set()).add(doc_id)
+
+    def remove(self, doc_id: str, text: str) -> None:
+        digest = content_hash(text)
+        with self._lock.write():
+            ids = self._ids.get(digest)
+            if ids is None:
+                return
+            ids.discard(doc_id)
+            if not ids:
+                del self._ids[digest]
+
+    def clear(self) -> None:
+        with self._lock.write():
+            self._ids = {}
+
+    def find(self, text: str) -> Optional[str]:
+        """Id of a stored document with exactly this content, if any."""
+        with self._lock.read():
+            ids = self._ids.get(content_hash(text))
+            return next(iter(ids)) if ids else None
+
+
+class MinHashLSHIndex:
+    """
+    Finds stored documents whose content is nearly identical to a given text.
+
+    Contents are reduced to sets of character shingles, after lowercasing and
+    collapsing whitespace, and summarised by MinHash signatures whose agreement
+    estimates the Jaccard similarity of those sets. Signatures are split into
+    bands and bucketed, so a lookup only compares against documents sharing at
+    least one band instead of scanning the docstore.
+
+    Shingles are hashed with Python's per-process string hash, so signatures
+    are not persisted; the index is rebuilt from the docstore on load.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        """
+        Args:
+            num_perm: Signature length. More permutations give finer estimates.
+            bands: Number of LSH bands, which must divide ``num_perm``. More
+                bands surface less similar candidates.
+            shingle_size: Characters per shingle.
+            seed: Seed of the hash permutations.
+        """
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm")
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[tuple, Set[str]] = {}
+        self._lock = ReadWriteLock()
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of a text, or None if it has no content."""
+        text = _WHITESPACE.sub(" ", text.lower()).strip()
+        if not text:
+            return None
+        n = self.shingle_size
+        shingles = {text[i : i + n] for i in range(max(1, len(text) - n + 1))}
+        hashes = np.fromiter(
+            (hash(s) & 0xFFFFFFFF for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[tuple]:
+        return [
+            (band, signature[band * self.rows : (band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def add(self, doc_id: str, text: str) -> None:
+        signature = self.signature(text)
+        if signature is None:
+            return
+        with self._lock.write():
+            if doc_id in self._signatures:
+                return
+            self._signatures[doc_id] = signature
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id: str, text: str) -> None:
+        with self._lock.write():
+            signature = self._signatures.pop(doc_id, None)
+            if signature is None:
+                return
+            for key in self._band_keys(signature):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def clear(self) -> None:
+        with self._lock.write():
+            self._signatures = {}
+            self._buckets = {}
+
+    def find(self, text: str, threshold: float) -> Optional[str]:
+        """
+        Id of the stored document most similar to ``text``, if its estimated
+        Jaccard similarity is at least ``threshold``.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        best_id, best = None, threshold
+        with self._lock.read():
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+            for doc_id in candidates:
+                similarity = float(np.mean(self._signatures[doc_id] == signature))
+                if similarity >= best:
+                    best_id, best = doc_id, similarity
+        return best_id
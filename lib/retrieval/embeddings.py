@@ -1,5 +1,11 @@
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
+from lib.monitoring.metrics import ENCODE_BATCH_SIZE, ENCODE_SECONDS
+
+DEFAULT_QUERY_INSTRUCTION = "为这个句子生成表示以用于检索相关文章："
+
 
 class HuggingFaceEmbeddings:
     def __init__(
@@ -8,15 +14,91 @@ class HuggingFaceEmbeddings:
         model_name: str,
         device: str,
         normalize_embeddings: bool = True,
+        max_tokens_per_batch: int = 16384,
+        max_batch_size: int = 128,
+        instruct_documents: bool = True,
     ):
+        """
+        Args:
+            query_instruction: Instruction prefixed to every query before encoding.
+            model_name: Name or path of the SentenceTransformer model.
+            device: Computing device (cpu or cuda).
+            normalize_embeddings: Whether to L2-normalize the embeddings.
+            max_tokens_per_batch: Padded token budget of one model batch. Inputs are
+                grouped by length so short texts are not padded up to long ones,
+                and each batch is sized to stay within this budget.
+            max_batch_size: Upper bound on the number of texts in one batch.
+            instruct_documents: Whether stored documents are also prefixed with
+                the query instruction. Indexes built with a different setting must
+                be rebuilt, since their vectors are not comparable.
+        """
         self.model = SentenceTransformer(model_name, device=device)
         self.normalize_embeddings = normalize_embeddings
         self.query_instruction = query_instruction
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_batch_size = max_batch_size
+        self.instruct_documents = instruct_documents
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _token_lengths(self, texts):
+        """
+        Estimated tokenized lengths, from character counts plus the special
+        tokens. These are close to the token counts of CJK text and above
+        them for most other text, so batches stay within the budget without
+        tokenizing every input a second time.
+        """
+        max_length = self.model.max_seq_length
+        return [min(len(text) + 2, max_length) for text in texts]
+
+    def _length_buckets(self, lengths):
+        """
+        Groups text indices, shortest first, into batches whose padded size
+        (batch size times longest sequence) fits the token budget.
+        """
+        order = sorted(range(len(lengths)), key=lengths.__getitem__)
+        batches = []
+        batch = []
+        for i in order:
+            # Sorted ascending, so the current text is the longest in the batch.
+            padded = (len(batch) + 1) * lengths[i]
+            if batch and (
+                padded > self.max_tokens_per_batch or len(batch) >= self.max_batch_size
+            ):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
 
-    def _embed_texts(self, texts):
-        embeddings = self.model.encode(
-            [self.query_instruction + text for text in texts], convert_to_tensor=True
-        )
+    def _encode(self, texts, kind: str = "query"):
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        embeddings = [None] * len(texts)
+        for batch in self._length_buckets(self._token_lengths(texts)):
+            ENCODE_BATCH_SIZE.observe(len(batch), kind=kind)
+            with ENCODE_SECONDS.time(kind=kind):
+                batch_embeddings = self.model.encode(
+                    [texts[i] for i in batch],
+                    batch_size=len(batch),
+                    convert_to_tensor=True,
+                )
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+
+        embeddings = torch.stack(embeddings)
         if self.normalize_embeddings:
             embeddings = embeddings / embeddings.norm(dim=1, keepdim=True)
         return embeddings.cpu().numpy()
+
+    def _embed_texts(self, texts, kind: str = "query"):
+        return self._encode([self.query_instruction + text for text in texts], kind)
+
+    def _embed_documents(self, texts):
+        if self.instruct_documents:
+            return self._embed_texts(texts, kind="document")
+        return self._encode(list(texts), kind="document")
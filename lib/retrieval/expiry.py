@@ -0,0 +1,132 @@
+import heapq
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from lib.retrieval.vectorstore import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryIndex:
+    """
+    Time-ordered index of document expiry deadlines.
+
+    Entries are kept in a min-heap keyed on ``start_time + valid_time`` so the
+    next document to expire is always at the top. Removals are lazy: the heap
+    may hold stale entries, which are skipped when they surface.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def add(self, doc_id: str, expires_at: Optional[float]) -> None:
+        if expires_at is None:
+            self.discard(doc_id)
+            return
+        with self._lock:
+            self._deadlines[doc_id] = expires_at
+            heapq.heappush(self._heap, (expires_at, doc_id))
+
+    def discard(self, doc_id: str) -> None:
+        with self._lock:
+            if self._deadlines.pop(doc_id, None) is None:
+                return
+            # Compact once stale entries dominate the heap.
+            if len(self._heap) > 64 and len(self._heap) > 2 * len(self._deadlines):
+                self._heap = [(t, d) for d, t in self._deadlines.items()]
+                heapq.heapify(self._heap)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap = []
+            self._deadlines = {}
+
+    def _prune(self) -> None:
+        while self._heap:
+            expires_at, doc_id = self._heap[0]
+            if self._deadlines.get(doc_id) == expires_at:
+                return
+            heapq.heappop(self._heap)
+
+    def next_expiry(self) -> Optional[float]:
+        with self._lock:
+            self._prune()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: Optional[float] = None) -> List[str]:
+        """Remove and return the ids of every document expired at ``now``."""
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            while True:
+                self._prune()
+                if not self._heap or self._heap[0][0] >= now:
+                    break
+                _, doc_id = heapq.heappop(self._heap)
+                del self._deadlines[doc_id]
+                expired.append(doc_id)
+        return expired
+
+
+class ExpirySweeper:
+
+    def __init__(self, vector_store: "VectorStore", sweep_interval: int = 60):
+        self.vector_store = vector_store
+        self.sweep_interval = sweep_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sweeper_worker(self):
+        logger.info(f"Expiry sweeper started with interval: {self.sweep_interval}s")
+
+        while not self._stop_event.is_set():
+            try:
+                removed = self.vector_store.remove_expired_documents()
+                if removed:
+                    logger.info(f"Evicted {len(removed)} expired documents")
+            except Exception as e:
+                logger.error(f"Error during expiry sweep: {e}")
+
+            # Wake up early when the next deadline falls inside the interval.
+            wait_time = self.sweep_interval
+            next_expiry = self.vector_store.next_expiry()
+            if next_expiry is not None:
+                wait_time = min(wait_time, max(1, next_expiry - time.time()))
+            self._stop_event.wait(wait_time)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            logger.warning("Expiry sweeper is already running")
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._sweeper_worker,
+            name="VectorStoreExpirySweeperThread",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info("Started vector store expiry sweeper")
+
+    def stop(self):
+        if self._thread is None or not self._thread.is_alive():
+            logger.warning("Expiry sweeper is not running")
+            return
+
+        logger.info("Stopping expiry sweeper...")
+        self._stop_event.set()
+        self._thread.join(timeout=30)
+
+        if self._thread.is_alive():
+            logger.warning("Expiry sweeper did not stop gracefully")
+        else:
+            logger.info("Expiry sweeper stopped")
+            self._thread = None
@@ -0,0 +1,278 @@
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+class IndexView:
+    """
+    Immutable point-in-time view of the vector index and its row mapping.
+
+    VectorStore publishes a new view with a single reference assignment after
+    every change, so a reader that takes ``store._view`` once sees a
+    consistent index and mapping for the rest of its query without taking a
+    lock, however writers proceed in the meantime.
+
+    Rows ``[0, base_ntotal)`` are held by ``base``, a faiss index that is never
+    modified after it is published. Rows added since are held by ``delta``, a
+    slice of an append-only buffer that writers fill past the end of every
+    published view. Removed rows are masked by ``removed`` until the next
+    compaction rebuilds the base and renumbers the rows densely.
+
+    ``row_ids`` and ``id_to_row`` are shared by all views between two
+    compactions. Writers only append to ``row_ids`` and only add ids that
+    have no row yet to ``id_to_row``, and readers never look at rows at or
+    past their ``ntotal``, so both stay valid for every view. Removed ids keep
+    their stale entry, masked by ``removed``; an id added again after that
+    maps to its new row through ``readded``, which each view owns.
+
+    ``start_times`` and ``expires_at`` hold each row's document times, with
+    ``inf`` for documents that never expire, so time filters resolve to rows
+    with numpy alone. ``base_by_time`` holds the base rows sorted by start
+    time along with those times, and ``delta_sorted`` tells whether the
+    appended rows are still in start time order, which they usually are.
+
+    Searches skip removed base rows with a selector built once per view, so
+    they fetch only ``k`` rows. GPU indexes take no selectors; there the
+    removed rows are fetched and dropped, which VectorStore bounds by
+    compacting early.
+    """
+
+    __slots__ = (
+        "base",
+        "base_ntotal",
+        "delta",
+        "row_ids",
+        "id_to_row",
+        "readded",
+        "removed",
+        "ntotal",
+        "start_times",
+        "expires_at",
+        "base_by_time",
+        "delta_sorted",
+        "_removed_cache",
+    )
+
+    def __init__(
+        self,
+        base,
+        delta: np.ndarray,
+        row_ids: List[str],
+        id_to_row: Dict[str, int],
+        removed: FrozenSet[int] = frozenset(),
+        start_times: Optional[np.ndarray] = None,
+        expires_at: Optional[np.ndarray] = None,
+        base_by_time: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+        delta_sorted: bool = True,
+        readded: Optional[Dict[str, int]] = None,
+    ):
+        self.base = base
+        self.base_ntotal = base.ntotal
+        self.delta = delta
+        self.row_ids = row_ids
+        self.id_to_row = id_to_row
+        self.readded = {} if readded is None else readded
+        self.removed = removed
+        self.ntotal = self.base_ntotal + len(delta)
+        if start_times is None:
+            start_times = np.full(self.ntotal, np.nan)
+            expires_at = np.full(self.ntotal, np.inf)
+        self.start_times = start_times
+        self.expires_at = expires_at
+        if base_by_time is None:
+            order = np.argsort(start_times[: self.base_ntotal], kind="stable")
+            base_by_time = (start_times[order], order)
+        self.base_by_time = base_by_time
+        self.delta_sorted = delta_sorted
+        self._removed_cache = None
+
+    def _removed(self) -> Tuple[np.ndarray, int, Optional[faiss.IDSelector]]:
+        """
+        Sorted removed rows, how many of them are base rows, and a selector
+        that excludes those base rows, or None if there are none or the base
+        index cannot take one. Built on first use; views never change, so
+        concurrent readers at worst build it twice.
+        """
+        if self._removed_cache is None:
+            removed = np.sort(
+                np.fromiter(self.removed, dtype=np.int64, count=len(self.removed))
+            )
+            n_base = int(np.searchsorted(removed, self.base_ntotal))
+            selector = None
+            if n_base and not _is_gpu_index(self.base):
+                excluded = faiss.IDSelectorBatch(removed[:n_base])
+                selector = faiss.IDSelectorNot(excluded)
+                # The wrapper does not own the selector it negates.
+                selector.referenced_objects = [excluded]
+            self._removed_cache = (removed, n_base, selector)
+        return self._removed_cache
+
+    @property
+    def d(self) -> int:
+        return self.base.d
+
+    @property
+    def live_count(self) -> int:
+        return self.ntotal - len(self.removed)
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        row = self.readded.get(doc_id)
+        if row is None:
+            row = self.id_to_row.get(doc_id)
+        if row is None or row >= self.ntotal or row in self.removed:
+            return None
+        return row
+
+    def doc_id(self, row: int) -> Optional[str]:
+        if row < 0 or row >= self.ntotal or row in self.removed:
+            return None
+        return self.row_ids[row]
+
+    def live_rows(self) -> np.ndarray:
+        live = np.ones(self.ntotal, dtype=bool)
+        if self.removed:
+            live[self._removed()[0]] = False
+        return np.flatnonzero(live)
+
+    def rows_in_time_range(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        valid_at: Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        Live rows whose start time lies in ``[start, end]`` and, with
+        ``valid_at``, that have not expired by then. The start time range is a
+        slice of the sorted rows; only that slice is checked for expiry.
+        """
+        times, order = self.base_by_time
+        lo = 0 if start is None else np.searchsorted(times, start, side="left")
+        hi = len(times) if end is None else np.searchsorted(times, end, side="right")
+        parts = [order[lo:hi]]
+
+        delta_times = self.start_times[self.base_ntotal : self.ntotal]
+        if self.delta_sorted:
+            lo = 0 if start is None else np.searchsorted(delta_times, start, "left")
+            hi = (
+                len(delta_times)
+                if end is None
+                else np.searchsorted(delta_times, end, side="right")
+            )
+            parts.append(np.arange(lo, hi, dtype=np.int64) + self.base_ntotal)
+        else:
+            in_range = np.ones(len(delta_times), dtype=bool)
+            if start is not None:
+                in_range &= delta_times >= start
+            if end is not None:
+                in_range &= delta_times <= end
+            parts.append(np.flatnonzero(in_range) + self.base_ntotal)
+
+        rows = np.concatenate(parts).astype(np.int64, copy=False)
+        if valid_at is not None:
+            rows = rows[self.expires_at[rows] >= valid_at]
+        if self.removed:
+            rows = rows[~np.isin(rows, self._removed()[0])]
+        return rows
+
+    def reconstruct(self, row: int) -> np.ndarray:
+        if row < self.base_ntotal:
+            return self.base.reconstruct(int(row))
+        return np.array(self.delta[row - self.base_ntotal])
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Vectors of the given rows, in order."""
+        out = np.empty((len(rows), self.d), dtype=np.float32)
+        in_base = rows < self.base_ntotal
+        if in_base.any():
+            base_rows = rows[in_base]
+            lo, hi = int(base_rows.min()), int(base_rows.max()) + 1
+            out[in_base] = self.base.reconstruct_n(lo, hi - lo)[base_rows - lo]
+        if not in_base.all():
+            out[~in_base] = self.delta[rows[~in_base] - self.base_ntotal]
+        return out
+
+    def search(
+        self, queries: np.ndarray, k: int, eligible_rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact L2 search over the live rows, shaped like faiss ``index.search``:
+        ``(distances, rows)`` of shape ``(len(queries), k)``, padded with -1
+        rows. ``eligible_rows`` restricts the search to those rows, which must
+        all be live.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        distances, rows = [], []
+        if eligible_rows is None:
+            removed, n_base_removed, selector = self._removed()
+            base_live = self.base_ntotal - n_base_removed
+            if selector is not None and base_live:
+                params = faiss.SearchParameters(sel=selector)
+                D, I = self.base.search(queries, min(k, base_live), params=params)
+                distances.append(D)
+                rows.append(I)
+            elif base_live:
+                # Masked rows can take result slots, so fetch enough to drop them.
+                D, I = self.base.search(
+                    queries, min(k + n_base_removed, self.base_ntotal)
+                )
+                distances.append(D)
+                rows.append(I)
+            if len(self.delta):
+                fetch_k = k + len(removed) - n_base_removed
+                D, I = faiss.knn(queries, self.delta, min(fetch_k, len(self.delta)))
+                distances.append(D)
+                rows.append(np.where(I >= 0, I + self.base_ntotal, -1))
+        else:
+            base_rows = eligible_rows[eligible_rows < self.base_ntotal]
+            delta_rows = eligible_rows[eligible_rows >= self.base_ntotal]
+            if len(base_rows):
+                params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(base_rows))
+                D, I = self.base.search(queries, min(k, len(base_rows)), params=params)
+                distances.append(D)
+                rows.append(I)
+            if len(delta_rows):
+                D, I = faiss.knn(
+                    queries,
+                    np.ascontiguousarray(self.delta[delta_rows - self.base_ntotal]),
+                    min(k, len(delta_rows)),
+                )
+                distances.append(D)
+                rows.append(np.where(I >= 0, delta_rows[I], -1))
+
+        n = len(queries)
+        if not rows:
+            return (
+                np.full((n, k), np.finfo(np.float32).max, dtype=np.float32),
+                np.full((n, k), -1, dtype=np.int64),
+            )
+        D = np.hstack(distances)
+        I = np.hstack(rows).astype(np.int64)
+        if eligible_rows is None and self.removed:
+            masked = np.isin(I, self._removed()[0])
+            I[masked] = -1
+        D[I == -1] = np.finfo(np.float32).max
+        order = np.argsort(D, axis=1, kind="stable")[:, :k]
+        D = np.take_along_axis(D, order, axis=1)
+        I = np.take_along_axis(I, order, axis=1)
+        if D.shape[1] < k:
+            pad = k - D.shape[1]
+            D = np.pad(D, ((0, 0), (0, pad)), constant_values=np.finfo(np.float32).max)
+            I = np.pad(I, ((0, 0), (0, pad)), constant_values=-1)
+        return D, I
+
+    def materialize(self) -> Tuple[faiss.Index, Dict[int, str]]:
+        """
+        A dense CPU copy of the live rows: a new flat index and its
+        row-to-docstore-id mapping, as written to snapshots.
+        """
+        rows = self.live_rows()
+        index_cpu = faiss.IndexFlatL2(self.d)
+        if len(rows):
+            index_cpu.add(self.vectors(rows))
+        mapping = {i: self.row_ids[row] for i, row in enumerate(rows.tolist())}
+        return index_cpu, mapping
+
+
+def _is_gpu_index(index) -> bool:
+    return hasattr(faiss, "GpuIndex") and isinstance(index, faiss.GpuIndex)
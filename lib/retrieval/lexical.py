@@ -0,0 +1,128 @@
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+from lib.retrieval.concurrency import ReadWriteLock
+
+# CJK ideographs, kana and hangul are indexed per character, everything else per word.
+_CJK_RANGES = (
+    "\u3040-\u30ff"  # Hiragana and Katakana
+    "\u3400-\u4dbf"  # CJK Unified Ideographs Extension A
+    "\u4e00-\u9fff"  # CJK Unified Ideographs
+    "\uac00-\ud7af"  # Hangul Syllables
+    "\uf900-\ufaff"  # CJK Compatibility Ideographs
+)
+# Word characters of any other script; the underscore joins code parts.
+_WORD = rf"[^\W_{_CJK_RANGES}]+"
+_TOKEN_PATTERN = re.compile(rf"([{_CJK_RANGES}]+)|({_WORD}(?:[-_./]{_WORD})*)")
+_CODE_SEPARATORS = re.compile(r"[-_./]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into index terms.
+
+    CJK runs produce character unigrams and bigrams, since there is no word
+    boundary to split on. Runs of letters and digits in other scripts are
+    lowercased words; product codes such as ``AB-1024`` are kept whole and also
+    split into their parts. Text is NFKC normalized first, so fullwidth and
+    composed forms match their plain spellings.
+    """
+    tokens = []
+    text = unicodedata.normalize("NFKC", text).lower()
+    for cjk, word in _TOKEN_PATTERN.findall(text):
+        if cjk:
+            tokens.extend(cjk)
+            tokens.extend(cjk[i : i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+            parts = _CODE_SEPARATORS.split(word)
+            if len(parts) > 1:
+                tokens.extend(part for part in parts if part)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory inverted index scored with Okapi BM25, updated incrementally as
+    documents are added to and removed from the docstore.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        # Searches score concurrently; updates wait for them to finish.
+        self._lock = ReadWriteLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, doc_id: str, text: str) -> None:
+        term_counts = Counter(tokenize(text))
+        with self._lock.write():
+            if doc_id in self._doc_lengths:
+                return
+            for term, tf in term_counts.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            length = sum(term_counts.values())
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_id: str, text: str) -> None:
+        terms = set(tokenize(text))
+        with self._lock.write():
+            length = self._doc_lengths.pop(doc_id, None)
+            if length is None:
+                return
+            self._total_length -= length
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def clear(self) -> None:
+        with self._lock.write():
+            self._postings = {}
+            self._doc_lengths = {}
+            self._total_length = 0
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Return ``(doc_id, score)`` for the ``k`` best documents sharing a term
+        with the query, or for all of them if ``k`` is None, best first.
+        """
+        terms = set(tokenize(query))
+        scores: Dict[str, float] = {}
+        with self._lock.read():
+            n_docs = len(self._doc_lengths)
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length
+                    )
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (
+                        self.k1 + 1
+                    ) / (tf + norm)
+        if k is None:
+            return sorted(scores.items(), key=itemgetter(1), reverse=True)
+        # Common terms, such as CJK unigrams, match most of the corpus, so
+        # select the top k rather than sorting every match.
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
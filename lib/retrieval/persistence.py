@@ -9,39 +9,69 @@ logger = logging.getLogger(__name__)
 
 
 class PersistenceManager:
+    """
+    Saves the vector store in the background when it has unsaved changes and
+    either `save_interval` seconds have passed since the last save, or at least
+    `save_after_mutations` mutations or `save_after_bytes` bytes of changes
+    have accumulated. A threshold of 0 disables that trigger.
+    """
+
+    # Poll period used when a mutation or size trigger is configured.
+    TRIGGER_POLL_INTERVAL = 1.0
 
     def __init__(
         self,
         vector_store: VectorStore,
         save_interval: int = 300,
         index_name: str = "index",
+        save_after_mutations: int = 0,
+        save_after_bytes: int = 0,
     ):
         self.vector_store = vector_store
         self.save_interval = save_interval
         self.index_name = index_name
+        self.save_after_mutations = save_after_mutations
+        self.save_after_bytes = save_after_bytes
         self._stop_event = threading.Event()
         self._thread: Optional[threading.Thread] = None
         self._last_save_time = time.time()
 
+    def _save_reason(self, current_time: float) -> Optional[str]:
+        """Returns why a save is due, or None if the store should not be saved now."""
+        store = self.vector_store
+        if not store.is_dirty or store.save_pending:
+            return None
+        if current_time - self._last_save_time >= self.save_interval:
+            return f"interval: {self.save_interval}s"
+        if (
+            self.save_after_mutations > 0
+            and store.unsaved_mutations >= self.save_after_mutations
+        ):
+            return f"{store.unsaved_mutations} unsaved mutations"
+        if self.save_after_bytes > 0 and store.unsaved_bytes >= self.save_after_bytes:
+            return f"{store.unsaved_bytes} unsaved bytes"
+        return None
+
     def _persistence_worker(self):
         logger.info(f"Persistence worker started with interval: {self.save_interval}s")
 
+        wait_time = min(60, self.save_interval / 10)
+        if self.save_after_mutations > 0 or self.save_after_bytes > 0:
+            wait_time = min(wait_time, self.TRIGGER_POLL_INTERVAL)
+
         while not self._stop_event.is_set():
             current_time = time.time()
-            time_since_last_save = current_time - self._last_save_time
+            reason = self._save_reason(current_time)
 
-            if time_since_last_save >= self.save_interval:
+            if reason is not None:
                 try:
-                    logger.info(
-                        f"Auto-saving vector store (interval: {self.save_interval}s)"
-                    )
+                    logger.info(f"Auto-saving vector store ({reason})")
                     self.vector_store.save_index(self.index_name)
                     self._last_save_time = current_time
-                    logger.info("Auto-save completed")
+                    logger.info("Auto-save queued")
                 except Exception as e:
                     logger.error(f"Error during auto-save: {e}")
 
-            wait_time = min(60, self.save_interval / 10)
             self._stop_event.wait(wait_time)
 
     def start(self):
@@ -74,6 +104,9 @@ class PersistenceManager:
             self._thread = None
 
     def force_save(self):
+        if not self.vector_store.is_dirty:
+            logger.info("Vector store has no unsaved changes, skipping forced save")
+            return
         try:
             logger.info("Forcing immediate save of vector store")
             self.vector_store.save_index(self.index_name)
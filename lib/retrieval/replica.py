@@ -0,0 +1,108 @@
+import threading
+import logging
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotWatcher:
+    """
+    Keeps a read-only replica current by polling the snapshot manifest that
+    the primary commits on every save.
+
+    When a new generation appears, a fresh read-only store is loaded from it
+    in the background and handed to ``on_reload``, which swaps it in for new
+    requests. Requests already running keep the store they started with, so
+    a reload never disturbs an in-flight search; the old store is closed on
+    the following poll, once they have finished. If loading fails, for example because the primary
+    pruned the files mid-read, the current store keeps serving and the load
+    is retried on the next poll.
+    """
+
+    def __init__(
+        self,
+        get_store: Callable[[], Any],
+        open_store: Callable[[], Any],
+        on_reload: Callable[[Any], None],
+        poll_interval: float = 5.0,
+    ):
+        """
+        Args:
+            get_store: Returns the store currently being served.
+            open_store: Loads a new read-only store from the shared folder.
+            on_reload: Installs a newly loaded store.
+            poll_interval: Seconds between manifest checks.
+        """
+        self.get_store = get_store
+        self.open_store = open_store
+        self.on_reload = on_reload
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loaded_version = get_store().snapshot_version()
+        # Stores replaced by the last reload, closed on the next check.
+        self._retired: List[Any] = []
+
+    def check(self) -> bool:
+        """Reloads if the primary committed a new snapshot. Returns whether it did."""
+        self._close_retired()
+        previous = self.get_store()
+        version = previous.snapshot_version()
+        if version == self._loaded_version:
+            return False
+        logger.info(f"Loading new snapshot generation {version}")
+        store = self.open_store()
+        self.on_reload(store)
+        self._retired.append(previous)
+        # A save committed while loading is picked up by the next check.
+        self._loaded_version = version
+        logger.info(f"Now serving snapshot generation {version}")
+        return True
+
+    def _close_retired(self):
+        retired, self._retired = self._retired, []
+        for store in retired:
+            try:
+                store.close(save=False)
+            except Exception as e:
+                logger.error(f"Error closing replaced store: {e}")
+
+    def _watcher_worker(self):
+        logger.info(f"Snapshot watcher started with interval: {self.poll_interval}s")
+
+        while not self._stop_event.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error reloading snapshot: {e}")
+            self._stop_event.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            logger.warning("Snapshot watcher is already running")
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._watcher_worker,
+            name="VectorStoreSnapshotWatcherThread",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info("Started snapshot watcher")
+
+    def stop(self):
+        if self._thread is None or not self._thread.is_alive():
+            logger.warning("Snapshot watcher is not running")
+            return
+
+        logger.info("Stopping snapshot watcher...")
+        self._stop_event.set()
+        self._thread.join(timeout=30)
+
+        if self._thread.is_alive():
+            logger.warning("Snapshot watcher did not stop gracefully")
+        else:
+            self._close_retired()
+            logger.info("Snapshot watcher stopped")
+            self._thread = None
@@ -0,0 +1,141 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+import numpy as np
+
+from lib.monitoring.metrics import (
+    ENCODE_QUEUE_DEPTH,
+    ENCODE_QUEUE_WAIT_SECONDS,
+    ENCODES_RUNNING,
+)
+from lib.monitoring.tracing import stage
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+
+
+class EmbeddingScheduler:
+    """
+    Shares an embedder between search queries and document ingestion.
+
+    Queries are ``interactive`` and documents ``bulk``. Encodes are admitted
+    to at most ``max_concurrent`` model slots, and each class has its own
+    limit, so a bulk load can be kept from occupying every slot. Interactive
+    encodes always go first: bulk work only starts while no query is waiting.
+
+    Bulk inputs are encoded in chunks of ``bulk_chunk_size`` texts, each
+    admitted separately, so a query arriving during a large upload waits for
+    at most one chunk rather than the whole upload. The upload is sorted by
+    length before it is chunked, so each chunk holds texts of similar length
+    and the embedder pads them little.
+
+    The scheduler wraps any embedder with ``dimension``,
+    ``normalize_embeddings``, ``_embed_texts`` and ``_embed_documents`` and
+    provides the same interface, so stores use it in place of the embedder.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        max_concurrent: int = 4,
+        bulk_concurrency: int = 1,
+        bulk_chunk_size: int = 64,
+    ):
+        """
+        Args:
+            embedder: The embedder to schedule, e.g. HuggingFaceEmbeddings.
+            max_concurrent: Encodes allowed to run at once across both classes.
+            bulk_concurrency: Document chunks allowed to run at once.
+            bulk_chunk_size: Documents per bulk chunk.
+        """
+        self.embedder = embedder
+        self._cond = threading.Condition(threading.Lock())
+        self._waiting: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._running: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.configure(max_concurrent, bulk_concurrency, bulk_chunk_size)
+        for name in PRIORITY_CLASSES:
+            ENCODE_QUEUE_DEPTH.set_function(
+                lambda name=name: self._waiting[name], priority=name
+            )
+            ENCODES_RUNNING.set_function(
+                lambda name=name: self._running[name], priority=name
+            )
+
+    def configure(
+        self, max_concurrent: int, bulk_concurrency: int, bulk_chunk_size: int
+    ):
+        """Changes the limits; encodes already running are not affected."""
+        if max_concurrent < 1 or bulk_concurrency < 1 or bulk_chunk_size < 1:
+            raise ValueError("Scheduler limits must be at least 1")
+        with self._cond:
+            self.max_concurrent = max_concurrent
+            self.limits = {
+                INTERACTIVE: max_concurrent,
+                BULK: min(bulk_concurrency, max_concurrent),
+            }
+            self.bulk_chunk_size = bulk_chunk_size
+            self._cond.notify_all()
+
+    @property
+    def dimension(self) -> int:
+        return self.embedder.dimension
+
+    @property
+    def normalize_embeddings(self) -> bool:
+        return self.embedder.normalize_embeddings
+
+    def _can_run(self, priority: str) -> bool:
+        """Must be called with the condition held."""
+        if sum(self._running.values()) >= self.max_concurrent:
+            return False
+        if self._running[priority] >= self.limits[priority]:
+            return False
+        return priority == INTERACTIVE or self._waiting[INTERACTIVE] == 0
+
+    @contextmanager
+    def slot(self, priority: str) -> Iterator[None]:
+        """Holds a model slot of the given class for the duration of the block."""
+        start = time.perf_counter()
+        with stage("encode_queue"):
+            with self._cond:
+                self._waiting[priority] += 1
+                try:
+                    self._cond.wait_for(lambda: self._can_run(priority))
+                finally:
+                    self._waiting[priority] -= 1
+                self._running[priority] += 1
+        ENCODE_QUEUE_WAIT_SECONDS.observe(
+            time.perf_counter() - start, priority=priority
+        )
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running[priority] -= 1
+                self._cond.notify_all()
+
+    def _embed_texts(self, texts):
+        with self.slot(INTERACTIVE):
+            return self.embedder._embed_texts(texts)
+
+    def _embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return self.embedder._embed_documents(texts)
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        embeddings = None
+        for start in range(0, len(texts), self.bulk_chunk_size):
+            rows = order[start : start + self.bulk_chunk_size]
+            # Released between chunks, so waiting queries get the slot first.
+            with self.slot(BULK):
+                chunk = np.asarray(
+                    self.embedder._embed_documents([texts[i] for i in rows]),
+                    dtype=np.float32,
+                )
+            if embeddings is None:
+                embeddings = np.empty((len(texts), chunk.shape[1]), dtype=np.float32)
+            embeddings[rows] = chunk
+        return embeddings
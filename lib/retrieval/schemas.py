@@ -1,42 +1,170 @@
-from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Union, Callable
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union, Callable
+import sys
 import time
 import uuid
 
 
-@dataclass
+def normalize_labels(values: Optional[List[Any]]) -> List[str]:
+    """Flattens nested tag or category lists into a flat list of strings."""
+    labels = []
+    for value in values or ():
+        if isinstance(value, (list, tuple)):
+            labels.extend(str(item) for item in value)
+        else:
+            labels.append(str(value))
+    return labels
+
+
+# Distinct label combinations are few, so documents share one tuple per combination.
+_label_sets: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _intern_labels(values: Optional[List[Any]]) -> Tuple[str, ...]:
+    labels = tuple(sys.intern(label) for label in normalize_labels(values))
+    return _label_sets.setdefault(labels, labels)
+
+
+def pack_id(doc_id: Any) -> Any:
+    """
+    Compact form of a metadata id: the 16 bytes of a canonical UUID string,
+    which is what generated ids are, or the id unchanged otherwise.
+    """
+    if isinstance(doc_id, str) and len(doc_id) == 36:
+        try:
+            packed = uuid.UUID(doc_id)
+        except ValueError:
+            return doc_id
+        # Only ids that format back identically, e.g. not uppercase ones.
+        if str(packed) == doc_id:
+            return packed.bytes
+    return doc_id
+
+
+def unpack_id(packed: Any) -> Any:
+    """Inverse of ``pack_id``."""
+    if isinstance(packed, bytes):
+        h = packed.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+    return packed
+
+
+_METADATA_FIELDS = ("id", "valid_time", "start_time", "tags", "categories")
+
+
 class Metadata:
-    id: Optional[str] = None
-    valid_time: int = -1
-    start_time: Optional[float] = None
-    tags: List[Any] = field(default_factory=list)
-    categories: List[Any] = field(default_factory=list)
+    """
+    Metadata of a document. There is one per stored document, so it keeps no
+    ``__dict__``: UUID ids are held as 16 bytes, and tags and categories as
+    tuples of interned strings shared between documents with the same labels.
+
+    Attributes read and assign as plain values, with ``id`` a string. ``tags``
+    and ``categories`` read as tuples, since they are shared, and are changed
+    by assigning a new list.
+    """
 
-    _is_valid: Optional[bool] = field(default=None, init=False, repr=False)
+    __slots__ = ("_id", "valid_time", "start_time", "_tags", "_categories")
 
-    def __post_init__(self) -> None:
-        if self.id is None:
-            self.id = str(uuid.uuid4())
-        if self.start_time is None:
-            self.start_time = time.time()
+    def __init__(
+        self,
+        id: Optional[str] = None,
+        valid_time: int = -1,
+        start_time: Optional[float] = None,
+        tags: Optional[List[Any]] = None,
+        categories: Optional[List[Any]] = None,
+    ) -> None:
+        self._id = uuid.uuid4().bytes if id is None else pack_id(id)
+        self.valid_time = valid_time
+        self.start_time = time.time() if start_time is None else start_time
+        self._tags = _intern_labels(tags)
+        self._categories = _intern_labels(categories)
 
     @property
-    def is_valid(self) -> bool:
-        if self._is_valid is None:
-            self._is_valid = (
-                True
-                if self.valid_time == -1
-                else (self.start_time + self.valid_time) >= time.time()
+    def id(self) -> str:
+        return unpack_id(self._id)
+
+    @id.setter
+    def id(self, value: str) -> None:
+        self._id = pack_id(value)
+
+    @property
+    def packed_id(self) -> Any:
+        """The id as stored, see ``pack_id``."""
+        return self._id
+
+    @property
+    def tags(self) -> Tuple[str, ...]:
+        return self._tags
+
+    @tags.setter
+    def tags(self, values: List[Any]) -> None:
+        self._tags = _intern_labels(values)
+
+    @property
+    def categories(self) -> Tuple[str, ...]:
+        return self._categories
+
+    @categories.setter
+    def categories(self, values: List[Any]) -> None:
+        self._categories = _intern_labels(values)
+
+    def __getstate__(self) -> Tuple:
+        return (
+            self._id,
+            self.valid_time,
+            self.start_time,
+            self._tags,
+            self._categories,
+        )
+
+    def __setstate__(self, state: Union[Tuple, Dict[str, Any]]) -> None:
+        if isinstance(state, dict):
+            # Pickled by the dataclass this class replaced, whose __dict__ may
+            # also hold fields that no longer exist, such as _is_valid.
+            # Labels written before they were normalized may be nested.
+            self.__init__(
+                **{key: state[key] for key in _METADATA_FIELDS if key in state}
             )
-        return self._is_valid
+            return
+        self._id, self.valid_time, self.start_time, tags, categories = state
+        self._tags = _intern_labels(tags)
+        self._categories = _intern_labels(categories)
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.__getstate__() == other.__getstate__()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (
+            f"Metadata(id={self.id!r}, valid_time={self.valid_time!r}, "
+            f"start_time={self.start_time!r}, tags={self.tags!r}, "
+            f"categories={self.categories!r})"
+        )
+
+    @property
+    def expires_at(self) -> Optional[float]:
+        if self.valid_time == -1:
+            return None
+        return self.start_time + self.valid_time
+
+    def is_valid_at(self, timestamp: float) -> bool:
+        expires_at = self.expires_at
+        return expires_at is None or expires_at >= timestamp
+
+    @property
+    def is_valid(self) -> bool:
+        return self.is_valid_at(time.time())
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "id": self.id,
             "valid_time": self.valid_time,
             "start_time": self.start_time,
-            "tags": self.tags,
-            "categories": self.categories,
+            "tags": list(self._tags),
+            "categories": list(self._categories),
         }
 
     def __iter__(self):
@@ -48,18 +176,66 @@ class MetadataFilter:
     id: Optional[List[str]] = None
     tags: Optional[List[Any]] = None
     categories: Optional[List[Any]] = None
+    created_after: Optional[float] = None
+    created_before: Optional[float] = None
+    valid_at: Optional[float] = None
     custom_filter: Optional[Callable[[Metadata], bool]] = None
 
+    @property
+    def has_time_range(self) -> bool:
+        return (
+            self.created_after is not None
+            or self.created_before is not None
+            or self.valid_at is not None
+        )
+
+    def cache_key(self) -> Optional[Tuple[Any, ...]]:
+        """
+        Hashable representation of the filter, or None if the filter cannot be
+        cached because it carries an arbitrary callable.
+        """
+        if self.custom_filter is not None:
+            return None
+
+        def _freeze(values: Optional[List[Any]]) -> Optional[Tuple[Any, ...]]:
+            return None if values is None else tuple(sorted(map(str, values)))
+
+        return (
+            _freeze(self.id),
+            _freeze(self.tags),
+            _freeze(self.categories),
+            self.created_after,
+            self.created_before,
+            self.valid_at,
+        )
+
     def match(self, metadata: Metadata) -> bool:
         if self.id is not None and metadata.id not in self.id:
             return False
 
+        if self.created_after is not None and metadata.start_time < self.created_after:
+            return False
+
+        if (
+            self.created_before is not None
+            and metadata.start_time > self.created_before
+        ):
+            return False
+
+        if self.valid_at is not None and (
+            metadata.start_time > self.valid_at
+            or not metadata.is_valid_at(self.valid_at)
+        ):
+            return False
+
+        # Stored labels are strings, so compare the filter's in the same form.
         if self.tags is not None and len(self.tags) > 0:
-            if not any(tag in metadata.tags for tag in self.tags):
+            if not any(tag in metadata._tags for tag in normalize_labels(self.tags)):
                 return False
 
         if self.categories is not None and len(self.categories) > 0:
-            if not any(cat in metadata.categories for cat in self.categories):
+            categories = normalize_labels(self.categories)
+            if not any(cat in metadata._categories for cat in categories):
                 return False
 
         if self.custom_filter is not None and not self.custom_filter(metadata):
@@ -68,28 +244,57 @@ class MetadataFilter:
         return True
 
 
-@dataclass
 class Document:
-    content: str
-    metadata: Union[Metadata, Dict[str, Any], None] = None
-    _is_valid: Optional[bool] = field(default=None, init=False, repr=False)
+    """A stored text and its metadata. Slotted for the same reason as Metadata."""
+
+    __slots__ = ("content", "metadata")
 
-    def __post_init__(self) -> None:
-        if not self.content:
+    def __init__(
+        self, content: str, metadata: Union[Metadata, Dict[str, Any], None] = None
+    ) -> None:
+        if not content:
             raise ValueError("Document content cannot be empty")
-        if isinstance(self.metadata, dict):
-            self.metadata = Metadata(**self.metadata)
-        elif self.metadata is None:
-            self.metadata = Metadata()
+        if isinstance(metadata, dict):
+            metadata = Metadata(**metadata)
+        elif metadata is None:
+            metadata = Metadata()
+        self.content = content
+        self.metadata = metadata
+
+    def __getstate__(self) -> Tuple:
+        return (self.content, self.metadata)
+
+    def __setstate__(self, state: Union[Tuple, Dict[str, Any]]) -> None:
+        if isinstance(state, dict):
+            # Pickled by the dataclass this class replaced.
+            state = (state["content"], state["metadata"])
+        self.content, self.metadata = state
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.content == other.content and self.metadata == other.metadata
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Document(content={self.content!r}, metadata={self.metadata!r})"
 
     @property
     def is_valid(self) -> bool:
-        if self._is_valid is None:
-            self._is_valid = self.metadata.is_valid
-        return self._is_valid
+        return self.metadata.is_valid
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "content": self.content,
             "metadata": self.metadata.to_dict(),
         }
+
+
+@dataclass
+class SearchRequest:
+    query: str
+    k: int = 5
+    metadata_filter: Optional[MetadataFilter] = None
+    mode: str = "vector"
+    score_threshold: Optional[float] = None
@@ -0,0 +1,744 @@
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import zlib
+from collections import ChainMap, Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from lib.monitoring.tracing import annotate, query_hash, stage
+from lib.retrieval.cache import MISS, QueryResultCache
+from lib.retrieval.dedup import assign_content_ids
+from lib.retrieval.embeddings import DEFAULT_QUERY_INSTRUCTION, HuggingFaceEmbeddings
+from lib.retrieval.schemas import (
+    Document,
+    MetadataFilter,
+    SearchRequest,
+    normalize_labels,
+    pack_id,
+)
+from lib.retrieval.snapshot import SnapshotDirectory
+from lib.retrieval.vectorstore import (
+    SEARCH_MODES,
+    ReadOnlyError,
+    VectorStore,
+    VectorStoreError,
+    _len_check_if_sized,
+    screen_new_documents,
+    validate_embeddings,
+)
+
+logger = logging.getLogger(__name__)
+
+SHARD_MODES = ("category", "hash")
+SHARD_LAYOUT_VERSION = 1
+DEFAULT_SHARD = ""
+
+
+class ShardedVectorStore:
+    """
+    Partitions documents across VectorStore shards, each with its own faiss
+    index, docstore, snapshot files and write-ahead log under
+    ``{folder_path}/shards/``. All shards share one embedding model.
+
+    With ``shard_by="category"`` a document goes to the shard of its first
+    category; with ``shard_by="hash"`` to one of ``num_shards`` shards by its
+    metadata id. Either way the categories present in each shard are tracked,
+    so searches filtered by category only touch shards that can match.
+    Other searches fan out across shards on a thread pool and merge the top-k.
+
+    The store exposes the VectorStore methods used by the API, persistence
+    manager and expiry sweeper, so it can be used in place of one.
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        model_name: str = "moka-ai/m3e-base",
+        query_instruction: str = DEFAULT_QUERY_INSTRUCTION,
+        device: str = "cpu",
+        cache_size: int = 1024,
+        cache_ttl: float = 60.0,
+        embedding: Optional[HuggingFaceEmbeddings] = None,
+        wal_fsync: bool = True,
+        read_only: bool = False,
+        near_duplicate_threshold: float = 0.9,
+        shard_by: str = "category",
+        num_shards: int = 8,
+        max_workers: int = 8,
+    ):
+        """
+        Args:
+            folder_path, model_name, query_instruction, device, cache_size,
+            cache_ttl, embedding, wal_fsync, read_only,
+            near_duplicate_threshold: As for VectorStore.
+            shard_by: "category" or "hash".
+            num_shards: Number of shards when sharding by hash.
+            max_workers: Threads used to search, load and save shards in parallel.
+        """
+        if shard_by not in SHARD_MODES:
+            raise VectorStoreError(f"Unknown shard mode: {shard_by}")
+        if shard_by == "hash" and num_shards < 1:
+            raise VectorStoreError("num_shards must be at least 1")
+
+        self.device = device
+        if embedding is None:
+            embedding = HuggingFaceEmbeddings(
+                model_name=model_name,
+                device=self.device,
+                query_instruction=query_instruction,
+            )
+        self.embedding = embedding
+        self.folder_path = folder_path
+        self.shard_by = shard_by
+        self.num_shards = num_shards
+        self.wal_fsync = wal_fsync
+        self.read_only = read_only
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.result_cache = QueryResultCache(max_entries=cache_size, ttl=cache_ttl)
+
+        # Guards the shard map and the per-shard category counts.
+        self._lock = threading.Lock()
+        self.shards: Dict[str, VectorStore] = {}
+        self._shard_dirs: Dict[str, str] = {}
+        self._category_counts: Dict[str, Counter] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="VectorStoreShard"
+        )
+        self._layout_path = Path(folder_path) / "shards.json"
+        self._load_layout()
+
+    def _load_layout(self):
+        layout = self._read_layout()
+        if layout is None:
+            return
+        if layout.get("version") != SHARD_LAYOUT_VERSION:
+            raise VectorStoreError(
+                f"Unsupported shard layout version {layout.get('version')}"
+            )
+        if layout["shard_by"] != self.shard_by or (
+            self.shard_by == "hash" and layout["num_shards"] != self.num_shards
+        ):
+            raise VectorStoreError(
+                f"Shard layout in {self.folder_path} was created with "
+                f"shard_by={layout['shard_by']}, num_shards={layout['num_shards']}"
+            )
+
+        keys = list(layout["shards"])
+        stores = self._map(
+            lambda key: self._open_shard(layout["shards"][key]),
+            keys,
+            with_context=False,
+        )
+        for key, store in zip(keys, stores):
+            self._register_shard(key, layout["shards"][key], store)
+        logger.info(f"Loaded {len(keys)} shards from {self.folder_path}")
+
+    def _read_layout(self) -> Optional[dict]:
+        if not self._layout_path.exists():
+            return None
+        with open(self._layout_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_layout(self):
+        """Must be called with the lock held."""
+        self._layout_path.parent.mkdir(exist_ok=True, parents=True)
+        layout = {
+            "version": SHARD_LAYOUT_VERSION,
+            "shard_by": self.shard_by,
+            "num_shards": self.num_shards,
+            "shards": self._shard_dirs,
+        }
+        tmp_path = self._layout_path.with_name(self._layout_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(layout, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._layout_path)
+
+    def _open_shard(self, directory: str) -> VectorStore:
+        return VectorStore(
+            folder_path=str(Path(self.folder_path) / "shards" / directory),
+            device=self.device,
+            cache_size=0,
+            embedding=self.embedding,
+            wal_fsync=self.wal_fsync,
+            read_only=self.read_only,
+            near_duplicate_threshold=self.near_duplicate_threshold,
+        )
+
+    def _register_shard(self, key: str, directory: str, store: VectorStore):
+        self.shards[key] = store
+        self._shard_dirs[key] = directory
+        counts = Counter()
+        for doc in store.docstore.values():
+            _count_categories(counts, doc, 1)
+        self._category_counts[key] = counts
+
+    def _shard_key(self, doc: Document) -> str:
+        if self.shard_by == "hash":
+            # By content, so exact duplicates meet in one shard, where a
+            # concurrent batch adding the same content is caught under its lock.
+            return str(zlib.crc32(doc.content.encode("utf-8")) % self.num_shards)
+        for category in doc.metadata.categories:
+            if not isinstance(category, list):
+                return str(category)
+        return DEFAULT_SHARD
+
+    def _shard_directory(self, key: str) -> str:
+        if self.shard_by == "hash":
+            return f"shard-{int(key):04d}"
+        if key == DEFAULT_SHARD:
+            return "default"
+        # Category names may hold any character, so the directory is a digest
+        # and shards.json maps it back.
+        return f"category-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+    def _get_or_create_shard(self, key: str) -> VectorStore:
+        with self._lock:
+            store = self.shards.get(key)
+            if store is not None:
+                return store
+            directory = self._shard_directory(key)
+            store = self._open_shard(directory)
+            self._register_shard(key, directory, store)
+            self._write_layout()
+            logger.info(f"Created shard {directory} for {self.shard_by} {key!r}")
+            return store
+
+    def _map(self, fn: Callable, items: List, with_context: bool = True) -> List:
+        """
+        Runs fn over items on the shard pool, preserving order. The caller's
+        context (request trace) is copied into each task.
+        """
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        if with_context:
+            futures = [
+                self._executor.submit(contextvars.copy_context().run, fn, item)
+                for item in items
+            ]
+        else:
+            futures = [self._executor.submit(fn, item) for item in items]
+        return [future.result() for future in futures]
+
+    def _all_shards(self) -> List[VectorStore]:
+        with self._lock:
+            return list(self.shards.values())
+
+    def _shards_for(
+        self, metadata_filter: Optional[MetadataFilter]
+    ) -> List[VectorStore]:
+        """Shards that can hold documents matching the filter's categories."""
+        with self._lock:
+            if metadata_filter is None or not metadata_filter.categories:
+                return list(self.shards.values())
+            categories = normalize_labels(metadata_filter.categories)
+            return [
+                self.shards[key]
+                for key, counts in self._category_counts.items()
+                if any(counts.get(category, 0) > 0 for category in categories)
+            ]
+
+    def _update_category_counts(self, store: VectorStore, docs, sign: int):
+        with self._lock:
+            for key, shard in self.shards.items():
+                if shard is store:
+                    for doc in docs:
+                        _count_categories(self._category_counts[key], doc, sign)
+                    return
+
+    @property
+    def docstore(self) -> ChainMap:
+        """Read-only merged view of the shard docstores."""
+        return ChainMap(*(store.docstore for store in self._all_shards()))
+
+    @property
+    def dimension(self) -> int:
+        return self.embedding.dimension
+
+    @property
+    def generation(self) -> int:
+        return sum(store.generation for store in self._all_shards())
+
+    @property
+    def is_dirty(self) -> bool:
+        return any(store.is_dirty for store in self._all_shards())
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(store.memory_bytes for store in self._all_shards())
+
+    @property
+    def unsaved_mutations(self) -> int:
+        return sum(store.unsaved_mutations for store in self._all_shards())
+
+    @property
+    def unsaved_bytes(self) -> int:
+        return sum(store.unsaved_bytes for store in self._all_shards())
+
+    @property
+    def save_pending(self) -> bool:
+        return any(store.save_pending for store in self._all_shards())
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyError("Vector store is read-only")
+
+    def snapshot_version(self) -> Optional[Tuple]:
+        """Newest committed snapshot of every shard listed on disk."""
+        layout = self._read_layout()
+        if layout is None:
+            return None
+        shards_dir = Path(self.folder_path) / "shards"
+        return tuple(
+            sorted(
+                (
+                    directory,
+                    SnapshotDirectory(str(shards_dir / directory)).latest_sequence(),
+                )
+                for directory in layout["shards"].values()
+            )
+        )
+
+    def save_index(self, index_name: str = "index"):
+        """Queues a save on every dirty shard; shards save on their own workers."""
+        self._check_writable()
+        for store in self._all_shards():
+            if store.is_dirty:
+                store.save_index(index_name)
+
+    def close(self, save: bool = True):
+        self._map(lambda store: store.close(save), self._all_shards())
+        self._executor.shutdown(wait=True)
+
+    def rebuild_index(self):
+        self._check_writable()
+        for store in self._all_shards():
+            store.rebuild_index()
+
+    def next_expiry(self) -> Optional[float]:
+        deadlines = [
+            deadline
+            for deadline in (store.next_expiry() for store in self._all_shards())
+            if deadline is not None
+        ]
+        return min(deadlines, default=None)
+
+    def get_docstore_id(self, metadata_id: str) -> Optional[str]:
+        for store in self._all_shards():
+            doc_id = store.get_docstore_id(metadata_id)
+            if doc_id is not None:
+                return doc_id
+        return None
+
+    def _group_by_shard(self, docs: List[Document]) -> Dict[str, List[int]]:
+        groups: Dict[str, List[int]] = {}
+        for i, doc in enumerate(docs):
+            groups.setdefault(self._shard_key(doc), []).append(i)
+        return groups
+
+    def _add_grouped(
+        self,
+        docs: List[Document],
+        ids: Optional[List[str]],
+        add: Callable[[VectorStore, List[int], Optional[List[str]]], List[Document]],
+    ) -> List[Document]:
+        if ids is not None and len(ids) != len(docs):
+            raise ValueError(
+                f"id and docs must have the same length, got {len(ids)} and {len(docs)}"
+            )
+        added = set()
+        for key, positions in self._group_by_shard(docs).items():
+            store = self._get_or_create_shard(key)
+            shard_ids = None if ids is None else [ids[i] for i in positions]
+            shard_added = add(store, positions, shard_ids)
+            self._update_category_counts(store, shard_added, 1)
+            added.update(id(doc) for doc in shard_added)
+        # Keep the caller's order across shards.
+        return [doc for doc in docs if id(doc) in added]
+
+    def _new_positions(
+        self,
+        docs: List[Document],
+        ids: Optional[List[str]],
+        similarity_threshold: float,
+    ) -> List[int]:
+        """
+        As VectorStore._new_positions, screening each document against every
+        shard and the whole batch, since a duplicate may be routed elsewhere.
+        """
+        return screen_new_documents(self._all_shards(), docs, ids, similarity_threshold)
+
+    def add_documents(
+        self,
+        docs: List[Document],
+        id: Optional[List[str]] = None,
+        similarity_threshold: float = 0.9,
+        content_ids: bool = False,
+    ) -> List[Document]:
+        """
+        Adds documents to their shards. Duplicates are detected across shards.
+        """
+        self._check_writable()
+        if content_ids:
+            id = assign_content_ids(docs)
+        docs, id = VectorStore._select(
+            docs, id, self._new_positions(docs, id, similarity_threshold)
+        )
+        if not docs:
+            return []
+        with stage("encode"):
+            embeds = np.asarray(
+                self.embedding._embed_documents([doc.content for doc in docs]),
+                dtype=np.float32,
+            )
+        return self._add_grouped(
+            docs,
+            id,
+            lambda store, positions, shard_ids: store._add_embedded_documents(
+                [docs[i] for i in positions],
+                embeds[positions],
+                shard_ids,
+                similarity_threshold,
+            ),
+        )
+
+    def add_documents_with_embeddings(
+        self,
+        docs: List[Document],
+        embeddings: np.ndarray,
+        id: Optional[List[str]] = None,
+        similarity_threshold: float = 0.9,
+        normalize: bool = False,
+        content_ids: bool = False,
+    ) -> List[Document]:
+        self._check_writable()
+        # Validate the whole batch up front so a bad vector cannot leave it
+        # half-applied across shards.
+        embeds = validate_embeddings(
+            embeddings, self.dimension, self.embedding.normalize_embeddings, normalize
+        )
+        _len_check_if_sized(embeds, docs, "embeds", "docs")
+        if content_ids:
+            id = assign_content_ids(docs)
+        positions = self._new_positions(docs, id, similarity_threshold)
+        docs, id = VectorStore._select(docs, id, positions)
+        embeds = embeds[positions]
+        return self._add_grouped(
+            docs,
+            id,
+            lambda store, positions, shard_ids: store._add_embedded_documents(
+                [docs[i] for i in positions],
+                embeds[positions],
+                shard_ids,
+                similarity_threshold,
+            ),
+        )
+
+    def remove_documents_by_id(self, target_id_list: Optional[List[str]]):
+        self._check_writable()
+        if target_id_list is None:
+            n_removed = n_total = 0
+            for store in self._all_shards():
+                removed, total = store.remove_documents_by_id(None)
+                n_removed += removed
+                n_total += total
+            with self._lock:
+                for counts in self._category_counts.values():
+                    counts.clear()
+            return n_removed, n_total
+
+        if len(set(target_id_list)) != len(target_id_list):
+            raise VectorStoreError("Duplicate ids in the list of ids to remove.")
+        removed_documents = []
+        for store in self._all_shards():
+            shard_ids = [d_id for d_id in target_id_list if d_id in store.docstore]
+            if shard_ids:
+                removed = store.remove_documents_by_id(shard_ids)
+                self._update_category_counts(store, removed, -1)
+                removed_documents.extend(removed)
+        return removed_documents
+
+    def delete_documents_by_id(self, target_id: List[str]) -> List[Document]:
+        if target_id is None or len(target_id) < 1:
+            raise ValueError("Parameter target_ids cannot be empty.")
+        targets = {pack_id(m_id) for m_id in target_id}
+        docstore_ids = [
+            d_id
+            for store in self._all_shards()
+            for d_id, doc in list(store.docstore.items())
+            if doc.metadata.packed_id in targets
+        ]
+        return self.remove_documents_by_id(docstore_ids)
+
+    def remove_expired_documents(self) -> List[Document]:
+        self._check_writable()
+        removed_documents = []
+        for store in self._all_shards():
+            removed = store.remove_expired_documents()
+            self._update_category_counts(store, removed, -1)
+            removed_documents.extend(removed)
+        return removed_documents
+
+    def filter_documents(self, metadata_filter: MetadataFilter) -> List[Document]:
+        results = self._map(
+            lambda store: store.filter_documents(metadata_filter),
+            self._shards_for(metadata_filter),
+        )
+        docs = list(itertools.chain.from_iterable(results))
+        if metadata_filter.has_time_range:
+            # Each shard returns creation order; keep that across shards.
+            docs.sort(key=lambda doc: doc.metadata.start_time)
+        return docs
+
+    def export_vectors(
+        self, batch_size: int = 1024
+    ) -> Tuple[int, int, Iterator[Tuple[List[str], np.ndarray]]]:
+        exports = [store.export_vectors(batch_size) for store in self._all_shards()]
+        count = sum(n for n, _, _ in exports)
+        id_length = max((length for _, length, _ in exports), default=0)
+        return (
+            count,
+            id_length,
+            itertools.chain.from_iterable(batches for _, _, batches in exports),
+        )
+
+    def _vector_fanout(
+        self,
+        embedding: np.ndarray,
+        k: int,
+        metadata_filter: Optional[MetadataFilter],
+        shards: List[VectorStore],
+        exclude: Optional[Document] = None,
+        **kwargs,
+    ) -> List[Tuple[Document, float]]:
+        results = self._map(
+            lambda store: store._scored_vector_search(
+                embedding, k, metadata_filter, exclude=exclude, **kwargs
+            ),
+            shards,
+        )
+        return heapq.nsmallest(
+            k, itertools.chain.from_iterable(results), key=lambda item: item[1]
+        )
+
+    def _lexical_fanout(
+        self,
+        query: str,
+        k: int,
+        metadata_filter: Optional[MetadataFilter],
+        shards: List[VectorStore],
+    ) -> List[Tuple[Document, float]]:
+        # BM25 statistics are per shard, so scores are only roughly comparable.
+        results = self._map(
+            lambda store: store._scored_lexical_search(query, k, metadata_filter),
+            shards,
+        )
+        return heapq.nlargest(
+            k, itertools.chain.from_iterable(results), key=lambda item: item[1]
+        )
+
+    def _search_encoded(
+        self,
+        query: str,
+        embedding: Optional[np.ndarray],
+        k: int,
+        metadata_filter: Optional[MetadataFilter],
+        mode: str,
+        **kwargs,
+    ) -> List[Tuple[Document, Optional[float]]]:
+        shards = self._shards_for(metadata_filter)
+        annotate(shards=len(shards))
+        if not shards:
+            return []
+        if mode == "lexical":
+            return self._lexical_fanout(query, k, metadata_filter, shards)
+        if mode == "hybrid":
+            fetch_k = max(k * 2, 10)
+            rankings = [
+                self._vector_fanout(
+                    embedding, fetch_k, metadata_filter, shards, **kwargs
+                ),
+                self._lexical_fanout(query, fetch_k, metadata_filter, shards),
+            ]
+            rankings = [[doc for doc, _ in ranking] for ranking in rankings]
+            return [(doc, None) for doc in VectorStore._fuse_rankings(rankings, k)]
+        return self._vector_fanout(embedding, k, metadata_filter, shards, **kwargs)
+
+    def _search(
+        self,
+        query,
+        k=5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        mode: str = "vector",
+        **kwargs,
+    ) -> List[Tuple[Document, Optional[float]]]:
+        embedding = None
+        if mode != "lexical" and self._shards_for(metadata_filter):
+            with stage("encode"):
+                embedding = self.embedding._embed_texts([query])[0]
+        return self._search_encoded(
+            query, embedding, k, metadata_filter, mode, **kwargs
+        )
+
+    def search(
+        self,
+        query,
+        k=5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        mode: str = "vector",
+        **kwargs,
+    ) -> List[Document]:
+        """As VectorStore.search, across all shards that can match."""
+        return [
+            doc
+            for doc, _ in self.search_with_score(
+                query, k, metadata_filter, mode, **kwargs
+            )
+        ]
+
+    def search_with_score(
+        self,
+        query,
+        k=5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        mode: str = "vector",
+        **kwargs,
+    ) -> List[Tuple[Document, Optional[float]]]:
+        """As VectorStore.search_with_score, across all shards that can match."""
+        if mode not in SEARCH_MODES:
+            raise VectorStoreError(f"Unknown search mode: {mode}")
+
+        filter_key = None
+        if metadata_filter is not None:
+            filter_key = metadata_filter.cache_key()
+        annotate(query_hash=query_hash(str(query)), k=k, mode=mode, filter=filter_key)
+        if metadata_filter is not None and filter_key is None:
+            annotate(filter="custom", cache=MISS)
+            return self._search(query, k, metadata_filter, mode, **kwargs)
+
+        cache_key = (query, k, filter_key, mode, tuple(sorted(kwargs.items())))
+        results, outcome = self.result_cache.get_or_compute(
+            cache_key,
+            self.generation,
+            lambda: self._search(query, k, metadata_filter, mode, **kwargs),
+        )
+        annotate(cache=outcome)
+        return [(doc, score) for doc, score in results if doc.is_valid]
+
+    def similarity_search_by_document_id(
+        self,
+        doc_id: str,
+        k: int = 5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        **kwargs,
+    ) -> List[Document]:
+        """As VectorStore.similarity_search_by_document_id, across shards."""
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_document_id(
+                doc_id, k, metadata_filter, **kwargs
+            )
+        ]
+
+    def similarity_search_with_score_by_document_id(
+        self,
+        doc_id: str,
+        k: int = 5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        **kwargs,
+    ) -> List[Tuple[Document, float]]:
+        """As VectorStore.similarity_search_with_score_by_document_id."""
+        filter_key = None
+        if metadata_filter is not None:
+            filter_key = metadata_filter.cache_key()
+
+        def compute() -> List[Tuple[Document, float]]:
+            for store in self._all_shards():
+                view = store._view
+                row = view.row_of(doc_id)
+                source = store.docstore.get(doc_id)
+                if row is None or source is None:
+                    continue
+                vector = view.reconstruct(row)
+                break
+            else:
+                raise VectorStoreError(f"Document {doc_id} is not in the index")
+            return self._vector_fanout(
+                vector,
+                k,
+                metadata_filter,
+                self._shards_for(metadata_filter),
+                exclude=source,
+                **kwargs,
+            )
+
+        if metadata_filter is not None and filter_key is None:
+            return compute()
+        cache_key = ("similar", doc_id, k, filter_key, tuple(sorted(kwargs.items())))
+        results, outcome = self.result_cache.get_or_compute(
+            cache_key, self.generation, compute
+        )
+        annotate(cache=outcome)
+        return [(doc, score) for doc, score in results if doc.is_valid]
+
+    def search_batch(
+        self, requests: List[SearchRequest], batch_size: int = 64
+    ) -> Iterator[List[Document]]:
+        """
+        Runs many searches, yielding each request's results in order. Queries
+        are encoded together in model batches of ``batch_size``.
+        """
+        for results in self.search_batch_with_score(requests, batch_size):
+            yield [doc for doc, _ in results]
+
+    def search_batch_with_score(
+        self, requests: List[SearchRequest], batch_size: int = 64
+    ) -> Iterator[List[Tuple[Document, Optional[float]]]]:
+        """As search_batch, scored as by VectorStore.search_with_score."""
+        for request in requests:
+            if request.mode not in SEARCH_MODES:
+                raise VectorStoreError(f"Unknown search mode: {request.mode}")
+
+        for start in range(0, len(requests), batch_size):
+            chunk = requests[start : start + batch_size]
+            to_encode = [
+                i for i, request in enumerate(chunk) if request.mode != "lexical"
+            ]
+            embeddings: Dict[int, np.ndarray] = {}
+            if to_encode:
+                with stage("encode"):
+                    encoded = self.embedding._embed_texts(
+                        [chunk[i].query for i in to_encode]
+                    )
+                embeddings = dict(zip(to_encode, np.asarray(encoded, dtype=np.float32)))
+
+            for i, request in enumerate(chunk):
+                kwargs = {}
+                if request.score_threshold is not None:
+                    kwargs["score_threshold"] = request.score_threshold
+                yield self._search_encoded(
+                    request.query,
+                    embeddings.get(i),
+                    request.k,
+                    request.metadata_filter,
+                    request.mode,
+                    **kwargs,
+                )
+
+
+def _count_categories(counts: Counter, doc: Document, sign: int):
+    for category in doc.metadata.categories:
+        try:
+            counts[category] += sign
+        except TypeError:
+            continue
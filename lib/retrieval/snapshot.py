@@ -0,0 +1,345 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from lib.retrieval.schemas import Document
+
+logger = logging.getLogger(__name__)
+
+# Journal entries recorded by VectorStore under its lock:
+#   ("add", docstore_id, document, vector)
+#   ("remove", [docstore_id, ...])
+#   ("clear",)
+JournalEntry = Tuple
+
+MANIFEST_VERSION = 1
+
+# (faiss index on CPU, docstore, index_to_docstore_id, first write-ahead log
+# segment not covered by the snapshot)
+LoadedSnapshot = Tuple[Any, Dict[str, Document], Dict[int, str], int]
+
+
+class ShadowStore:
+    """
+    A private copy of the persisted state (faiss index, docstore and row
+    mapping) owned by the save worker.
+
+    Writers only append to a journal while holding the store lock. At save time
+    the journal is swapped out in O(1) and replayed here, off the lock, so a
+    save sees a consistent point-in-time view without blocking ingestion and
+    without serializing dicts that other threads are mutating.
+
+    Documents are treated as immutable once stored, so the shadow docstore can
+    share them with the live one.
+    """
+
+    def __init__(self, dimension: int):
+        self.index = faiss.IndexFlatL2(dimension)
+        self.docstore: Dict[str, Document] = {}
+        self.index_to_docstore_id: Dict[int, str] = {}
+        self.generation: Optional[int] = None
+        # First write-ahead log segment holding mutations newer than the shadow.
+        self.wal_from = 0
+
+    def reset(
+        self,
+        index_cpu,
+        docstore: Dict[str, Document],
+        index_to_docstore_id: Dict[int, str],
+        generation: int,
+    ):
+        """Replaces the shadow with a full copy captured under the store lock."""
+        self.index = index_cpu
+        self.docstore = docstore
+        self.index_to_docstore_id = index_to_docstore_id
+        self.generation = generation
+
+    def apply(self, journal: List[JournalEntry], generation: int):
+        """Replays the mutations recorded since the last capture."""
+        pending_vectors: List[np.ndarray] = []
+
+        def flush():
+            if pending_vectors:
+                self.index.add(np.stack(pending_vectors).astype(np.float32))
+                pending_vectors.clear()
+
+        for entry in journal:
+            if entry[0] == "add":
+                _, doc_id, doc, vector = entry
+                if doc_id in self.docstore:
+                    # Re-adding an id replaces its vector, as in the live index.
+                    flush()
+                    self._remove({doc_id})
+                self.index_to_docstore_id[len(self.index_to_docstore_id)] = doc_id
+                self.docstore[doc_id] = doc
+                pending_vectors.append(vector)
+            elif entry[0] == "remove":
+                flush()
+                self._remove(set(entry[1]))
+            elif entry[0] == "clear":
+                pending_vectors.clear()
+                self.index.reset()
+                self.docstore = {}
+                self.index_to_docstore_id = {}
+            else:
+                raise ValueError(f"Unknown journal entry: {entry[0]}")
+        flush()
+        self.generation = generation
+
+    def _remove(self, doc_ids):
+        rows = [
+            row
+            for row, doc_id in self.index_to_docstore_id.items()
+            if doc_id in doc_ids
+        ]
+        if not rows:
+            return
+        self.index.remove_ids(np.array(rows, dtype=np.int64))
+        for doc_id in doc_ids:
+            self.docstore.pop(doc_id, None)
+        # Rows are renumbered densely, as compaction does in the live index.
+        self.index_to_docstore_id = {
+            i: doc_id
+            for i, doc_id in enumerate(
+                doc_id
+                for doc_id in self.index_to_docstore_id.values()
+                if doc_id not in doc_ids
+            )
+        }
+
+
+class _HashingWriter:
+    """File wrapper that checksums everything written through it."""
+
+    def __init__(self, f):
+        self._f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        self._f.write(data)
+        return len(data)
+
+
+def _fsync_dir(path: Path):
+    # Directory fsync makes the rename durable; not available on Windows.
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SnapshotDirectory:
+    """
+    Snapshot files of one index in a folder, tracked by a JSON manifest.
+
+    Each save writes ``{name}.{sequence}.faiss`` and ``{name}.{sequence}.pkl``
+    to temporary paths, fsyncs them and renames them into place, then commits
+    the new generation by atomically replacing ``{name}.manifest.json``, which
+    records each file's size and sha256. A crash at any point leaves the
+    previous manifest and its files intact. The newest ``keep`` generations are
+    retained so loading can fall back when the latest fails verification.
+
+    Folders written before the manifest existed are still loaded from the plain
+    ``{name}.faiss`` and ``{name}.pkl`` files; they are removed after the first
+    committed snapshot.
+    """
+
+    def __init__(self, folder_path: str, index_name: str = "index", keep: int = 2):
+        self.folder = Path(folder_path)
+        self.index_name = index_name
+        self.keep = max(1, keep)
+        self.manifest_path = self.folder / f"{index_name}.manifest.json"
+        self.legacy_faiss_path = self.folder / f"{index_name}.faiss"
+        self.legacy_pkl_path = self.folder / f"{index_name}.pkl"
+
+    def read_manifest(self) -> Optional[Dict[str, Any]]:
+        if not self.manifest_path.exists():
+            return None
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unreadable snapshot manifest {self.manifest_path}: {e}")
+            return None
+        if manifest.get("version") != MANIFEST_VERSION:
+            logger.error(
+                f"Unsupported snapshot manifest version {manifest.get('version')} "
+                f"in {self.manifest_path}"
+            )
+            return None
+        return manifest
+
+    def _verify(self, entry: Dict[str, Any]) -> bool:
+        for kind, info in entry["files"].items():
+            path = self.folder / info["name"]
+            if not path.exists():
+                logger.warning(f"Snapshot file {path} is missing")
+                return False
+            if path.stat().st_size != info["size"]:
+                logger.warning(f"Snapshot file {path} has the wrong size")
+                return False
+            if _file_sha256(path) != info["sha256"]:
+                logger.warning(f"Snapshot file {path} failed checksum verification")
+                return False
+        return True
+
+    def _load_files(
+        self, faiss_path: Path, pkl_path: Path, wal_from: int
+    ) -> LoadedSnapshot:
+        index_cpu = faiss.read_index(str(faiss_path))
+        with open(pkl_path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return index_cpu, docstore, index_to_docstore_id, wal_from
+
+    def load(self) -> Optional[LoadedSnapshot]:
+        """
+        Loads the newest snapshot that passes verification, falling back to
+        older generations and then to legacy files. Returns None if there is
+        nothing to load.
+        """
+        manifest = self.read_manifest()
+        if manifest is not None:
+            for entry in manifest["snapshots"]:
+                if not self._verify(entry):
+                    continue
+                try:
+                    loaded = self._load_files(
+                        self.folder / entry["files"]["faiss"]["name"],
+                        self.folder / entry["files"]["pkl"]["name"],
+                        entry.get("wal_from", 0),
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to load snapshot {entry['sequence']}: {e}")
+                    continue
+                logger.info(f"Loaded snapshot {entry['sequence']} of {self.index_name}")
+                return loaded
+            logger.error(f"No valid snapshot found in {self.manifest_path}")
+
+        if self.legacy_faiss_path.exists() and self.legacy_pkl_path.exists():
+            logger.info(f"Loading unversioned index files for {self.index_name}")
+            return self._load_files(self.legacy_faiss_path, self.legacy_pkl_path, 0)
+        return None
+
+    def _write_file(self, name: str, write: Callable[[_HashingWriter], None]):
+        tmp_path = self.folder / f"{name}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                writer = _HashingWriter(f)
+                write(writer)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.folder / name)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return {"name": name, "size": writer.size, "sha256": writer.sha256.hexdigest()}
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        _fsync_dir(self.folder)
+
+    def write(
+        self,
+        index_cpu,
+        docstore: Dict[str, Document],
+        index_to_docstore_id: Dict[int, str],
+        wal_from: int = 0,
+    ) -> int:
+        """
+        Writes and commits a new snapshot generation. ``wal_from`` is the first
+        write-ahead log segment holding mutations the snapshot does not include.
+        Returns the snapshot size in bytes.
+        """
+        self.folder.mkdir(exist_ok=True, parents=True)
+        manifest = self.read_manifest() or {
+            "version": MANIFEST_VERSION,
+            "index_name": self.index_name,
+            "snapshots": [],
+        }
+        snapshots = manifest["snapshots"]
+        sequence = max((entry["sequence"] for entry in snapshots), default=0) + 1
+        stem = f"{self.index_name}.{sequence:08d}"
+
+        files = {}
+        try:
+            files["faiss"] = self._write_file(
+                f"{stem}.faiss",
+                lambda w: faiss.write_index(
+                    index_cpu, faiss.PyCallbackIOWriter(w.write)
+                ),
+            )
+            files["pkl"] = self._write_file(
+                f"{stem}.pkl",
+                lambda w: pickle.dump((docstore, index_to_docstore_id), w),
+            )
+            _fsync_dir(self.folder)
+        except BaseException:
+            for info in files.values():
+                (self.folder / info["name"]).unlink(missing_ok=True)
+            raise
+
+        entry = {
+            "sequence": sequence,
+            "created_at": time.time(),
+            "ntotal": int(index_cpu.ntotal),
+            "wal_from": wal_from,
+            "files": files,
+        }
+        manifest["snapshots"] = [entry] + snapshots[: self.keep - 1]
+        self._write_manifest(manifest)
+        logger.info(f"Committed snapshot {sequence} of {self.index_name}")
+
+        for old in snapshots[self.keep - 1 :]:
+            for info in old["files"].values():
+                (self.folder / info["name"]).unlink(missing_ok=True)
+        # Superseded by the manifest, but kept as .bak files so a downgrade
+        # can still be rolled back to them by hand.
+        for legacy in (self.legacy_faiss_path, self.legacy_pkl_path):
+            if legacy.exists():
+                legacy.replace(legacy.with_name(legacy.name + ".bak"))
+                _fsync_dir(self.folder)
+
+        return sum(info["size"] for info in files.values())
+
+    def latest_sequence(self) -> Optional[int]:
+        """Sequence of the newest committed snapshot, or None if there is none."""
+        manifest = self.read_manifest()
+        if manifest is None or not manifest["snapshots"]:
+            return None
+        return manifest["snapshots"][0]["sequence"]
+
+    def oldest_wal_segment(self) -> int:
+        """First log segment any retained snapshot may still need replayed."""
+        manifest = self.read_manifest()
+        if manifest is None:
+            return 0
+        return min(
+            (entry.get("wal_from", 0) for entry in manifest["snapshots"]), default=0
+        )
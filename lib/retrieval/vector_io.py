@@ -0,0 +1,49 @@
+import struct
+from io import BytesIO
+from typing import List
+
+import numpy as np
+
+
+def vector_record_dtype(dimension: int, id_length: int) -> np.dtype:
+    """Structured dtype of one exported ``(id, vector)`` record."""
+    return np.dtype([("id", f"S{max(id_length, 1)}"), ("vector", "<f4", (dimension,))])
+
+
+def npy_header(dtype: np.dtype, count: int) -> bytes:
+    """
+    Builds the header of a ``.npy`` file holding ``count`` records of ``dtype``,
+    so that the records themselves can be streamed after it.
+    """
+    header = BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header,
+        {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (count,),
+        },
+    )
+    return header.getvalue()
+
+
+def encode_npy_records(ids: List[str], vectors: np.ndarray, dtype: np.dtype) -> bytes:
+    records = np.empty(len(ids), dtype=dtype)
+    records["id"] = [m_id.encode() for m_id in ids]
+    records["vector"] = vectors
+    return records.tobytes()
+
+
+def encode_raw_records(ids: List[str], vectors: np.ndarray) -> bytes:
+    """
+    Encodes records as ``<uint16 id length><utf-8 id><float32 vector>``, all
+    little-endian, with the dimension sent out of band.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    chunks = []
+    for m_id, vector in zip(ids, vectors):
+        encoded = m_id.encode()
+        chunks.append(struct.pack("<H", len(encoded)))
+        chunks.append(encoded)
+        chunks.append(vector.tobytes())
+    return b"".join(chunks)
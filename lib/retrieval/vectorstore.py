@@ -1,25 +1,71 @@
 import operator
 import torch
 import os
-import shutil
-import pickle
 import queue
 import threading
 import logging
+import time
 import uuid
 import faiss
 import numpy as np
 import torch.nn.functional as F
-from pathlib import Path
-from typing import List, Dict, Any, Optional, Sized, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Sized, Tuple
 from concurrent.futures import ThreadPoolExecutor
 
 
-from lib.retrieval.schemas import Document, MetadataFilter
-from lib.retrieval.embeddings import HuggingFaceEmbeddings
+from lib.retrieval.schemas import (
+    Document,
+    MetadataFilter,
+    SearchRequest,
+    pack_id,
+    unpack_id,
+)
+from lib.retrieval.embeddings import DEFAULT_QUERY_INSTRUCTION, HuggingFaceEmbeddings
+from lib.retrieval.expiry import ExpiryIndex
+from lib.retrieval.cache import MISS, QueryResultCache
+from lib.retrieval.lexical import BM25Index
+from lib.retrieval.index_view import IndexView
+from lib.retrieval.concurrency import search_threads
+from lib.retrieval.dedup import (
+    ContentHashIndex,
+    MinHashLSHIndex,
+    assign_content_ids,
+    content_hash,
+)
+from lib.retrieval.snapshot import JournalEntry, ShadowStore, SnapshotDirectory
+from lib.retrieval.wal import WriteAheadLog
+from lib.monitoring.metrics import (
+    DUPLICATES_REJECTED,
+    DOCSTORE_DOCUMENTS,
+    FAISS_SEARCH_SECONDS,
+    FILTER_SECONDS,
+    INDEX_VECTORS,
+    LOCK_WAIT_SECONDS,
+    SAVE_BYTES,
+    SAVE_QUEUE_DEPTH,
+    SAVE_SECONDS,
+    SAVES,
+    UNSAVED_MUTATIONS,
+    TimedLock,
+)
+from lib.monitoring.tracing import annotate, count, query_hash, stage
 
 logger = logging.getLogger(__name__)
 
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+# Rank offset for reciprocal-rank fusion, as in Cormack et al.
+RRF_K = 60
+
+# Minimum number of appended or removed rows before an index view is
+# compacted into a new dense base index.
+COMPACT_MIN_ROWS = 1024
+# Time filters matching more of the index than this are applied after the search.
+SELECTOR_MAX_FRACTION = 0.9
+# GPU searches fetch removed rows along with k, and GPU faiss caps k at 2048,
+# so GPU indexes are compacted once this many rows are removed.
+GPU_MAX_REMOVED_ROWS = 512
+
 
 class VectorStoreError(Exception):
     def __init__(self, message: str):
@@ -27,6 +73,10 @@ class VectorStoreError(Exception):
         super().__init__(self.message)
 
 
+class ReadOnlyError(VectorStoreError):
+    pass
+
+
 def dependable_faiss_import(no_avx2: Optional[bool] = None) -> faiss:
     """
     Import faiss if available, otherwise raise error.
@@ -54,6 +104,37 @@ def dependable_faiss_import(no_avx2: Optional[bool] = None) -> faiss:
     return faiss
 
 
+def screen_new_documents(
+    stores: List["VectorStore"],
+    docs: List[Document],
+    ids: Optional[List[str]],
+    similarity_threshold: float,
+) -> List[int]:
+    """
+    Implements VectorStore._new_positions against any number of stores, so a
+    sharded store can screen a batch against all of its shards at once.
+    """
+    _len_check_if_sized(ids, docs, "id", "docs")
+    positions = []
+    seen = set()
+    for i, doc in enumerate(docs):
+        if ids is not None and any(store._is_stored(ids[i], doc) for store in stores):
+            continue
+        if similarity_threshold < 1:
+            digest = content_hash(doc.content)
+            duplicate = ("exact", None) if digest in seen else None
+            for store in stores:
+                if duplicate is not None:
+                    break
+                duplicate = store._find_duplicate(doc.content)
+            if duplicate is not None:
+                DUPLICATES_REJECTED.inc(kind=duplicate[0])
+                continue
+            seen.add(digest)
+        positions.append(i)
+    return positions
+
+
 def _len_check_if_sized(x: Any, y: Any, x_name: str, y_name: str) -> None:
     if isinstance(x, Sized) and isinstance(y, Sized) and len(x) != len(y):
         raise ValueError(
@@ -63,13 +144,48 @@ def _len_check_if_sized(x: Any, y: Any, x_name: str, y_name: str) -> None:
     return
 
 
+def validate_embeddings(
+    embeddings, dimension: int, normalize_embeddings: bool, normalize: bool
+) -> np.ndarray:
+    """
+    Checks precomputed vectors against a store's dimension and normalization,
+    returning them as float32. With ``normalize`` set, vectors that should be
+    unit-length are normalized instead of rejected.
+    """
+    embeds = np.asarray(embeddings, dtype=np.float32)
+    if embeds.ndim != 2 or embeds.shape[1] != dimension:
+        raise VectorStoreError(
+            f"Expected embeddings of shape (n, {dimension}), got {embeds.shape}"
+        )
+    if not np.isfinite(embeds).all():
+        raise VectorStoreError("Embeddings contain NaN or infinite values")
+
+    if normalize_embeddings:
+        norms = np.linalg.norm(embeds, axis=1)
+        if normalize:
+            if (norms == 0).any():
+                raise VectorStoreError("Cannot normalize zero-length embeddings")
+            embeds = embeds / norms[:, None]
+        elif not np.allclose(norms, 1.0, atol=1e-3):
+            raise VectorStoreError(
+                "Embeddings must be L2-normalized to match the store's model"
+            )
+    return embeds
+
+
 class VectorStore:
     def __init__(
         self,
         folder_path: str,
         model_name: str = "moka-ai/m3e-base",
-        query_instruction: str = "为这个句子生成表示以用于检索相关文章：",
+        query_instruction: str = DEFAULT_QUERY_INSTRUCTION,
         device: str = "cpu",
+        cache_size: int = 1024,
+        cache_ttl: float = 60.0,
+        embedding: Optional[HuggingFaceEmbeddings] = None,
+        wal_fsync: bool = True,
+        read_only: bool = False,
+        near_duplicate_threshold: float = 0.9,
     ):
         """
         Initializes the VectorStore with the specified folder path for saving indices,
@@ -80,53 +196,404 @@ class VectorStore:
             model_name: Name of the embedding model to use
             query_instruction: Instruction for embedding model when processing queries
             device: Computing device (cpu or cuda)
+            cache_size: Maximum number of cached search results, 0 disables the cache
+            cache_ttl: Seconds a cached search result stays fresh
+            embedding: Optional embedder to use instead of loading `model_name`. It must
+                provide `dimension`, `normalize_embeddings`, `_embed_texts` and
+                `_embed_documents` like HuggingFaceEmbeddings.
+            wal_fsync: Whether adds and removes wait for their write-ahead log
+                record to be fsynced before returning. Without it a crash can
+                lose the last writes the OS had not flushed yet.
+            read_only: Serve the latest committed snapshot without ever writing
+                to the folder, as a replica of a primary that owns it. Mutations
+                raise ReadOnlyError and the write-ahead log is neither replayed
+                nor written.
+            near_duplicate_threshold: Estimated Jaccard similarity of their
+                character shingles at which an incoming document is rejected as
+                a near-duplicate of a stored one before it is encoded, 0 to only
+                reject exact duplicates that early.
         """
         self.device = device
-        self.embedding = HuggingFaceEmbeddings(
-            model_name=model_name,
-            device=self.device,
-            query_instruction=query_instruction,
-        )
+        self.read_only = read_only
+        self.near_duplicate_threshold = near_duplicate_threshold
+        if embedding is None:
+            embedding = HuggingFaceEmbeddings(
+                model_name=model_name,
+                device=self.device,
+                query_instruction=query_instruction,
+            )
+        self.embedding = embedding
 
         self.folder_path = folder_path
 
         # Initialize a thread-safe queue for save tasks and a lock to ensure exclusive access.
         self.save_tasks = queue.Queue()
-        self.save_thread = threading.Thread(target=self._save_worker)
-        self.save_thread.daemon = True
-        self.save_thread.start()
+        self.save_thread = None
+        if not read_only:
+            self.save_thread = threading.Thread(target=self._save_worker)
+            self.save_thread.daemon = True
+            self.save_thread.start()
 
         # Initialize docstore and index to document ID mapping.
         self.docstore: Dict[str, Document] = {}
-        self.index_to_docstore_id = {}
+        # Keyed by packed metadata ids, so keys share the documents' own objects.
+        self.metadata_id_to_docstore_id: Dict[Any, str] = {}
         self.gpu_resources = None
-        self._lock = threading.Lock()
-        self.index = self._load_or_create_index()
+        # Serializes writers only. Readers take the published self._view and
+        # never wait on it.
+        self._lock = TimedLock(threading.Lock(), LOCK_WAIT_SECONDS, lock="vectorstore")
+        self.expiry_index = ExpiryIndex()
+        self.lexical_index = BM25Index()
+        self.content_index = ContentHashIndex()
+        # Replicas never add documents, so they skip the signatures.
+        self.near_duplicate_index = None
+        if near_duplicate_threshold > 0 and not read_only:
+            self.near_duplicate_index = MinHashLSHIndex()
+        # UTF-8 size of the stored document contents, for memory accounting.
+        self.content_bytes = 0
+
+        # Bumped on every add, remove and rebuild; cached results from older
+        # generations are never served.
+        self.generation = 0
+        # Approximate bytes of persisted state changed, accumulated like the
+        # generation, and the values covered by the last successful save.
+        self.changed_bytes = 0
+        self.saved_generation = 0
+        self.saved_changed_bytes = 0
+        self._captured: Tuple[int, int] = (0, 0)
+        # Mutations since the last snapshot capture, replayed by the save worker
+        # onto its shadow copy. None means the next save takes a full copy.
+        self._journal: Optional[List[JournalEntry]] = None
+        self._shadow: Optional[ShadowStore] = None
+        self.wal = None
+        if not read_only:
+            self.wal = WriteAheadLog(self.folder_path, "index", fsync=wal_fsync)
+        self.result_cache = QueryResultCache(max_entries=cache_size, ttl=cache_ttl)
+        self._load_or_create_index()
+
+        self._metric_labels = {"store": self.folder_path}
+        self._gauge_functions = {
+            DOCSTORE_DOCUMENTS: lambda: len(self.docstore),
+            INDEX_VECTORS: lambda: self._view.live_count,
+            SAVE_QUEUE_DEPTH: self.save_tasks.qsize,
+            UNSAVED_MUTATIONS: lambda: self.unsaved_mutations,
+        }
+        for gauge, function in self._gauge_functions.items():
+            gauge.set_function(function, **self._metric_labels)
 
     def _load_or_create_index(self, index_name: str = "index"):
-        path = Path(self.folder_path)
         faiss = dependable_faiss_import()
 
-        _faiss_index_path = str(path / f"{index_name}.faiss")
-        _index_path = str(path / f"{index_name}.pkl")
-
         with self._lock:
-            if os.path.exists(_faiss_index_path) and os.path.exists(_index_path):
-                index_cpu = faiss.read_index(_faiss_index_path)
-                with open(_index_path, "rb") as f:
-                    self.docstore, self.index_to_docstore_id = pickle.load(f)
+            snapshots = SnapshotDirectory(self.folder_path, index_name)
+            loaded = snapshots.load()
+            if loaded is not None:
+                index_cpu, self.docstore, index_to_docstore_id, wal_from = loaded
+            elif self.read_only and snapshots.read_manifest() is not None:
+                # The primary may have pruned the files while they were read;
+                # serving an empty store instead would look like data loss.
+                raise VectorStoreError(f"No loadable snapshot in {self.folder_path}")
             else:
-                d = self.embedding.model.get_sentence_embedding_dimension()
+                d = self.embedding.dimension
                 index_cpu = faiss.IndexFlatL2(d)
                 self.docstore = {}
-                self.index_to_docstore_id = {}
-
+                index_to_docstore_id = {}
+                wal_from = 0
+
+            # Replay mutations logged after the snapshot was taken.
+            entries = list(self.wal.replay(wal_from)) if self.wal else []
+            if entries:
+                recovered = ShadowStore(index_cpu.d)
+                recovered.reset(index_cpu, self.docstore, index_to_docstore_id, 0)
+                recovered.apply(entries, 0)
+                index_cpu = recovered.index
+                self.docstore = recovered.docstore
+                index_to_docstore_id = recovered.index_to_docstore_id
+                # Not in any snapshot yet, so the store starts out dirty.
+                self.generation = len(entries)
+                logger.info(f"Replayed {len(entries)} write-ahead log records")
+
+            self._install_view(index_cpu, index_to_docstore_id)
+            self._rebuild_side_indexes()
             if self.device == "cuda":
-                self.gpu_resources = faiss.StandardGpuResources()
                 logger.info("Loaded index to GPU.")
-                return faiss.index_cpu_to_gpu(self.gpu_resources, 0, index_cpu)
+
+    def _install_view(self, index_cpu, index_to_docstore_id: Dict[int, str]):
+        """
+        Publishes a new view over a dense CPU index, starting a new compaction
+        epoch. Must be called with the lock held.
+        """
+        base = index_cpu
+        if self.device == "cuda":
+            if not self.gpu_resources:
+                self.gpu_resources = faiss.StandardGpuResources()
+            base = faiss.index_cpu_to_gpu(self.gpu_resources, 0, index_cpu)
+        row_ids = [index_to_docstore_id[row] for row in range(index_cpu.ntotal)]
+        self._delta_buffer = np.empty((0, index_cpu.d), dtype=np.float32)
+        times = [self._row_times(doc_id) for doc_id in row_ids]
+        self._time_buffer = np.array(times, dtype=np.float64).reshape(-1, 2)
+        self._view = IndexView(
+            base,
+            self._delta_buffer,
+            row_ids,
+            {doc_id: row for row, doc_id in enumerate(row_ids)},
+            start_times=self._time_buffer[:, 0],
+            expires_at=self._time_buffer[:, 1],
+        )
+
+    def _row_times(self, doc_id: str) -> Tuple[float, float]:
+        """Start time and expiry of a row's document, as kept in the view."""
+        doc = self.docstore.get(doc_id)
+        if doc is None:
+            return np.nan, -np.inf
+        expires_at = doc.metadata.expires_at
+        return doc.metadata.start_time, np.inf if expires_at is None else expires_at
+
+    def _append_row(self, doc_id: str, vector: np.ndarray):
+        """
+        Adds a vector past the end of the current view and publishes a view
+        that includes it. Must be called with the lock held.
+        """
+        view = self._view
+        removed = view.removed
+        previous = view.row_of(doc_id)
+        if previous is not None:
+            # Re-adding an id replaces its vector.
+            removed = removed | {previous}
+        n = len(view.delta)
+        if n == len(self._delta_buffer):
+            # Views published earlier keep the old buffer.
+            grown = np.empty((max(64, 2 * n), view.d), dtype=np.float32)
+            grown[:n] = view.delta
+            self._delta_buffer = grown
+        self._delta_buffer[n] = vector
+        row = view.ntotal
+        if row == len(self._time_buffer):
+            grown = np.empty((max(64, 2 * row), 2), dtype=np.float64)
+            grown[:row] = self._time_buffer[:row]
+            self._time_buffer = grown
+        self._time_buffer[row] = self._row_times(doc_id)
+        delta_sorted = view.delta_sorted and (
+            n == 0 or self._time_buffer[row - 1, 0] <= self._time_buffer[row, 0]
+        )
+        view.row_ids.append(doc_id)
+        readded = view.readded
+        if doc_id in view.id_to_row:
+            # Earlier views may still resolve the id to its old row.
+            readded = dict(readded)
+            readded[doc_id] = row
+        else:
+            view.id_to_row[doc_id] = row
+        self._view = IndexView(
+            view.base,
+            self._delta_buffer[: n + 1],
+            view.row_ids,
+            view.id_to_row,
+            removed,
+            start_times=self._time_buffer[: row + 1, 0],
+            expires_at=self._time_buffer[: row + 1, 1],
+            base_by_time=view.base_by_time,
+            delta_sorted=delta_sorted,
+            readded=readded,
+        )
+
+    def _remove_rows(self, doc_ids: List[str]) -> List[str]:
+        """
+        Masks the rows of the given documents in a newly published view and
+        returns the ids that had a row. Must be called with the lock held.
+        """
+        view = self._view
+        rows = []
+        removed_ids = []
+        for doc_id in dict.fromkeys(doc_ids):
+            row = view.row_of(doc_id)
+            if row is None:
+                continue
+            rows.append(row)
+            removed_ids.append(doc_id)
+        if rows:
+            self._view = IndexView(
+                view.base,
+                view.delta,
+                view.row_ids,
+                view.id_to_row,
+                view.removed | frozenset(rows),
+                start_times=view.start_times,
+                expires_at=view.expires_at,
+                base_by_time=view.base_by_time,
+                delta_sorted=view.delta_sorted,
+                readded=view.readded,
+            )
+        return removed_ids
+
+    def _maybe_compact(self):
+        """
+        Folds the appended rows into a new base index and drops the masked
+        ones once either grows past its threshold, so searches stay cheap.
+        Only writers wait for this; readers keep using the previous view.
+        Must be called with the lock held.
+        """
+        view = self._view
+        max_removed = max(COMPACT_MIN_ROWS, view.ntotal // 32)
+        if self.device == "cuda":
+            max_removed = GPU_MAX_REMOVED_ROWS
+        if (
+            len(view.delta) <= max(COMPACT_MIN_ROWS, view.base_ntotal)
+            and len(view.removed) <= max_removed
+        ):
+            return
+        index_cpu, index_to_docstore_id = view.materialize()
+        self._install_view(index_cpu, index_to_docstore_id)
+
+    def _index_document(self, doc_id: str, doc: Document):
+        """
+        Registers a document in the auxiliary indexes kept alongside the docstore.
+        Must be called with the lock held.
+        """
+        self.metadata_id_to_docstore_id[doc.metadata.packed_id] = doc_id
+        self.expiry_index.add(doc_id, doc.metadata.expires_at)
+        self.lexical_index.add(doc_id, doc.content)
+        self.content_index.add(doc_id, doc.content)
+        if self.near_duplicate_index is not None:
+            self.near_duplicate_index.add(doc_id, doc.content)
+        self.content_bytes += len(doc.content.encode("utf-8"))
+
+    def _unindex_document(self, doc_id: str, doc: Document):
+        """
+        Removes a document from the auxiliary indexes. Must be called with the lock held.
+        """
+        if self.metadata_id_to_docstore_id.get(doc.metadata.packed_id) == doc_id:
+            del self.metadata_id_to_docstore_id[doc.metadata.packed_id]
+        self.expiry_index.discard(doc_id)
+        self.lexical_index.remove(doc_id, doc.content)
+        self.content_index.remove(doc_id, doc.content)
+        if self.near_duplicate_index is not None:
+            self.near_duplicate_index.remove(doc_id, doc.content)
+        self.content_bytes -= len(doc.content.encode("utf-8"))
+
+    @property
+    def dimension(self) -> int:
+        return self._view.d
+
+    def next_expiry(self) -> Optional[float]:
+        """Earliest expiry deadline among stored documents, if any."""
+        return self.expiry_index.next_expiry()
+
+    def _bump_generation(self, changed_bytes: int = 0):
+        """Must be called with the lock held."""
+        self.generation += 1
+        self.changed_bytes += changed_bytes
+
+    def _document_nbytes(self, doc: Document) -> int:
+        """Rough persisted size of a document: its vector plus its content."""
+        return self._view.d * 4 + len(doc.content.encode("utf-8"))
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyError("Vector store is read-only")
+
+    def snapshot_version(self) -> Optional[int]:
+        """Sequence of the newest snapshot committed on disk, if any."""
+        return SnapshotDirectory(self.folder_path).latest_sequence()
+
+    @property
+    def memory_bytes(self) -> int:
+        """
+        Approximate resident size of the store: the raw vectors plus the
+        document contents. Side indexes and Python object overhead are not
+        counted, so this is a lower bound useful for relative budgeting.
+        """
+        view = self._view
+        return view.live_count * view.d * 4 + self.content_bytes
+
+    @property
+    def unsaved_mutations(self) -> int:
+        """Mutations since the state covered by the last successful save."""
+        return self.generation - self.saved_generation
+
+    @property
+    def unsaved_bytes(self) -> int:
+        return self.changed_bytes - self.saved_changed_bytes
+
+    @property
+    def is_dirty(self) -> bool:
+        return self.generation != self.saved_generation
+
+    @property
+    def save_pending(self) -> bool:
+        """Whether a save is queued or in progress."""
+        return self.save_tasks.unfinished_tasks > 0
+
+    def _log_mutation(self, entry: JournalEntry) -> int:
+        """
+        Records a mutation in the write-ahead log and the snapshot journal.
+        Must be called with the lock held. Returns the log sequence number to
+        pass to ``self.wal.sync`` once the lock is released.
+        """
+        lsn = self.wal.append(entry)
+        if self._journal is not None:
+            self._journal.append(entry)
+            # Past this point replaying costs more than copying the whole store.
+            if len(self._journal) > max(1024, self._view.live_count):
+                self._journal = None
+        return lsn
+
+    def _capture_snapshot(self) -> ShadowStore:
+        """
+        Brings the save worker's shadow copy up to the current generation.
+
+        Under the lock this only swaps out the journal, or when a full copy is
+        needed (first save, after a rebuild or clear, or an oversized journal)
+        takes the current view and a copy of the docstore. The journal is
+        replayed, or the view copied out, after the lock is released.
+        """
+        journal = None
+        view = None
+        with self._lock:
+            generation = self.generation
+            self._captured = (generation, self.changed_bytes)
+            # Mutations from here on go to a new log segment, which the
+            # snapshot records as the point to replay from.
+            wal_from = self.wal.rotate()
+            if self._journal is None or self._shadow is None:
+                # Views never change, so copying the vectors out can wait.
+                view = self._view
+                docstore = dict(self.docstore)
+                self._journal = []
+                # Until the copy is made, there is no shadow to replay onto.
+                self._shadow = None
             else:
-                return index_cpu
+                journal, self._journal = self._journal, []
+
+        if journal is None:
+            index_cpu, index_to_docstore_id = view.materialize()
+            shadow = ShadowStore(index_cpu.d)
+            shadow.reset(index_cpu, docstore, index_to_docstore_id, generation)
+            shadow.wal_from = wal_from
+            self._shadow = shadow
+            return shadow
+
+        try:
+            self._shadow.apply(journal, generation)
+            self._shadow.wal_from = wal_from
+        except Exception:
+            # The shadow may be half-updated; take a full copy next time.
+            self._shadow = None
+            with self._lock:
+                self._journal = None
+            raise
+        return self._shadow
+
+    def _rebuild_side_indexes(self):
+        self.metadata_id_to_docstore_id = {}
+        self.expiry_index.clear()
+        self.lexical_index.clear()
+        self.content_index.clear()
+        if self.near_duplicate_index is not None:
+            self.near_duplicate_index.clear()
+        self.content_bytes = 0
+        for doc_id, doc in self.docstore.items():
+            self._index_document(doc_id, doc)
 
     def _save_worker(self):
         """
@@ -137,59 +604,47 @@ class VectorStore:
             task = self.save_tasks.get()
             if task is None:  # Use None as a signal to stop the worker.
                 break
-            self._perform_save(task)
-            self.save_tasks.task_done()
+            try:
+                self._perform_save(task)
+                SAVES.inc(outcome="success")
+            except Exception as e:
+                # Keep the worker alive so later saves still run.
+                SAVES.inc(outcome="error")
+                logger.error(f"Save task for {task} failed: {e}")
+            finally:
+                self.save_tasks.task_done()
 
     def _perform_save(self, index_name: str):
         """
         Performs the actual save operation for the index and docstore.
         This method is called by the worker thread.
-        If the index is on GPU, it transfers it to CPU before saving.
-        Before saving, creates backups of existing data. If the save fails,
-        restores from the backups.
+        It writes a consistent snapshot captured by _capture_snapshot, so
+        writers are not blocked while the files are written. The snapshot is
+        committed atomically through SnapshotDirectory; if the save fails, the
+        previous generation stays current.
         """
         logger.info(f"Performing save operation for {index_name}.")
-        path = Path(self.folder_path)
-        path.mkdir(exist_ok=True, parents=True)
-
-        backup_faiss_path = path / f"{index_name}_backup.faiss"
-        backup_pkl_path = path / f"{index_name}_backup.pkl"
-        original_faiss_path = path / f"{index_name}.faiss"
-        original_pkl_path = path / f"{index_name}.pkl"
+        save_started = time.perf_counter()
 
         try:
-            if original_faiss_path.exists():
-                shutil.copyfile(original_faiss_path, backup_faiss_path)
-            if original_pkl_path.exists():
-                shutil.copyfile(original_pkl_path, backup_pkl_path)
-
-            self.rebuild_index()
-
-            index_to_save = self.index
-            if self.device == "cuda":
-                logger.info("Transferring index from GPU to CPU for saving.")
-                index_to_save = faiss.index_gpu_to_cpu(self.index)
-                torch.cuda.synchronize()  # Ensure all CUDA operations are complete
-
-            faiss.write_index(index_to_save, str(original_faiss_path))
-            with open(original_pkl_path, "wb") as f:
-                pickle.dump((self.docstore, self.index_to_docstore_id), f)
-        except Exception as e:
-            logger.error(
-                f"Save operation failed: {e}, attempting to restore from backup."
+            snapshot = self._capture_snapshot()
+            directory = SnapshotDirectory(self.folder_path, index_name)
+            nbytes = directory.write(
+                snapshot.index,
+                snapshot.docstore,
+                snapshot.index_to_docstore_id,
+                wal_from=snapshot.wal_from,
             )
-            if backup_faiss_path.exists():
-                shutil.copyfile(backup_faiss_path, original_faiss_path)
-            if backup_pkl_path.exists():
-                shutil.copyfile(backup_pkl_path, original_pkl_path)
-            logger.info("Restored data from backup.")
+        except Exception as e:
+            logger.error(f"Save operation failed: {e}, previous snapshot is kept.")
             raise
-        finally:
-            if backup_faiss_path.exists():
-                backup_faiss_path.unlink()
-            if backup_pkl_path.exists():
-                backup_pkl_path.unlink()
 
+        # Log segments older than every retained snapshot are no longer needed.
+        self.wal.remove_segments_before(directory.oldest_wal_segment())
+
+        self.saved_generation, self.saved_changed_bytes = self._captured
+        SAVE_SECONDS.observe(time.perf_counter() - save_started, **self._metric_labels)
+        SAVE_BYTES.set(nbytes, **self._metric_labels)
         logger.info(f"Save operation for {index_name} completed successfully.")
 
     def save_index(self, index_name: str = "index"):
@@ -197,125 +652,153 @@ class VectorStore:
         Queues a save task for the specified index. If a save operation is already in progress,
         the task will wait in the queue until it's processed by the worker thread.
         """
+        self._check_writable()
         logger.info(f"Queueing save operation for {index_name}.")
         self.save_tasks.put(index_name)
 
+    def close(self, save: bool = True):
+        """
+        Stops the background threads of the store. With ``save``, unsaved
+        changes are written to a final snapshot first; either way they remain
+        recoverable from the write-ahead log. The store must not be used
+        afterwards.
+        """
+        if self.save_thread is not None:
+            if save and self.is_dirty:
+                self.save_index()
+            self.save_tasks.put(None)
+            self.save_thread.join()
+        if self.wal is not None:
+            self.wal.close()
+        # The gauge callbacks would otherwise keep the closed store alive. A
+        # store reloaded from the same folder may have replaced them already.
+        for gauge, function in self._gauge_functions.items():
+            gauge.remove_function(function, **self._metric_labels)
+
     def rebuild_index(self):
         """
         Rebuilds the FAISS index based on the current state of the docstore. This is useful if the
         embedding model has changed or if the index has become corrupted or out-of-sync with the docstore.
-        """
-        self._lock.acquire()
-        try:
-            faiss = dependable_faiss_import()
-            d = self.embedding.model.get_sentence_embedding_dimension()
-            new_index_cpu = faiss.IndexFlatL2(d)
-
-            all_docs = list(self.docstore.values())
-            all_ids = list(self.docstore.keys())
-
-            if not all_docs:
-                self.index = new_index_cpu
-                self.index_to_docstore_id = {}
-                self._lock.release()
-                return
-
-            def embed_docs(docs: list[Document]):
-                return np.array(
-                    self.embedding._embed_texts([doc.content for doc in docs]),
-                    dtype=np.float32,
-                )
 
-            num_threads = 12
-            chunk_size = max(1, len(all_docs) // num_threads)
-            chunks = [
-                all_docs[i : i + chunk_size]
-                for i in range(0, len(all_docs), chunk_size)
-            ]
-            with ThreadPoolExecutor(max_workers=num_threads) as executor:
-                results = executor.map(embed_docs, chunks)
-            embeddings = np.concatenate(list(results))
-
-            def rebuild():
-                try:
-                    new_index_cpu.add(embeddings)
-                    self.index_to_docstore_id = {
-                        i: doc_id for i, doc_id in enumerate(all_ids)
-                    }
-
-                    if self.device == "cuda":
-                        if not self.gpu_resources:
-                            self.gpu_resources = faiss.StandardGpuResources()
-                        self.index = faiss.index_cpu_to_gpu(
-                            self.gpu_resources, 0, new_index_cpu
-                        )
-                        torch.cuda.synchronize()
-                    else:
-                        self.index = new_index_cpu
-
-                    logger.info("Index has been successfully rebuilt and reloaded.")
-                except Exception as e:
-                    logger.error(f"Error during index rebuild: {e}")
-                    raise
-                finally:
-                    self._lock.release()
-
-            threading.Thread(target=rebuild).start()
-        except Exception as e:
-            self._lock.release()
-            logger.error(f"Error initiating index rebuild: {e}")
-            raise
+        Writers wait for the rebuild to finish, while searches keep using the
+        previous index until the new one is swapped in.
+        """
+        self._check_writable()
+        with self._lock:
+            try:
+                d = self.embedding.dimension
+                new_index_cpu = faiss.IndexFlatL2(d)
+                all_docs = list(self.docstore.values())
+                all_ids = list(self.docstore.keys())
+
+                def embed_docs(docs: list[Document]):
+                    return np.array(
+                        self.embedding._embed_documents([doc.content for doc in docs]),
+                        dtype=np.float32,
+                    )
+
+                if all_docs:
+                    num_threads = 12
+                    chunk_size = max(1, len(all_docs) // num_threads)
+                    chunks = [
+                        all_docs[i : i + chunk_size]
+                        for i in range(0, len(all_docs), chunk_size)
+                    ]
+                    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                        results = executor.map(embed_docs, chunks)
+                    new_index_cpu.add(np.concatenate(list(results)))
+
+                self._install_view(new_index_cpu, dict(enumerate(all_ids)))
+                self._journal = None
+                self._bump_generation(new_index_cpu.ntotal * d * 4)
+                if self.device == "cuda":
+                    torch.cuda.synchronize()
+                logger.info("Index has been successfully rebuilt and reloaded.")
+            except Exception as e:
+                logger.error(f"Error during index rebuild: {e}")
+                raise
 
     def remove_documents_by_id(
         self, target_id_list: Optional[List[str]]
     ) -> List[Document]:
+        self._check_writable()
         if target_id_list is None:
-            self.docstore = {}
-            self.index_to_docstore_id = {}
-            n_removed = self.index.ntotal
-            n_total = self.index.ntotal
-            self.index.reset()
+            with self._lock:
+                view = self._view
+                n_removed = view.live_count
+                n_total = view.live_count
+                self._install_view(faiss.IndexFlatL2(view.d), {})
+                self.docstore = {}
+                self.metadata_id_to_docstore_id = {}
+                self.expiry_index.clear()
+                self.lexical_index.clear()
+                self.content_index.clear()
+                if self.near_duplicate_index is not None:
+                    self.near_duplicate_index.clear()
+                self.content_bytes = 0
+                lsn = self._log_mutation(("clear",))
+                self._journal = None
+                self._bump_generation(n_removed * view.d * 4)
+            self.wal.sync(lsn)
             return n_removed, n_total
         set_ids = set(target_id_list)
         if len(set_ids) != len(target_id_list):
             raise VectorStoreError("Duplicate ids in the list of ids to remove.")
-        index_ids = [
-            i_id
-            for i_id, d_id in self.index_to_docstore_id.items()
-            if d_id in target_id_list
-        ]
-        n_removed = len(index_ids)
-        n_total = self.index.ntotal
-        removed_documents = [
-            self.docstore[d_id] for d_id in target_id_list if d_id in self.docstore
-        ]
-
-        if self.device == "cuda":
-            index_cpu = faiss.index_gpu_to_cpu(self.index)
-            index_cpu.remove_ids(np.array(index_ids, dtype=np.int64))
-            self.index = faiss.index_cpu_to_gpu(self.gpu_resources, 0, index_cpu)
-            torch.cuda.synchronize()
-        else:
-            self.index.remove_ids(np.array(index_ids, dtype=np.int64))
 
-        for i_id, d_id in zip(index_ids, target_id_list):
-            del self.docstore[d_id]
-            del self.index_to_docstore_id[i_id]
-        self.index_to_docstore_id = {
-            i: d_id for i, d_id in enumerate(self.index_to_docstore_id.values())
-        }
+        with self._lock:
+            removed_documents = [
+                self.docstore[d_id] for d_id in target_id_list if d_id in self.docstore
+            ]
+            # Rows are only masked here; compaction drops them later.
+            removed_ids = self._remove_rows(target_id_list)
+            if not removed_ids:
+                return removed_documents
+
+            lsn = self._log_mutation(("remove", removed_ids))
+            changed_bytes = 0
+            for d_id in removed_ids:
+                doc = self.docstore.pop(d_id, None)
+                if doc is not None:
+                    changed_bytes += self._document_nbytes(doc)
+                    self._unindex_document(d_id, doc)
+            self._bump_generation(changed_bytes)
+            self._maybe_compact()
+        self.wal.sync(lsn)
         return removed_documents
 
+    def remove_expired_documents(self) -> List[Document]:
+        """
+        Evicts every document whose validity window has elapsed from both the
+        docstore and the index, so that searches no longer spend candidates on them.
+        """
+        self._check_writable()
+        expired_ids = self.expiry_index.pop_expired()
+        if not expired_ids:
+            return []
+        with self._lock:
+            # Documents may have been removed since their deadline was popped.
+            expired_ids = [d_id for d_id in expired_ids if d_id in self.docstore]
+        if not expired_ids:
+            return []
+        try:
+            return self.remove_documents_by_id(expired_ids)
+        except Exception:
+            # Put back the deadlines of what is still stored, so the next
+            # sweep retries them.
+            for doc_id in expired_ids:
+                doc = self.docstore.get(doc_id)
+                if doc is not None:
+                    self.expiry_index.add(doc_id, doc.metadata.expires_at)
+            raise
+
     def delete_documents_by_id(self, target_id: List[int]) -> List[Document]:
         if target_id is None or len(target_id) < 1:
             raise ValueError("Parameter target_ids cannot be empty.")
 
+        targets = {pack_id(m_id) for m_id in target_id}
         id_to_remove = []
         for _id, doc in self.docstore.items():
-            to_remove = False
-            if doc.metadata.id in target_id:
-                to_remove = True
-            if to_remove:
+            if doc.metadata.packed_id in targets:
                 id_to_remove.append(_id)
         return self.remove_documents_by_id(id_to_remove)
 
@@ -334,9 +817,119 @@ class VectorStore:
         docs: List[Document],
         id: Optional[List[str]] = None,
         similarity_threshold: float = 0.9,
+        content_ids: bool = False,
     ) -> List[Document]:
-        embeds = self.embedding._embed_texts([doc.content for doc in docs])
+        """
+        Args:
+            docs: Documents to add.
+            id: Optional docstore keys for the documents.
+            similarity_threshold: Cosine similarity above which a document is
+                treated as a duplicate of one already stored. Exact and near
+                duplicates are rejected before encoding unless it is 1 or more.
+            content_ids: Use each document's content hash as both its metadata
+                id and docstore key instead of ``id``, so resubmitting the same
+                content is idempotent.
+        """
+        self._check_writable()
+        if content_ids:
+            id = assign_content_ids(docs)
+        docs, id = self._select(
+            docs, id, self._new_positions(docs, id, similarity_threshold)
+        )
+        if not docs:
+            return []
+        with stage("encode"):
+            embeds = self.embedding._embed_documents([doc.content for doc in docs])
+        return self._add_embedded_documents(docs, embeds, id, similarity_threshold)
+
+    def _find_duplicate(self, content: str) -> Optional[Tuple[str, str]]:
+        """
+        Kind ("exact" or "near") and docstore id of a stored document that the
+        content duplicates, found without running the model.
+        """
+        doc_id = self.content_index.find(content)
+        if doc_id is not None:
+            return "exact", doc_id
+        if self.near_duplicate_index is not None:
+            doc_id = self.near_duplicate_index.find(
+                content, self.near_duplicate_threshold
+            )
+            if doc_id is not None:
+                return "near", doc_id
+        return None
+
+    def _is_stored(self, doc_id: str, doc: Document) -> bool:
+        """Whether the same content is already stored under this id."""
+        stored = self.docstore.get(doc_id)
+        return stored is not None and stored.content == doc.content
+
+    def _new_positions(
+        self,
+        docs: List[Document],
+        ids: Optional[List[str]],
+        similarity_threshold: float,
+    ) -> List[int]:
+        """
+        Positions of the documents worth encoding. Resubmissions of a stored
+        document under its id are dropped, and unless duplicate detection is
+        off, so are documents duplicating a stored or earlier batch document.
+        Judged from content alone, so duplicates never reach the model.
+        """
+        return screen_new_documents([self], docs, ids, similarity_threshold)
+
+    @staticmethod
+    def _select(
+        docs: List[Document], ids: Optional[List[str]], positions: List[int]
+    ) -> Tuple[List[Document], Optional[List[str]]]:
+        if len(positions) == len(docs):
+            return docs, ids
+        return [docs[i] for i in positions], (
+            None if ids is None else [ids[i] for i in positions]
+        )
+
+    def add_documents_with_embeddings(
+        self,
+        docs: List[Document],
+        embeddings: np.ndarray,
+        id: Optional[List[str]] = None,
+        similarity_threshold: float = 0.9,
+        normalize: bool = False,
+        content_ids: bool = False,
+    ) -> List[Document]:
+        """
+        Adds documents together with precomputed vectors, skipping the embedding
+        model entirely. The vectors must come from the same model the store uses.
+
+        Args:
+            docs: Documents to add.
+            embeddings: Array of shape (len(docs), dimension).
+            id: Optional docstore keys for the documents.
+            similarity_threshold: Cosine similarity above which a document is
+                treated as a duplicate of one already stored.
+            normalize: If the store expects unit-length vectors, normalize the
+                input instead of rejecting vectors that are not.
+            content_ids: As in `add_documents`.
+        """
+        self._check_writable()
+        embeds = validate_embeddings(
+            embeddings, self.dimension, self.embedding.normalize_embeddings, normalize
+        )
+        _len_check_if_sized(embeds, docs, "embeds", "docs")
+        if content_ids:
+            id = assign_content_ids(docs)
+        positions = self._new_positions(docs, id, similarity_threshold)
+        docs, id = self._select(docs, id, positions)
+        return self._add_embedded_documents(
+            docs, embeds[positions], id, similarity_threshold
+        )
 
+    def _add_embedded_documents(
+        self,
+        docs: List[Document],
+        embeds: np.ndarray,
+        id: Optional[List[str]],
+        similarity_threshold: float,
+    ) -> List[Document]:
         embeds = np.asarray(embeds, dtype=np.float32)
         id = id or [str(uuid.uuid4()) for _ in docs]
 
@@ -344,64 +937,175 @@ class VectorStore:
         _len_check_if_sized(id, docs, "id", "docs")
 
         added_docs = []
+        lsn = None
 
         for i, doc in enumerate(docs):
             embed = embeds[i]
 
-            similar_docs = self.similarity_search_with_score_by_vector(
-                embedding=embed, k=2
+            with self._lock:
+                doc_id = id[i]
+                if self._is_stored(doc_id, doc):
+                    # Resubmitted under the same id, as with content ids.
+                    continue
+                # Checked again under the lock, since a concurrent batch may
+                # have added the same content after it was screened.
+                if (
+                    similarity_threshold < 1
+                    and self.content_index.find(doc.content) is not None
+                ):
+                    continue
+
+                # Compare against the stored vectors of the nearest neighbours
+                # rather than re-encoding their content.
+                is_duplicate = False
+                view = self._view
+                if view.live_count > 0:
+                    with stage("faiss", FAISS_SEARCH_SECONDS, **self._metric_labels):
+                        _, indices = view.search(
+                            np.array([embed], dtype=np.float32),
+                            min(2, view.live_count),
+                        )
+                    for row in indices[0]:
+                        if row == -1:
+                            continue
+                        similar_embed = view.reconstruct(int(row))
+                        cosine_similarity = self._cosine_similarity(
+                            embed, similar_embed
+                        )
+                        if cosine_similarity > similarity_threshold:
+                            is_duplicate = True
+                            break
+                if is_duplicate:
+                    continue
+
+                # The docstore entry goes in first, so a search that sees the
+                # new row can always resolve it.
+                self.docstore[doc_id] = doc
+                self._append_row(doc_id, embed)
+                self._index_document(doc_id, doc)
+                lsn = self._log_mutation(
+                    ("add", doc_id, doc, np.asarray(embed, dtype=np.float32))
+                )
+                self._bump_generation(self._document_nbytes(doc))
+                self._maybe_compact()
+                added_docs.append(doc)
+
+        # One fsync covers the whole batch, and concurrent writers share it.
+        if lsn is not None:
+            self.wal.sync(lsn)
+        return added_docs
+
+    def export_vectors(
+        self, batch_size: int = 1024
+    ) -> Tuple[int, int, Iterator[Tuple[List[str], np.ndarray]]]:
+        """
+        Exports the stored vectors without re-embedding anything.
+
+        Returns:
+            The number of vectors, the longest metadata id in bytes, and an
+            iterator of ``(metadata ids, vectors)`` batches read back from the
+            index. The export reflects the store as of this call; writes made
+            while the iterator is consumed do not affect it.
+        """
+        with self._lock:
+            view = self._view
+            # A shallow copy, so documents removed meanwhile still resolve.
+            docstore = dict(self.docstore)
+            id_length = max(
+                (
+                    len(unpack_id(m_id).encode())
+                    for m_id in self.metadata_id_to_docstore_id
+                ),
+                default=0,
             )
+        rows = view.live_rows()
+        n_total = len(rows)
 
-            is_duplicate = False
-            for similar_doc, score in similar_docs:
-                similar_embed = self.embedding._embed_texts([similar_doc.content])[0]
-                cosine_similarity = self._cosine_similarity(embed, similar_embed)
-                if cosine_similarity > similarity_threshold:
-                    is_duplicate = True
-                    break
+        def batches():
+            for start in range(0, n_total, batch_size):
+                batch_rows = rows[start : start + batch_size]
+                vectors = view.vectors(batch_rows)
+                ids = [docstore[view.row_ids[row]].metadata.id for row in batch_rows]
+                yield ids, vectors
 
-            if not is_duplicate:
-                with self._lock:
-                    if self.device == "cuda":
-                        index_cpu = faiss.index_gpu_to_cpu(self.index)
-                        index_cpu.add(np.array([embed], dtype=np.float32))
-                        self.index = faiss.index_cpu_to_gpu(
-                            self.gpu_resources, 0, index_cpu
-                        )
-                        torch.cuda.synchronize()
-                    else:
-                        self.index.add(np.array([embed], dtype=np.float32))
+        return n_total, id_length, batches()
 
-                    doc_id = id[i]
-                    self.docstore[doc_id] = doc
-                    self.index_to_docstore_id[len(self.index_to_docstore_id)] = doc_id
-                    added_docs.append(doc)
+    def _eligible_rows(
+        self, view: IndexView, metadata_filter: Optional[MetadataFilter]
+    ) -> Optional[np.ndarray]:
+        """
+        Resolves the time-range part of a metadata filter to the index rows that
+        may match it, from the time columns of the view rather than the docstore.
 
-        return added_docs
+        Returns None when the filter places no restriction on time, or when
+        the rows cover so much of the index that a selector would cost more
+        than dropping the few misses after the search.
+        """
+        if metadata_filter is None or not metadata_filter.has_time_range:
+            return None
+
+        start = metadata_filter.created_after
+        end = metadata_filter.created_before
+        valid_at = metadata_filter.valid_at
+        if valid_at is not None:
+            end = valid_at if end is None else min(end, valid_at)
+
+        rows = view.rows_in_time_range(start, end, valid_at)
+        if len(rows) > SELECTOR_MAX_FRACTION * view.live_count:
+            return None
+        return rows
 
     def similarity_search_with_score_by_vector(
         self,
         embedding: List[float],
         k: int = 4,
+        eligible_rows: Optional[np.ndarray] = None,
+        view: Optional[IndexView] = None,
         **kwargs: Any,
     ) -> List[Tuple[Document, float]]:
+        """
+        Args:
+            embedding: Query vector.
+            k: Number of nearest neighbours to fetch.
+            eligible_rows: Optional index rows to restrict the scan to. Rows outside
+                this set are skipped by faiss itself rather than filtered afterwards.
+            view: Index view the rows refer to, by default the current one.
+        """
+        view = view or self._view
         vector = np.array([embedding], dtype=np.float32)
-        scores, indices = self.index.search(vector, k)
+        if eligible_rows is not None and len(eligible_rows) == 0:
+            return []
+        with stage("faiss", FAISS_SEARCH_SECONDS, **self._metric_labels):
+            with search_threads():
+                scores, indices = view.search(vector, k, eligible_rows)
+        return self._collect_docs_and_scores(
+            view, scores[0], indices[0], k, kwargs.get("score_threshold")
+        )
+
+    def _collect_docs_and_scores(
+        self,
+        view: IndexView,
+        scores: np.ndarray,
+        indices: np.ndarray,
+        k: int,
+        score_threshold: Optional[float] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Maps one row of faiss search output back to documents.
+        """
         docs = []
 
-        for j, i in enumerate(indices[0]):
-            if i == -1:
+        for j, i in enumerate(indices[:k]):
+            _id = view.doc_id(i)
+            if _id is None:
                 # This happens when not enough docs are returned.
                 continue
-            _id = self.index_to_docstore_id[i]
             doc = self.docstore.get(_id)
-            if not isinstance(doc, Document):
-                raise VectorStoreError(
-                    f"Could not find document for id {_id}, got {doc}"
-                )
-            docs.append((doc, scores[0][j]))
+            if doc is None:
+                # Removed after the view was taken.
+                continue
+            docs.append((doc, scores[j]))
 
-        score_threshold = kwargs.get("score_threshold")
         if score_threshold is not None:
             cmp = operator.le
             docs = [
@@ -412,7 +1116,12 @@ class VectorStore:
         return docs[:k]
 
     def search(
-        self, query, k=5, metadata_filter: Optional[MetadataFilter] = None, **kwargs
+        self,
+        query,
+        k=5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        mode: str = "vector",
+        **kwargs,
     ) -> List[Document]:
         """
         Search for documents similar to the query.
@@ -421,35 +1130,254 @@ class VectorStore:
             query: The search query.
             k: Number of results to return.
             metadata_filter: Optional filter to apply to document metadata.
+            mode: "vector" for semantic search, "lexical" for BM25 keyword search
+                  (no model inference), or "hybrid" to fuse both rankings.
             **kwargs: Additional arguments.
                 score_threshold: Optional float. If provided, only return documents with a similarity score
                                 less than or equal to this threshold (lower is better for L2 distance).
+                                Ignored by the lexical ranking.
 
         Returns:
             List[Document]: List of documents matching the query.
         """
-        if self.index.ntotal == 0:
+        return [
+            doc
+            for doc, _ in self.search_with_score(
+                query, k, metadata_filter, mode, **kwargs
+            )
+        ]
+
+    def search_with_score(
+        self,
+        query,
+        k=5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        mode: str = "vector",
+        **kwargs,
+    ) -> List[Tuple[Document, Optional[float]]]:
+        """
+        As ``search``, with each document's score: the L2 distance for vector
+        search, the BM25 score for lexical search, and None for hybrid search,
+        whose fused ranks are not a score.
+        """
+        if mode not in SEARCH_MODES:
+            raise VectorStoreError(f"Unknown search mode: {mode}")
+        if self._view.live_count == 0:
             return []
 
-        embeddings = self.embedding._embed_texts([query])
+        filter_key = None
+        if metadata_filter is not None:
+            filter_key = metadata_filter.cache_key()
+        annotate(query_hash=query_hash(str(query)), k=k, mode=mode, filter=filter_key)
+        if metadata_filter is not None and filter_key is None:
+            # Custom filters are not cacheable.
+            annotate(filter="custom", cache=MISS)
+            return self._search(query, k, metadata_filter, mode, **kwargs)
+
+        cache_key = (query, k, filter_key, mode, tuple(sorted(kwargs.items())))
+        results, outcome = self.result_cache.get_or_compute(
+            cache_key,
+            self.generation,
+            lambda: self._search(query, k, metadata_filter, mode, **kwargs),
+        )
+        annotate(cache=outcome)
+        # Documents may have expired since the result was cached.
+        return [(doc, score) for doc, score in results if doc.is_valid]
 
-        fetch_k = k * 4 if metadata_filter else k
-        fetch_k = min(fetch_k, self.index.ntotal, 100)
-        if fetch_k <= 0:
+    def _search(
+        self,
+        query,
+        k=5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        mode: str = "vector",
+        **kwargs,
+    ) -> List[Tuple[Document, Optional[float]]]:
+        if mode == "lexical":
+            return self._scored_lexical_search(query, k, metadata_filter)
+        if mode == "hybrid":
+            docs = self._hybrid_search(query, k, metadata_filter, **kwargs)
+            return [(doc, None) for doc in docs]
+        return self._scored_vector_query(query, k, metadata_filter, **kwargs)
+
+    def _lexical_search(
+        self, query, k=5, metadata_filter: Optional[MetadataFilter] = None
+    ) -> List[Document]:
+        return [
+            doc for doc, _ in self._scored_lexical_search(query, k, metadata_filter)
+        ]
+
+    def _scored_lexical_search(
+        self, query, k=5, metadata_filter: Optional[MetadataFilter] = None
+    ) -> List[Tuple[Document, float]]:
+        if k <= 0:
             return []
+        # Expired and filtered-out hits are dropped afterwards, so fetch more
+        # when filtering, and widen the fetch if too few survive.
+        fetch_k = k if metadata_filter is None else k * 4
+        while True:
+            docs = []
+            with stage("lexical"):
+                hits = self.lexical_index.search(query, fetch_k)
+            count("candidates", len(hits))
+            for doc_id, score in hits:
+                doc = self.docstore.get(doc_id)
+                if doc is None or not doc.is_valid:
+                    continue
+                if metadata_filter and not metadata_filter.match(doc.metadata):
+                    continue
+                docs.append((doc, score))
+                if len(docs) >= k:
+                    return docs
+            if len(hits) < fetch_k:
+                return docs
+            fetch_k *= 4
+
+    def _hybrid_search(
+        self, query, k=5, metadata_filter: Optional[MetadataFilter] = None, **kwargs
+    ) -> List[Document]:
+        """
+        Fuses the vector and lexical rankings with reciprocal-rank fusion.
+        """
+        fetch_k = max(k * 2, 10)
+        rankings = [
+            self._vector_search(query, fetch_k, metadata_filter, **kwargs),
+            self._lexical_search(query, fetch_k, metadata_filter),
+        ]
+
+        return self._fuse_rankings(rankings, k)
+
+    @staticmethod
+    def _fuse_rankings(rankings: List[List[Document]], k: int) -> List[Document]:
+        fused_scores: Dict[str, float] = {}
+        docs_by_id: Dict[str, Document] = {}
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking):
+                doc_id = doc.metadata.id
+                docs_by_id[doc_id] = doc
+                fused_scores[doc_id] = fused_scores.get(doc_id, 0.0) + 1.0 / (
+                    RRF_K + rank + 1
+                )
+
+        ranked_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)
+        return [docs_by_id[doc_id] for doc_id in ranked_ids[:k]]
+
+    def _vector_search(
+        self, query, k=5, metadata_filter: Optional[MetadataFilter] = None, **kwargs
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self._scored_vector_query(query, k, metadata_filter, **kwargs)
+        ]
+
+    def _scored_vector_query(
+        self, query, k=5, metadata_filter: Optional[MetadataFilter] = None, **kwargs
+    ) -> List[Tuple[Document, float]]:
+        plan = self._plan_vector_search(k, metadata_filter)
+        if plan is None:
+            return []
+        fetch_k, eligible_rows, view = plan
+
+        with stage("encode"):
+            embeddings = self.embedding._embed_texts([query])
 
         docs_and_scores = self.similarity_search_with_score_by_vector(
             embeddings[0],
             fetch_k,
+            eligible_rows=eligible_rows,
+            view=view,
             **kwargs,
         )
+        return self._finalize_vector_results(docs_and_scores, k, metadata_filter)
+
+    def _scored_vector_search(
+        self,
+        embedding: np.ndarray,
+        k: int,
+        metadata_filter: Optional[MetadataFilter] = None,
+        exclude: Optional[Document] = None,
+        **kwargs,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k valid, filter-matching documents with their L2 distances for an
+        already encoded query, so results from several stores can be merged.
+        """
+        plan = self._plan_vector_search(
+            k + 1 if exclude is not None else k, metadata_filter
+        )
+        if plan is None:
+            return []
+        fetch_k, eligible_rows, view = plan
+        docs_and_scores = self.similarity_search_with_score_by_vector(
+            embedding, fetch_k, eligible_rows=eligible_rows, view=view, **kwargs
+        )
+        count("candidates", len(docs_and_scores))
+        with stage("filter", FILTER_SECONDS, **self._metric_labels):
+            return [
+                (doc, score)
+                for doc, score in docs_and_scores
+                if doc is not exclude
+                and doc.is_valid
+                and (metadata_filter is None or metadata_filter.match(doc.metadata))
+            ][:k]
+
+    def _plan_vector_search(
+        self, k: int, metadata_filter: Optional[MetadataFilter]
+    ) -> Optional[Tuple[int, Optional[np.ndarray], IndexView]]:
+        """
+        Works out how many candidates to fetch from faiss and which rows are
+        eligible for a query, along with the index view the rows refer to.
+        Returns None when no document can match, in which case the query does
+        not need to be encoded at all.
+        """
+        view = self._view
+        if view.live_count == 0:
+            return None
+
+        # Time ranges are resolved to a row selector before the faiss scan. GPU
+        # indexes do not take selectors, so there they fall back to the post-filter.
+        eligible_rows = None
+        if self.device != "cuda":
+            eligible_rows = self._eligible_rows(view, metadata_filter)
+            if eligible_rows is not None and len(eligible_rows) == 0:
+                return None
+
+        needs_post_filter = metadata_filter is not None and (
+            eligible_rows is None
+            or metadata_filter.id is not None
+            or metadata_filter.tags
+            or metadata_filter.categories
+            or metadata_filter.custom_filter is not None
+        )
+        fetch_k = k * 4 if needs_post_filter else k
+        fetch_k = min(fetch_k, view.live_count, 100)
+        if fetch_k <= 0:
+            return None
+        return fetch_k, eligible_rows, view
 
-        vd_docs = [doc for doc, _ in docs_and_scores if doc.is_valid]
+    def _finalize_vector_results(
+        self,
+        docs_and_scores: List[Tuple[Document, float]],
+        k: int,
+        metadata_filter: Optional[MetadataFilter],
+    ) -> List[Tuple[Document, float]]:
+        count("candidates", len(docs_and_scores))
+        with stage("filter", FILTER_SECONDS, **self._metric_labels):
+            return self._filter_vector_results(docs_and_scores, k, metadata_filter)
+
+    def _filter_vector_results(
+        self,
+        docs_and_scores: List[Tuple[Document, float]],
+        k: int,
+        metadata_filter: Optional[MetadataFilter],
+    ) -> List[Tuple[Document, float]]:
+        vd_docs = [(doc, score) for doc, score in docs_and_scores if doc.is_valid]
 
         if metadata_filter:
             logger.info(f"Applying metadata filter to {len(vd_docs)} valid documents")
             filtered_docs = [
-                doc for doc in vd_docs if metadata_filter.match(doc.metadata)
+                (doc, score)
+                for doc, score in vd_docs
+                if metadata_filter.match(doc.metadata)
             ]
             logger.info(
                 f"Found {len(filtered_docs)} documents matching filter criteria"
@@ -457,3 +1385,211 @@ class VectorStore:
             return filtered_docs[:k]
 
         return vd_docs[:k]
+
+    def get_docstore_id(self, metadata_id: str) -> Optional[str]:
+        """Maps a document's metadata id to its docstore key."""
+        return self.metadata_id_to_docstore_id.get(pack_id(metadata_id))
+
+    def similarity_search_by_document_id(
+        self,
+        doc_id: str,
+        k: int = 5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        **kwargs,
+    ) -> List[Document]:
+        """
+        Finds documents similar to one already in the store. The stored vector is
+        read back from the index, so no model inference runs.
+
+        Args:
+            doc_id: Docstore key of the source document.
+            k: Number of results to return, not counting the source document.
+            metadata_filter: Optional filter to apply to document metadata.
+            **kwargs: Additional arguments.
+                score_threshold: Optional float, as in `search`.
+        """
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_document_id(
+                doc_id, k, metadata_filter, **kwargs
+            )
+        ]
+
+    def similarity_search_with_score_by_document_id(
+        self,
+        doc_id: str,
+        k: int = 5,
+        metadata_filter: Optional[MetadataFilter] = None,
+        **kwargs,
+    ) -> List[Tuple[Document, float]]:
+        """As ``similarity_search_by_document_id``, with each L2 distance."""
+        filter_key = None
+        if metadata_filter is not None:
+            filter_key = metadata_filter.cache_key()
+
+        def compute() -> List[Tuple[Document, float]]:
+            # Fetch one extra candidate since the source document matches itself.
+            plan = self._plan_vector_search(k + 1, metadata_filter)
+            view = plan[2] if plan is not None else self._view
+            row = view.row_of(doc_id)
+            source = self.docstore.get(doc_id)
+            if row is None or source is None:
+                raise VectorStoreError(f"Document {doc_id} is not in the index")
+            if plan is None:
+                return []
+            fetch_k, eligible_rows, view = plan
+            docs_and_scores = self.similarity_search_with_score_by_vector(
+                view.reconstruct(row),
+                fetch_k,
+                eligible_rows=eligible_rows,
+                view=view,
+                **kwargs,
+            )
+            docs_and_scores = [
+                (doc, score) for doc, score in docs_and_scores if doc is not source
+            ]
+            return self._finalize_vector_results(docs_and_scores, k, metadata_filter)
+
+        if metadata_filter is not None and filter_key is None:
+            return compute()
+        cache_key = ("similar", doc_id, k, filter_key, tuple(sorted(kwargs.items())))
+        results, outcome = self.result_cache.get_or_compute(
+            cache_key, self.generation, compute
+        )
+        annotate(cache=outcome)
+        return [(doc, score) for doc, score in results if doc.is_valid]
+
+    def search_batch(
+        self, requests: List[SearchRequest], batch_size: int = 64
+    ) -> Iterator[List[Document]]:
+        """
+        Runs many searches at once, yielding each request's results in order.
+        See ``search_batch_with_score``.
+        """
+        for results in self.search_batch_with_score(requests, batch_size):
+            yield [doc for doc, _ in results]
+
+    def search_batch_with_score(
+        self, requests: List[SearchRequest], batch_size: int = 64
+    ) -> Iterator[List[Tuple[Document, Optional[float]]]]:
+        """
+        Runs many searches at once, yielding each request's results in order,
+        scored as by ``search_with_score``.
+
+        Queries are encoded in model batches of ``batch_size``, and every vector
+        query without a row selector in a batch shares a single multi-row faiss
+        search. Lexical requests never touch the model.
+        """
+        for request in requests:
+            if request.mode not in SEARCH_MODES:
+                raise VectorStoreError(f"Unknown search mode: {request.mode}")
+
+        for start in range(0, len(requests), batch_size):
+            chunk = requests[start : start + batch_size]
+
+            # Hybrid requests fetch a deeper vector ranking to fuse with BM25.
+            vector_ks = [
+                request.k if request.mode == "vector" else max(request.k * 2, 10)
+                for request in chunk
+            ]
+            plans = [
+                (
+                    None
+                    if request.mode == "lexical"
+                    else self._plan_vector_search(vector_k, request.metadata_filter)
+                )
+                for request, vector_k in zip(chunk, vector_ks)
+            ]
+
+            to_encode = [i for i, plan in enumerate(plans) if plan is not None]
+            vector_results: Dict[int, List[Tuple[Document, float]]] = {}
+            if to_encode:
+                with stage("encode"):
+                    embeddings = np.asarray(
+                        self.embedding._embed_texts(
+                            [chunk[i].query for i in to_encode]
+                        ),
+                        dtype=np.float32,
+                    )
+                shared = [
+                    (i, row) for row, i in enumerate(to_encode) if plans[i][1] is None
+                ]
+                if shared:
+                    max_fetch_k = max(plans[i][0] for i, _ in shared)
+                    # Plans made moments apart may hold different views; the
+                    # newest one serves them all.
+                    view = self._view
+                    with stage("faiss", FAISS_SEARCH_SECONDS, **self._metric_labels):
+                        with search_threads():
+                            scores, indices = view.search(
+                                embeddings[[row for _, row in shared]], max_fetch_k
+                            )
+                    for j, (i, _) in enumerate(shared):
+                        vector_results[i] = self._collect_docs_and_scores(
+                            view,
+                            scores[j],
+                            indices[j],
+                            plans[i][0],
+                            chunk[i].score_threshold,
+                        )
+                for row, i in enumerate(to_encode):
+                    if i in vector_results:
+                        continue
+                    fetch_k, eligible_rows, view = plans[i]
+                    vector_results[i] = self.similarity_search_with_score_by_vector(
+                        embeddings[row],
+                        fetch_k,
+                        eligible_rows=eligible_rows,
+                        view=view,
+                        score_threshold=chunk[i].score_threshold,
+                    )
+
+            for i, request in enumerate(chunk):
+                vector_hits = []
+                if request.mode != "lexical":
+                    vector_hits = self._finalize_vector_results(
+                        vector_results.get(i, []),
+                        vector_ks[i],
+                        request.metadata_filter,
+                    )
+                if request.mode == "vector":
+                    yield vector_hits
+                    continue
+
+                lexical_hits = self._scored_lexical_search(
+                    request.query,
+                    request.k if request.mode == "lexical" else vector_ks[i],
+                    request.metadata_filter,
+                )
+                if request.mode == "lexical":
+                    yield lexical_hits
+                    continue
+                rankings = [
+                    [doc for doc, _ in vector_hits],
+                    [doc for doc, _ in lexical_hits],
+                ]
+                yield [(doc, None) for doc in self._fuse_rankings(rankings, request.k)]
+
+    def filter_documents(self, metadata_filter: MetadataFilter) -> List[Document]:
+        """
+        Returns the documents matching a metadata filter. When the filter has a
+        time range, candidates come from the time columns of the current view,
+        in creation order. Reads the view like a search, without the lock.
+        """
+        view = self._view
+        if metadata_filter.has_time_range:
+            end = metadata_filter.created_before
+            valid_at = metadata_filter.valid_at
+            if valid_at is not None:
+                end = valid_at if end is None else min(end, valid_at)
+            rows = view.rows_in_time_range(metadata_filter.created_after, end, valid_at)
+            rows = rows[np.argsort(view.start_times[rows], kind="stable")]
+        else:
+            rows = view.live_rows()
+        docs = (self.docstore.get(view.row_ids[row]) for row in rows.tolist())
+        # Documents removed since the view was taken are gone from the docstore.
+        return [
+            doc
+            for doc in docs
+            if doc is not None and metadata_filter.match(doc.metadata)
+        ]
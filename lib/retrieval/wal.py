@@ -0,0 +1,197 @@
+import logging
+import os
+import pickle
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from lib.retrieval.snapshot import JournalEntry, _fsync_dir
+
+logger = logging.getLogger(__name__)
+
+# Every record is a little-endian (payload length, crc32 of payload) header
+# followed by the pickled journal entry.
+_HEADER = struct.Struct("<II")
+
+
+class WriteAheadLog:
+    """
+    Append-only log of the store's journal entries, split into numbered
+    segment files ``{name}.wal.{segment}``.
+
+    Appends only buffer the record and return a log sequence number; a
+    background thread writes and fsyncs whatever has accumulated, so concurrent
+    writers share one fsync (group commit). Callers that need durability wait
+    for their sequence number with ``sync`` after releasing their own locks.
+
+    ``rotate`` starts a new segment when a snapshot is captured. Once that
+    snapshot is committed, the segments before it are no longer needed and
+    can be removed with ``remove_segments_before``.
+    """
+
+    def __init__(self, folder_path: str, index_name: str = "index", fsync: bool = True):
+        self.folder = Path(folder_path)
+        self.index_name = index_name
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        # Serializes file writes with rotation, so a batch taken from the buffer
+        # always lands in the segment that was current when it was taken.
+        self._io_lock = threading.Lock()
+        self._buffer: List[bytes] = []
+        self._next_lsn = 0
+        self._flushed_lsn = 0
+        self._error: Optional[BaseException] = None
+        self._file = None
+        self.segment = self._last_segment() + 1
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._flush_worker, name="VectorStoreWALThread", daemon=True
+        )
+        self._thread.start()
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.folder / f"{self.index_name}.wal.{segment:08d}"
+
+    def segments(self) -> List[int]:
+        prefix = f"{self.index_name}.wal."
+        if not self.folder.exists():
+            return []
+        return sorted(
+            int(path.name[len(prefix) :])
+            for path in self.folder.glob(f"{prefix}*")
+            if path.name[len(prefix) :].isdigit()
+        )
+
+    def _last_segment(self) -> int:
+        return max(self.segments(), default=0)
+
+    def replay(self, from_segment: int = 0) -> Iterator[JournalEntry]:
+        """
+        Yields the logged entries of every segment numbered from_segment or
+        later, in order. A torn or corrupt record ends its segment, since
+        nothing after it was acknowledged as durable.
+        """
+        for segment in self.segments():
+            if segment < from_segment or segment >= self.segment:
+                continue
+            path = self._segment_path(segment)
+            with open(path, "rb") as f:
+                while True:
+                    header = f.read(_HEADER.size)
+                    if len(header) < _HEADER.size:
+                        break
+                    length, crc = _HEADER.unpack(header)
+                    payload = f.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        logger.warning(
+                            f"Ignoring torn record at offset {f.tell()} of {path}"
+                        )
+                        break
+                    yield pickle.loads(payload)
+
+    def append(self, entry: JournalEntry) -> int:
+        """Buffers an entry and returns its log sequence number."""
+        payload = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        record = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._cond:
+            self._buffer.append(record)
+            self._next_lsn += 1
+            self._cond.notify_all()
+            return self._next_lsn
+
+    def sync(self, lsn: Optional[int] = None):
+        """Blocks until the entry with the given sequence number is on disk."""
+        with self._cond:
+            if lsn is None:
+                lsn = self._next_lsn
+            while self._flushed_lsn < lsn:
+                if self._error is not None:
+                    raise self._error
+                self._cond.wait()
+
+    def _write(self, records: List[bytes]):
+        if self._file is None:
+            self.folder.mkdir(exist_ok=True, parents=True)
+            path = self._segment_path(self.segment)
+            created = not path.exists()
+            self._file = open(path, "ab")
+            if created and self.fsync:
+                # Make the new segment's directory entry durable too.
+                _fsync_dir(self.folder)
+        self._file.write(b"".join(records))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _flush_worker(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._stopped:
+                    self._cond.wait()
+                if not self._buffer and self._stopped:
+                    return
+
+            # Appends keep buffering while this batch is written and synced.
+            with self._io_lock:
+                with self._cond:
+                    records, self._buffer = self._buffer, []
+                    lsn = self._next_lsn
+                try:
+                    if records:
+                        self._write(records)
+                except Exception as e:
+                    logger.error(f"Write-ahead log flush failed: {e}")
+                    with self._cond:
+                        self._error = e
+                        self._buffer = records + self._buffer
+                        self._cond.notify_all()
+                    self._stop_wait(1.0)
+                    continue
+
+            with self._cond:
+                self._error = None
+                self._flushed_lsn = max(self._flushed_lsn, lsn)
+                self._cond.notify_all()
+
+    def _stop_wait(self, timeout: float):
+        with self._cond:
+            if not self._stopped:
+                self._cond.wait(timeout)
+
+    def rotate(self) -> int:
+        """
+        Flushes buffered records to the current segment and starts a new one.
+        Returns the new segment number, the first one a snapshot taken now
+        does not cover.
+        """
+        with self._io_lock:
+            with self._cond:
+                records, self._buffer = self._buffer, []
+                lsn = self._next_lsn
+            if records:
+                self._write(records)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            with self._cond:
+                self._flushed_lsn = max(self._flushed_lsn, lsn)
+                self.segment += 1
+                self._cond.notify_all()
+                return self.segment
+
+    def remove_segments_before(self, segment: int):
+        for old in self.segments():
+            if old < segment:
+                self._segment_path(old).unlink(missing_ok=True)
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=30)
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None